@@ -0,0 +1,9 @@
+import pytest
+
+from core.runner import test_settings as override_test_settings
+
+
+@pytest.fixture(scope='session', autouse=True)
+def test_settings(django_test_environment):
+    with override_test_settings():
+        yield
@@ -0,0 +1,32 @@
+"""SQLite с выбором режима транзакций.
+
+OPTIONS['transaction_mode'] задаёт, чем начинается transaction.atomic():
+BEGIN DEFERRED (как в Django), IMMEDIATE или EXCLUSIVE. Отложенная
+транзакция берёт блокировку на запись только при первом изменении, и
+если её уже держит другой писатель, SQLite сразу отвечает «database is
+locked», не дожидаясь busy_timeout. IMMEDIATE берёт блокировку в начале
+транзакции, где busy_timeout работает.
+"""
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    transaction_mode = None
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        mode = kwargs.pop('transaction_mode', None)
+        if mode is not None and mode.upper() not in TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                'transaction_mode должен быть одним из: {}.'.format(
+                    ', '.join(TRANSACTION_MODES)))
+        self.transaction_mode = mode and mode.upper()
+        return kwargs
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode is None:
+            return super()._start_transaction_under_autocommit()
+        self.cursor().execute(f'BEGIN {self.transaction_mode}')
@@ -0,0 +1,450 @@
+"""Бэкенды кэша: память процесса с бюджетом в байтах и двухуровневый.
+
+ByteLRUCache ограничивает объём значений в байтах, а не число записей,
+и вытесняет их по порядку LRU или LFU, а не случайную долю, как
+LocMemCache. Поэтому несколько больших страниц не вытесняют тысячи
+маленьких записей, а память процесса ограничена.
+
+TwoTierCache держит ByteLRUCache перед общим для всех процессов
+кэшем. Общий уровень — любой кэш из CACHES, заданный через LOCATION:
+файловый на одной машине или memcached на нескольких. Рядом с каждым значением
+в общем кэше лежит его версия, новая при каждой записи. Локальная копия
+без проверки отдаётся не дольше LOCAL_TIMEOUT секунд, потом сверяется
+с версией в общем кэше. Так запись или удаление в одном процессе видны
+остальным не позже чем через LOCAL_TIMEOUT, а сама страница при сверке
+заново не читается.
+"""
+import pickle
+import threading
+import time
+import uuid
+import zlib
+from collections import OrderedDict, defaultdict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .metrics import Registry, registry
+
+MAX_BYTES = 64 * 1024 * 1024
+# Примерный расход памяти на запись сверх ключа и значения: кортеж,
+# элементы словарей и порядка вытеснения.
+ENTRY_OVERHEAD = 200
+COMPRESS_LEVEL = 1
+LOCAL_TIMEOUT = 1  # sec
+LOCAL_MAX_BYTES = 16 * 1024 * 1024
+VERSION_KEY = 'two-tier-version:{}'
+
+
+class LRUPolicy:
+    """Вытесняется запись, к которой дольше всего не обращались."""
+
+    def __init__(self):
+        self.order = OrderedDict()
+
+    def add(self, key):
+        self.order[key] = None
+
+    def touch(self, key):
+        self.order.move_to_end(key)
+
+    def remove(self, key):
+        del self.order[key]
+
+    def victim(self):
+        return next(iter(self.order))
+
+
+class LFUPolicy:
+    """Вытесняется самая редко читаемая запись, из равных — давняя.
+
+    Ключи разложены по корзинам частот, поэтому все операции O(1).
+    """
+
+    def __init__(self):
+        self.frequency = {}
+        self.buckets = defaultdict(OrderedDict)
+        self.min_frequency = 0
+
+    def add(self, key):
+        self.frequency[key] = 1
+        self.buckets[1][key] = None
+        self.min_frequency = 1
+
+    def _unlink(self, key, frequency):
+        bucket = self.buckets[frequency]
+        del bucket[key]
+        if not bucket:
+            del self.buckets[frequency]
+
+    def touch(self, key):
+        frequency = self.frequency[key]
+        self._unlink(key, frequency)
+        if frequency == self.min_frequency \
+                and frequency not in self.buckets:
+            self.min_frequency = frequency + 1
+        self.frequency[key] = frequency + 1
+        self.buckets[frequency + 1][key] = None
+
+    def remove(self, key):
+        self._unlink(key, self.frequency.pop(key))
+
+    def victim(self):
+        if self.min_frequency not in self.buckets:
+            self.min_frequency = min(self.buckets)
+        return next(iter(self.buckets[self.min_frequency]))
+
+
+POLICIES = {'lru': LRUPolicy, 'lfu': LFUPolicy}
+
+
+class ByteStore:
+    """Данные ByteLRUCache, общие для всех его экземпляров с одним
+    именем, то есть для всех потоков процесса."""
+
+    def __init__(self, name, max_bytes, policy):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.policy = POLICIES[policy]()
+        self.entries = {}  # ключ: (данные, сжаты ли, истекает)
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def weight(key, data):
+        return len(key) + len(data) + ENTRY_OVERHEAD
+
+    def lookup(self, key, now):
+        """Запись или None, если её нет или срок истёк."""
+        entry = self.entries.get(key)
+        if entry is not None and entry[2] is not None and entry[2] <= now:
+            self.delete(key)
+            return None
+        return entry
+
+    def get(self, key, now):
+        """Как lookup, но считается чтением для статистики и политики."""
+        entry = self.lookup(key, now)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.policy.touch(key)
+        return entry
+
+    def set(self, key, data, compressed, expires):
+        self.delete(key)
+        weight = self.weight(key, data)
+        if weight > self.max_bytes:
+            return
+        while self.size + weight > self.max_bytes:
+            self.delete(self.policy.victim())
+            self.evictions += 1
+        self.entries[key] = (data, compressed, expires)
+        self.policy.add(key)
+        self.size += weight
+
+    def delete(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return False
+        self.policy.remove(key)
+        self.size -= self.weight(key, entry[0])
+        return True
+
+    def clear(self):
+        self.entries.clear()
+        self.policy = type(self.policy)()
+        self.size = 0
+
+    def stats(self):
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': self.hits / total if total else None,
+            }
+
+    def metrics(self):
+        stats = self.stats()
+        labels = {'cache': self.name}
+        yield 'yatube_cache_bytes', labels, stats['bytes']
+        yield 'yatube_cache_entries', labels, stats['entries']
+        yield 'yatube_cache_evictions_total', labels, stats['evictions']
+        for result, value in (('hit', stats['hits']),
+                              ('miss', stats['misses'])):
+            yield 'yatube_cache_total', {
+                **labels, 'tier': 'memory', 'result': result}, value
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(name, max_bytes, policy):
+    with _stores_lock:
+        if name not in _stores:
+            _stores[name] = ByteStore(name, max_bytes, policy)
+            registry.register(_stores[name].metrics)
+        return _stores[name]
+
+
+class ByteLRUCache(BaseCache):
+    """Кэш в памяти процесса с бюджетом в байтах; замена LocMemCache.
+
+    OPTIONS: MAX_BYTES — бюджет на сериализованные ключи и значения,
+    POLICY — порядок вытеснения 'lru' или 'lfu', COMPRESS_MIN_BYTES —
+    значения от этого размера сжимаются zlib (по умолчанию не сжимаются).
+    """
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, name, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.compress_min_bytes = options.get('COMPRESS_MIN_BYTES')
+        self.store = get_store(name, options.get('MAX_BYTES', MAX_BYTES),
+                               options.get('POLICY', 'lru'))
+
+    def stats(self):
+        """Объём, вытеснения и доля попаданий в этом процессе."""
+        return self.store.stats()
+
+    def dumps(self, value):
+        data = pickle.dumps(value, self.pickle_protocol)
+        if self.compress_min_bytes is not None \
+                and len(data) >= self.compress_min_bytes:
+            compressed = zlib.compress(data, COMPRESS_LEVEL)
+            if len(compressed) < len(data):
+                return compressed, True
+        return data, False
+
+    @staticmethod
+    def loads(entry):
+        data, compressed, _ = entry
+        return pickle.loads(zlib.decompress(data) if compressed else data)
+
+    def get_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.get_key(key, version)
+        data, compressed = self.dumps(value)
+        with self.store.lock:
+            if self.store.lookup(key, time.time()) is not None:
+                return False
+            self.store.set(key, data, compressed,
+                           self.get_backend_timeout(timeout))
+            return True
+
+    def get(self, key, default=None, version=None):
+        key = self.get_key(key, version)
+        with self.store.lock:
+            entry = self.store.get(key, time.time())
+        return default if entry is None else self.loads(entry)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.get_key(key, version)
+        data, compressed = self.dumps(value)
+        with self.store.lock:
+            self.store.set(key, data, compressed,
+                           self.get_backend_timeout(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.get_key(key, version)
+        with self.store.lock:
+            entry = self.store.lookup(key, time.time())
+            if entry is None:
+                return False
+            self.store.entries[key] = (
+                entry[0], entry[1], self.get_backend_timeout(timeout))
+            return True
+
+    def incr(self, key, delta=1, version=None):
+        key = self.get_key(key, version)
+        with self.store.lock:
+            entry = self.store.lookup(key, time.time())
+            if entry is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = self.loads(entry) + delta
+            data, compressed = self.dumps(value)
+            self.store.set(key, data, compressed, entry[2])
+        return value
+
+    def has_key(self, key, version=None):
+        key = self.get_key(key, version)
+        with self.store.lock:
+            entry = self.store.entries.get(key)
+            return entry is not None and (
+                entry[2] is None or entry[2] > time.time())
+
+    def delete(self, key, version=None):
+        key = self.get_key(key, version)
+        with self.store.lock:
+            return self.store.delete(key)
+
+    def clear(self):
+        with self.store.lock:
+            self.store.clear()
+
+
+def new_stamp():
+    return uuid.uuid4().hex
+
+
+class TwoTierCache(BaseCache):
+    """Бэкенд кэша; LOCATION — псевдоним общего кэша в CACHES.
+
+    OPTIONS: LOCAL_TIMEOUT — сколько секунд локальная копия отдаётся
+    без сверки версии, LOCAL — OPTIONS локального ByteLRUCache.
+    """
+
+    def __init__(self, location, params):
+        options = params.get('OPTIONS', {})
+        self.local_timeout = options.get('LOCAL_TIMEOUT', LOCAL_TIMEOUT)
+        super().__init__(params)
+        self.shared_alias = location
+        self.local = ByteLRUCache(f'two-tier:{location}', {
+            'TIMEOUT': None,
+            'OPTIONS': {'MAX_BYTES': LOCAL_MAX_BYTES,
+                        **options.get('LOCAL', {})},
+        })
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    def count(self, tier, result):
+        registry.inc('yatube_cache_total', cache=self.shared_alias,
+                     tier=tier, result=result)
+
+    def stats(self):
+        """Попадания и промахи по уровням в этом процессе."""
+        values = registry.snapshot()
+        return {
+            tier: {result: values.get(Registry.key('yatube_cache_total', {
+                'cache': self.shared_alias, 'tier': tier,
+                'result': result}), 0) for result in ('hit', 'miss')}
+            for tier in ('local', 'shared')
+        }
+
+    def get_timeout(self, timeout):
+        # Общему кэшу передаётся срок в секундах, а не момент истечения,
+        # как из get_backend_timeout.
+        return self.default_timeout if timeout is DEFAULT_TIMEOUT else timeout
+
+    def remember(self, key, stamp, value, version=None):
+        self.local.set(key, (stamp, time.monotonic(), value),
+                       version=version)
+
+    def get_local_many(self, keys, version=None):
+        """Свежие локальные копии и устаревшие с той же версией."""
+        found, stale = {}, {}
+        now = time.monotonic()
+        for key, (stamp, checked, value) in self.local.get_many(
+                keys, version=version).items():
+            if now - checked < self.local_timeout:
+                found[key] = value
+            else:
+                stale[key] = (stamp, value)
+        if stale:
+            stamps = self.shared.get_many(
+                [VERSION_KEY.format(key) for key in stale], version=version)
+            for key, (stamp, value) in stale.items():
+                if stamps.get(VERSION_KEY.format(key)) == stamp:
+                    self.remember(key, stamp, value, version)
+                    found[key] = value
+        return found
+
+    def get_shared_many(self, keys, version=None):
+        # Версия читается раньше значения: если между чтениями значение
+        # перезапишут, старая версия заставит перечитать его при сверке.
+        stamps = self.shared.get_many(
+            [VERSION_KEY.format(key) for key in keys], version=version)
+        found = self.shared.get_many(keys, version=version)
+        for key, value in found.items():
+            stamp = stamps.get(VERSION_KEY.format(key))
+            if stamp is not None:
+                self.remember(key, stamp, value, version)
+        return found
+
+    def get_many(self, keys, version=None):
+        found = self.get_local_many(keys, version=version)
+        missing = [key for key in keys if key not in found]
+        for key in keys:
+            self.count('local', 'miss' if key in missing else 'hit')
+        if missing:
+            shared = self.get_shared_many(missing, version=version)
+            for key in missing:
+                self.count('shared', 'hit' if key in shared else 'miss')
+            found.update(shared)
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_timeout(timeout)
+        stamps = {key: new_stamp() for key in data}
+        # Значение пишется раньше версии, в обратном чтению порядке.
+        failed = self.shared.set_many(data, timeout, version=version)
+        self.shared.set_many(
+            {VERSION_KEY.format(key): stamp for key, stamp in stamps.items()},
+            timeout, version=version)
+        for key, value in data.items():
+            if key not in failed:
+                self.remember(key, stamps[key], value, version)
+        return failed
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_timeout(timeout)
+        if not self.shared.add(key, value, timeout, version=version):
+            return False
+        stamp = new_stamp()
+        self.shared.set(VERSION_KEY.format(key), stamp, timeout,
+                        version=version)
+        self.remember(key, stamp, value, version)
+        return True
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        timeout = self.get_timeout(timeout)
+        self.shared.touch(VERSION_KEY.format(key), timeout, version=version)
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        stamp = new_stamp()
+        self.shared.set(VERSION_KEY.format(key), stamp, None,
+                        version=version)
+        self.remember(key, stamp, value, version)
+        return value
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        self.shared.delete_many(keys, version=version)
+        self.shared.delete_many(
+            [VERSION_KEY.format(key) for key in keys], version=version)
+        self.local.delete_many(keys, version=version)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def has_key(self, key, version=None):
+        return self.shared.has_key(key, version=version)
+
+    def clear(self):
+        self.shared.clear()
+        self.local.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
@@ -0,0 +1,49 @@
+"""Дырки в закэшированных страницах для частей, зависящих от пользователя.
+
+Страница кэшируется одна на всех, а на месте шапки, вкладок и кнопок,
+которые различаются у пользователей, в ней остаются метки. После кэша
+метки заполняются для текущего запроса функциями, зарегистрированными
+через register. Вне закэшированных view тег {% hole %} сразу выводит
+содержимое, поэтому те же шаблоны работают и без кэша.
+"""
+import base64
+import json
+import re
+
+from django.template.loader import render_to_string
+
+HOLES = {}
+MARKER = '<!--hole:{}-->'
+MARKER_RE = re.compile(r'<!--hole:([\w=-]+)-->')
+
+
+def register(name):
+    """Регистрирует функцию fn(request, **kwargs), возвращающую HTML."""
+    def decorator(function):
+        HOLES[name] = function
+        return function
+    return decorator
+
+
+def render(request, name, **kwargs):
+    return HOLES[name](request, **kwargs)
+
+
+def punch(name, **kwargs):
+    """Метка дырки; аргументы должны сериализоваться в JSON."""
+    payload = json.dumps([name, kwargs], ensure_ascii=False)
+    return MARKER.format(
+        base64.urlsafe_b64encode(payload.encode()).decode())
+
+
+def fill(request, content):
+    """Заменяет метки в content отрисованными для request дырками."""
+    def replace(match):
+        name, kwargs = json.loads(base64.urlsafe_b64decode(match.group(1)))
+        return render(request, name, **kwargs)
+    return MARKER_RE.sub(replace, content)
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
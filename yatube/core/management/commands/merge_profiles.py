@@ -0,0 +1,37 @@
+import glob
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.profiling import SUFFIX, get_dir, load, merge
+
+
+class Command(BaseCommand):
+    help = ('Складывает профили запросов в collapsed stacks по view: '
+            'по файлу <view>.collapsed для flamegraph.pl или speedscope.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Каталог для результатов.')
+        parser.add_argument('--source', help='Каталог профилей, по '
+                            'умолчанию PROFILING_DIR.')
+        parser.add_argument('--view', action='append', default=[],
+                            help='Только указанные view.')
+
+    def handle(self, *args, **options):
+        source = options['source'] or get_dir()
+        paths = glob.glob(os.path.join(source, '*' + SUFFIX))
+        if not paths:
+            raise CommandError(f'В {source} нет профилей.')
+        merged = merge(load(paths))
+        if options['view']:
+            merged = {view: stacks for view, stacks in merged.items()
+                      if view in options['view']}
+        os.makedirs(options['output'], exist_ok=True)
+        for view, stacks in sorted(merged.items()):
+            path = os.path.join(options['output'],
+                                view.replace(':', '.') + '.collapsed')
+            with open(path, 'w') as file:
+                for stack, count in sorted(stacks.items()):
+                    file.write(f'{stack} {count}\n')
+            self.stdout.write(
+                f'{view:<24} {sum(stacks.values()):>8} сэмплов -> {path}')
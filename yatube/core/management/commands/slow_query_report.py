@@ -0,0 +1,37 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.slow_queries import get_log_path, read, summarize
+
+
+class Command(BaseCommand):
+    help = ('Группирует медленные запросы из журнала по отпечатку SQL '
+            'и показывает самые затратные по суммарному времени.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--log', help='Журнал, по умолчанию '
+                            'SLOW_QUERY_LOG.')
+        parser.add_argument('--top', type=int, default=20)
+        parser.add_argument('--view', help='Только запросы этого view.')
+
+    def handle(self, *args, **options):
+        path = options['log'] or get_log_path()
+        if not os.path.exists(path):
+            raise CommandError(f'Журнал {path} не найден.')
+        entries = read(path)
+        if options['view']:
+            entries = (entry for entry in entries
+                       if entry['view'] == options['view'])
+        groups = summarize(entries)[:options['top']]
+        for rank, group in enumerate(groups, 1):
+            self.stdout.write(
+                f'{rank}. {group["fingerprint"]}  '
+                f'всего {group["total"] * 1000:.1f} мс  '
+                f'запросов {group["count"]}  '
+                f'среднее {group["total"] / group["count"] * 1000:.1f} мс  '
+                f'максимум {group["max"] * 1000:.1f} мс')
+            self.stdout.write(f'   view: {", ".join(sorted(group["views"]))}')
+            self.stdout.write(f'   {group["sql"]}')
+            for line in group['plan']:
+                self.stdout.write(f'   | {line}')
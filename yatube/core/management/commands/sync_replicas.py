@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.replicas import beat, copy_database, get_replicas
+
+
+class Command(BaseCommand):
+    help = ('Ставит отметку Heartbeat в основной базе и копирует базу '
+            'в SQLite-реплики из DATABASE_REPLICAS. Реплики других СУБД '
+            'получают отметку своей репликацией.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', action='append',
+                            help='Реплика, по умолчанию все.')
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Повторять раз в столько секунд; '
+                                 'по умолчанию один раз.')
+
+    def handle(self, *args, **options):
+        aliases = options['database'] or get_replicas()
+        unknown = set(aliases) - set(get_replicas())
+        if unknown:
+            raise CommandError(f'Не реплики: {", ".join(sorted(unknown))}.')
+        while True:
+            self.sync(aliases)
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, aliases):
+        beat()
+        source = connections[DEFAULT_DB_ALIAS]
+        for alias in aliases:
+            target = connections[alias]
+            if target.vendor != 'sqlite':
+                continue
+            started = time.perf_counter()
+            copy_database(source, target.settings_dict['NAME'])
+            self.stdout.write(f'{alias}: скопирована за '
+                              f'{time.perf_counter() - started:.3f} с')
@@ -0,0 +1,228 @@
+"""Метрики запросов в текстовом формате Prometheus.
+
+Каждый процесс копит счётчики и гистограммы в памяти и раз в
+METRICS_FLUSH_INTERVAL секунд сбрасывает их в файл
+`<pid>-<время запуска>.json` каталога METRICS_DIR. Эндпоинт /metrics
+складывает файлы всех процессов, поэтому за балансировщиком видны
+суммарные значения; файлы завершившихся процессов он удаляет.
+"""
+import json
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1_000, 5_000, 10_000, 25_000, 50_000, 100_000, 250_000,
+                 1_000_000)
+FLUSH_INTERVAL = 5  # sec
+
+# Имя метрики: (тип, описание, границы корзин гистограммы).
+METRICS = {
+    'yatube_requests_total': (
+        'counter', 'Обработанные запросы.', None),
+    'yatube_request_duration_seconds': (
+        'histogram', 'Время ответа view.', LATENCY_BUCKETS),
+    'yatube_response_bytes': (
+        'histogram', 'Размер тела ответа.', BYTES_BUCKETS),
+    'yatube_db_queries_total': (
+        'counter', 'SQL-запросы, выполненные при обработке запросов.', None),
+    'yatube_db_query_seconds_total': (
+        'counter', 'Суммарное время SQL-запросов.', None),
+    'yatube_page_cache_total': (
+        'counter', 'Обращения к кэшу страниц по исходу hit/miss.', None),
+    'yatube_cache_total': (
+        'counter', 'Обращения к кэшам по уровням и исходу hit/miss.', None),
+    'yatube_cache_evictions_total': (
+        'counter', 'Записи, вытесненные из кэша в памяти.', None),
+    'yatube_cache_bytes': (
+        'gauge', 'Объём записей кэша в памяти.', None),
+    'yatube_cache_entries': (
+        'gauge', 'Число записей кэша в памяти.', None),
+    'yatube_db_lock_wait_seconds': (
+        'histogram', 'Ожидание блокировки на запись: очереди процесса '
+        '(process) и базы (database).', LATENCY_BUCKETS),
+    'yatube_db_write_retries_total': (
+        'counter', 'Повторы пишущих транзакций после «database is locked».',
+        None),
+    'yatube_db_write_errors_total': (
+        'counter', 'Пишущие транзакции, не выполненные после повторов.',
+        None),
+    'yatube_replica_reads_total': (
+        'counter', 'View, читавшие с реплики (replica) или с основной базы '
+        'из-за привязки (pinned) или отставания реплик (lagging).', None),
+    'yatube_auth_user_cache_total': (
+        'counter', 'Чтения пользователя сессии из кэша (hit) и из базы '
+        '(miss).', None),
+}
+
+
+def get_view_name(request):
+    # Как в includes/header.html; неразобранные пути сводятся к одному
+    # значению, чтобы не плодить серии на каждый 404.
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unresolved'
+
+
+def get_dir():
+    return getattr(settings, 'METRICS_DIR', os.path.join(
+        settings.BASE_DIR, 'metrics'))
+
+
+class Registry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.values = {}
+        self.collectors = []
+        self.flushed = time.monotonic()
+        self.pid = None
+
+    def register(self, collector):
+        """collector() возвращает тройки (имя, метки, значение); они
+        попадают в каждый снимок и не стоят ничего между снимками."""
+        self.collectors.append(collector)
+
+    @staticmethod
+    def key(name, labels):
+        return json.dumps([name, sorted(labels.items())])
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = self.key(name, labels)
+        with self.lock:
+            counts = self.values.setdefault(key, [0] * (len(buckets) + 2))
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    counts[index] += 1
+            counts[-2] += 1  # +Inf и одновременно count
+            counts[-1] += value  # sum
+
+    def snapshot(self):
+        with self.lock:
+            values = {
+                key: (list(value) if isinstance(value, list) else value)
+                for key, value in self.values.items()}
+        for collector in self.collectors:
+            for name, labels, value in collector():
+                values[self.key(name, labels)] = value
+        return values
+
+    def get_filename(self):
+        # Процесс, получивший pid завершившегося, пишет в новый файл,
+        # а не продолжает его счётчики.
+        if self.pid != os.getpid():
+            self.pid, self.started = os.getpid(), time.time_ns()
+        return f'{self.pid}-{self.started}.json'
+
+    def flush(self):
+        directory = get_dir()
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        path = os.path.join(directory, self.get_filename())
+        with tempfile.NamedTemporaryFile(
+                'w', dir=directory, suffix='.tmp', delete=False) as file:
+            json.dump(self.snapshot(), file)
+        os.replace(file.name, path)
+        self.flushed = time.monotonic()
+
+    def maybe_flush(self):
+        interval = getattr(settings, 'METRICS_FLUSH_INTERVAL', FLUSH_INTERVAL)
+        if time.monotonic() - self.flushed >= interval:
+            self.flush()
+
+
+registry = Registry()
+
+
+def is_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # процесс другого пользователя
+    return True
+
+
+def is_stale(name):
+    """Файл процесса, который уже завершился."""
+    pid = name.split('-')[0].split('.')[0]
+    if not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return name != registry.get_filename()
+    return not is_alive(int(pid))
+
+
+def load_snapshot(path):
+    """Снимок из файла; файл завершившегося процесса удаляется."""
+    if is_stale(os.path.basename(path)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # удалил другой процесс
+        return None
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def collect():
+    """Сумма снимков всех живых процессов, включая текущий."""
+    registry.flush()
+    total = {}
+    directory = get_dir()
+    for name in os.listdir(directory):
+        if not name.endswith('.json'):
+            continue
+        snapshot = load_snapshot(os.path.join(directory, name))
+        if snapshot is None:
+            continue
+        for key, value in snapshot.items():
+            if isinstance(value, list):
+                current = total.setdefault(key, [0] * len(value))
+                for index, item in enumerate(value):
+                    current[index] += item
+            else:
+                total[key] = total.get(key, 0) + value
+    return total
+
+
+def format_labels(labels):
+    def escape(value):
+        return str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{name}="{escape(value)}"' for name, value in labels)
+
+
+def render(values):
+    """Текстовый формат экспозиции Prometheus 0.0.4."""
+    series = {}
+    for key, value in values.items():
+        name, labels = json.loads(key)
+        series.setdefault(name, []).append((labels, value))
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if name not in series:
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(series[name]):
+            if kind != 'histogram':
+                lines.append(f'{name}{{{format_labels(labels)}}} {value}')
+                continue
+            for bound, count in zip(buckets + ('+Inf',), value[:-1]):
+                bucket_labels = format_labels(labels + [['le', bound]])
+                lines.append(f'{name}_bucket{{{bucket_labels}}} {count}')
+            lines.append(f'{name}_sum{{{format_labels(labels)}}} {value[-1]}')
+            lines.append(
+                f'{name}_count{{{format_labels(labels)}}} {value[-2]}')
+    return '\n'.join(lines) + '\n'
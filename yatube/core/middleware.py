@@ -0,0 +1,149 @@
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.urls import Resolver404, resolve
+from django.utils.crypto import constant_time_compare
+
+from .metrics import get_view_name, registry
+from .profiling import INTERVAL, StackSampler, save
+from .replicas import PIN_COOKIE, PIN_TIME, get_replicas, start_request, wrote
+from .slow_queries import THRESHOLD, SlowQueryLogger
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """Время ответа, SQL-запросы и размер ответа по каждому маршруту."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(timer))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        view = get_view_name(request)
+        registry.inc('yatube_requests_total', view=view,
+                     method=request.method, status=response.status_code)
+        registry.observe('yatube_request_duration_seconds', duration,
+                         view=view)
+        registry.inc('yatube_db_queries_total', timer.count, view=view)
+        registry.inc('yatube_db_query_seconds_total', timer.seconds,
+                     view=view)
+        if not response.streaming:
+            registry.observe('yatube_response_bytes', len(response.content),
+                             view=view)
+        registry.maybe_flush()
+        return response
+
+
+class SlowQueryMiddleware:
+    """Пишет в журнал запросы дольше SLOW_QUERY_THRESHOLD секунд.
+
+    При SLOW_QUERY_THRESHOLD = None отключается при запуске.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, 'SLOW_QUERY_THRESHOLD', THRESHOLD)
+        if self.threshold is None:
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    SlowQueryLogger(connection,
+                                    lambda: get_view_name(request),
+                                    self.threshold)))
+            return self.get_response(request)
+
+
+class ReplicaPinMiddleware:
+    """После записи в базу ставит cookie, с которой пользователь
+    REPLICA_PIN_TIME секунд читает из основной базы.
+
+    Должна стоять выше SessionMiddleware: сессия тоже пишется в базу.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_time = getattr(settings, 'REPLICA_PIN_TIME', PIN_TIME)
+        if not get_replicas():
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        start_request()
+        response = self.get_response(request)
+        if wrote():
+            response.set_cookie(PIN_COOKIE, '1', max_age=self.pin_time,
+                                httponly=True, samesite='Lax')
+        return response
+
+
+class ProfilingMiddleware:
+    """Профилирует каждый PROFILING_SAMPLE_EVERY-й запрос в среднем,
+    все запросы к view из PROFILING_VIEWS и запросы с заголовком
+    `X-Profile: <PROFILING_TOKEN>`.
+
+    Должна стоять последней: профилируется view вместе с рендером
+    шаблона. Без настроек отключается при запуске.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.every = getattr(settings, 'PROFILING_SAMPLE_EVERY', 0)
+        self.views = frozenset(getattr(settings, 'PROFILING_VIEWS', ()))
+        self.token = getattr(settings, 'PROFILING_TOKEN', '')
+        self.interval = getattr(settings, 'PROFILING_INTERVAL', INTERVAL)
+        if not (self.every or self.views or self.token):
+            raise MiddlewareNotUsed
+
+    def __call__(self, request):
+        if not self.is_sampled(request):
+            return self.get_response(request)
+        # Профилируется весь оставшийся путь запроса, так что view
+        # проходит через process_view, process_exception
+        # и ATOMIC_REQUESTS, как без профилирования.
+        with StackSampler(self.interval) as sampler:
+            response = self.get_response(request)
+        save(get_view_name(request), sampler)
+        return response
+
+    def is_sampled(self, request):
+        if self.every and random.random() * self.every < 1:
+            return True
+        if self.views and self.resolve(request) in self.views:
+            return True
+        header = request.META.get('HTTP_X_PROFILE')
+        return bool(header and self.token
+                    and constant_time_compare(header, self.token))
+
+    @staticmethod
+    def resolve(request):
+        # resolver_match появляется только после всех middleware.
+        try:
+            return resolve(request.path_info,
+                           getattr(request, 'urlconf', None)).view_name
+        except Resolver404:
+            return None
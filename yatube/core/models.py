@@ -11,3 +11,11 @@ class CreatedModel(models.Model):
     class Meta:
         # Это абстрактная модель:
         abstract = True
+
+
+class Heartbeat(models.Model):
+    """Отметка времени для измерения отставания реплик."""
+    beat = models.FloatField('Время отметки, Unix')
+
+    class Meta:
+        verbose_name = 'Отметка репликации'
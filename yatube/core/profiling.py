@@ -0,0 +1,120 @@
+"""Выборочное профилирование запросов сэмплером стеков.
+
+Отдельный поток раз в PROFILING_INTERVAL секунд снимает стек потока,
+обрабатывающего запрос, и считает одинаковые стеки. Профиль пишется
+в PROFILING_DIR сжатым JSON; старые файлы удаляются, когда их больше
+PROFILING_MAX_FILES. Команда merge_profiles складывает профили в
+collapsed stacks по view, которые читают flamegraph.pl и speedscope.
+"""
+import glob
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+
+INTERVAL = 0.005  # sec
+MAX_FILES = 500
+SUFFIX = '.json.gz'
+
+
+def get_dir():
+    return getattr(settings, 'PROFILING_DIR', os.path.join(
+        settings.BASE_DIR, 'profiles'))
+
+
+def frame_name(code):
+    name = '{} ({}:{})'.format(code.co_name,
+                               os.path.basename(code.co_filename),
+                               code.co_firstlineno)
+    # В collapsed stacks «;» разделяет кадры.
+    return name.replace(';', ':')
+
+
+class StackSampler:
+    """Сэмплер стеков текущего потока, начиная с вызвавшего кадра."""
+
+    def __init__(self, interval=INTERVAL):
+        self.interval = interval
+        self.stacks = Counter()
+        self.stopped = threading.Event()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        names = []
+        while frame is not None:
+            names.append(frame_name(frame.f_code))
+            if frame is self.root:
+                break
+            frame = frame.f_back
+        if names:
+            self.stacks[';'.join(reversed(names))] += 1
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def __enter__(self):
+        self.thread_id = threading.get_ident()
+        self.root = sys._getframe(1)
+        self.started = time.perf_counter()
+        self.thread = threading.Thread(
+            target=self.run, name='profiler', daemon=True)
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration = time.perf_counter() - self.started
+        self.stopped.set()
+        self.thread.join()
+        self.root = None
+
+
+def save(view, sampler):
+    """Пишет профиль и удаляет самые старые сверх PROFILING_MAX_FILES."""
+    directory = get_dir()
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    name = '{:.6f}-{}-{}{}'.format(
+        time.time(), os.getpid(), view.replace(':', '.'), SUFFIX)
+    path = os.path.join(directory, name)
+    with gzip.open(path, 'wt') as file:
+        json.dump({
+            'view': view,
+            'duration': sampler.duration,
+            'interval': sampler.interval,
+            'stacks': sampler.stacks,
+        }, file)
+    rotate(directory, getattr(settings, 'PROFILING_MAX_FILES', MAX_FILES))
+    return path
+
+
+def rotate(directory, max_files):
+    paths = sorted(glob.glob(os.path.join(directory, '*' + SUFFIX)),
+                   key=os.path.basename)
+    for path in paths[:-max_files]:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass  # удалил другой процесс
+
+
+def load(paths):
+    for path in paths:
+        try:
+            with gzip.open(path, 'rt') as file:
+                yield json.load(file)
+        except (OSError, ValueError):
+            continue  # файл пишется или уже удалён
+
+
+def merge(profiles):
+    """Складывает профили: {view: Counter(стек: число сэмплов)}."""
+    merged = {}
+    for profile in profiles:
+        merged.setdefault(profile['view'], Counter()).update(
+            profile['stacks'])
+    return merged
@@ -0,0 +1,60 @@
+"""Бюджет SQL-запросов на view.
+
+Превышение бюджета в строгом режиме (settings.QUERY_BUDGET_STRICT,
+его включают тесты) роняет запрос, иначе пишется в лог. Так N+1
+в шаблонах не проходит незамеченным.
+"""
+import logging
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+@contextmanager
+def budget(limit, name):
+    """Бюджет действует на каждую базу отдельно: выборка по всем шардам
+    повторяет одни и те же запросы в каждом из них."""
+    counters = {}
+    with ExitStack() as stack:
+        # Считаются запросы ко всем базам, в том числе к репликам.
+        for connection in connections.all():
+            counters[connection.alias] = QueryCounter()
+            stack.enter_context(
+                connection.execute_wrapper(counters[connection.alias]))
+        yield counters
+    alias, counter = max(counters.items(), key=lambda item: item[1].count)
+    if counter.count > limit:
+        message = (f'{name}: {counter.count} SQL-запросов к {alias} '
+                   f'при бюджете {limit}')
+        if getattr(settings, 'QUERY_BUDGET_STRICT', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+def query_budget(limit):
+    """Декоратор view: не больше limit запросов на один вызов."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with budget(limit, view.__name__):
+                return view(request, *args, **kwargs)
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
@@ -0,0 +1,172 @@
+"""Чтение списков с реплик базы.
+
+Реплики перечислены в DATABASE_REPLICAS. View с декоратором
+read_from_replica читает с реплики, отстающей не больше REPLICA_MAX_LAG
+секунд; пишет ReplicaRouter всегда в основную базу.
+
+Отставание считается по отметке Heartbeat: команда sync_replicas ставит
+её в основной базе и копирует базу в SQLite-реплики через backup API,
+поэтому в реплике лежит время, по состоянию на которое она снята.
+
+После записи ответ ставит cookie PIN_COOKIE на REPLICA_PIN_TIME секунд,
+и пока она есть, пользователь читает из основной базы: свою запись он
+увидит сразу, даже если реплика её ещё не получила.
+"""
+import math
+import random
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .metrics import registry
+from .models import Heartbeat
+
+PIN_COOKIE = 'pin_primary'
+PIN_TIME = 10  # sec, не меньше MAX_LAG
+MAX_LAG = 5  # sec
+CHECK_INTERVAL = 1  # sec
+
+_state = threading.local()
+_heartbeats = {}  # alias: (время проверки, отметка или None)
+
+
+def get_replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def get_max_lag():
+    return getattr(settings, 'REPLICA_MAX_LAG', MAX_LAG)
+
+
+def read_heartbeat(connection):
+    """Отметка из реплики или None, если реплика недоступна."""
+    try:
+        connection.ensure_connection()
+        # Мимо execute_wrapper: служебный запрос не считается во view.
+        cursor = connection.connection.cursor()
+        try:
+            cursor.execute('SELECT beat FROM {} WHERE id = 1'.format(
+                Heartbeat._meta.db_table))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+    except Exception:  # нет файла, нет таблицы, нет сети — не читаем
+        return None
+    return row[0] if row else None
+
+
+def get_beat(alias, now=None):
+    """Отметка реплики; перечитывается не чаще раза
+    в REPLICA_CHECK_INTERVAL секунд."""
+    now = time.time() if now is None else now
+    checked, beat = _heartbeats.get(alias, (-math.inf, None))
+    interval = getattr(settings, 'REPLICA_CHECK_INTERVAL', CHECK_INTERVAL)
+    if now - checked >= interval:
+        beat = read_heartbeat(connections[alias])
+        _heartbeats[alias] = (now, beat)
+    return beat
+
+
+def get_lag(alias, now=None):
+    """Отставание реплики в секундах."""
+    now = time.time() if now is None else now
+    beat = get_beat(alias, now)
+    return math.inf if beat is None else max(now - beat, 0)
+
+
+def has_changes_since(alias, since):
+    """Содержит ли реплика всё, что основная база зафиксировала до since:
+    отметка ставится перед копированием базы."""
+    beat = get_beat(alias)
+    return beat is not None and beat > since
+
+
+def choose_replica():
+    fresh = [alias for alias in get_replicas()
+             if get_lag(alias) <= get_max_lag()]
+    return random.choice(fresh) if fresh else None
+
+
+def is_pinned(request):
+    return PIN_COOKIE in request.COOKIES or wrote()
+
+
+def read_from_replica(view):
+    """Декоратор view, которое только читает: запросы идут на реплику."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not get_replicas():
+            return view(request, *args, **kwargs)
+        if is_pinned(request):
+            alias, reason = None, 'pinned'
+        else:
+            alias = choose_replica()
+            reason = 'replica' if alias else 'lagging'
+        registry.inc('yatube_replica_reads_total',
+                     database=alias or DEFAULT_DB_ALIAS, reason=reason)
+        request.replica = alias
+        previous = getattr(_state, 'alias', None)
+        _state.alias = alias
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.alias = previous
+    return wrapper
+
+
+def start_request():
+    _state.wrote = False
+
+
+def note_write():
+    _state.wrote = True
+
+
+def wrote():
+    """Была ли в текущем запросе запись через ORM."""
+    return getattr(_state, 'wrote', False)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return getattr(_state, 'alias', None)
+
+    def db_for_write(self, model, **hints):
+        note_write()
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db not in get_replicas():
+            # Django пишет в базу экземпляра, а нового — в основную.
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if {obj1._state.db, obj2._state.db} <= databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема приходит в реплики вместе с данными.
+        return False if db in get_replicas() else None
+
+
+def beat():
+    Heartbeat.objects.update_or_create(id=1, defaults={'beat': time.time()})
+
+
+def copy_database(source, path):
+    """Снимок базы source в файл SQLite path.
+
+    Копия пишется на место, а не подменяется: открытые соединения
+    читателей продолжают видеть файл и получают новые данные.
+    """
+    source.ensure_connection()
+    target = sqlite3.connect(path)
+    try:
+        source.connection.backup(target)
+    finally:
+        target.close()
@@ -0,0 +1,44 @@
+"""Настройки, общие для всех тестов: manage.py test включает их через
+TEST_RUNNER, pytest — фикстурой в conftest.py.
+"""
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+@contextmanager
+def test_settings():
+    # Общий кэш у каждого запуска свой, чтобы тесты не видели записей
+    # сервера разработки и бенчмарков, а те — записей тестов.
+    # Миниатюры строятся сразу, без пула: базу SQLite в памяти потоки
+    # делят через общий кэш страниц SQLite, где писатель не ждёт
+    # busy_timeout, а сразу получает «database table is locked».
+    # Превышение бюджета SQL-запросов view в тестах — ошибка.
+    # Журналы и снимки тестов тоже не смешиваются с рабочими.
+    with tempfile.TemporaryDirectory(prefix='yatube-test-') as directory, \
+            override_settings(CACHES={
+                **settings.CACHES,
+                'shared': {**settings.CACHES['shared'],
+                           'LOCATION': os.path.join(directory, 'cache')},
+            }, THUMBNAIL_WORKERS=0, QUERY_BUDGET_STRICT=True,
+                SLOW_QUERY_LOG=os.path.join(directory,
+                                            'slow-queries.jsonl'),
+                PROFILING_DIR=os.path.join(directory, 'profiles'),
+                METRICS_DIR=os.path.join(directory, 'metrics')):
+        yield
+
+
+class TestRunner(DiscoverRunner):
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.test_settings = ExitStack()
+        self.test_settings.enter_context(test_settings())
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,138 @@
+"""Журнал медленных SQL-запросов с планом выполнения.
+
+Запрос дольше SLOW_QUERY_THRESHOLD секунд пишется строкой JSON в
+SLOW_QUERY_LOG вместе с view, параметрами и выводом EXPLAIN. Команда
+slow_query_report группирует запросы по отпечатку SQL без литералов
+и показывает самые затратные по суммарному времени.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+THRESHOLD = 0.1  # sec
+
+_write_lock = threading.Lock()
+
+STRING = re.compile(r"'(?:[^']|'')*'")
+NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+PLACEHOLDER = re.compile(r'%s|\?')
+IN_LIST = re.compile(r'\bIN \(\?(?:, \?)*\)', re.IGNORECASE)
+SPACES = re.compile(r'\s+')
+
+
+def get_log_path():
+    return getattr(settings, 'SLOW_QUERY_LOG', os.path.join(
+        settings.BASE_DIR, 'slow-queries.jsonl'))
+
+
+def normalize(sql):
+    """SQL без литералов: запросы, отличающиеся только значениями,
+    и списки IN любой длины дают одну строку."""
+    sql = STRING.sub('?', sql)
+    sql = NUMBER.sub('?', sql)
+    sql = PLACEHOLDER.sub('?', sql)
+    sql = SPACES.sub(' ', sql).strip()
+    return IN_LIST.sub('IN (...)', sql)
+
+
+def fingerprint(sql):
+    return hashlib.md5(normalize(sql).encode()).hexdigest()[:12]
+
+
+def explain(connection, sql, params):
+    if not sql.lstrip().upper().startswith('SELECT'):
+        return []
+    prefix = ('EXPLAIN QUERY PLAN' if connection.vendor == 'sqlite'
+              else 'EXPLAIN')
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}', params)
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+    except Exception as error:  # план не важнее самого запроса
+        return [f'EXPLAIN не выполнен: {error}']
+
+
+def write(entry):
+    line = json.dumps(entry, ensure_ascii=False, default=str) + '\n'
+    with _write_lock, open(get_log_path(), 'a') as file:
+        file.write(line)
+
+
+class SlowQueryLogger:
+    """execute_wrapper, который пишет в журнал медленные запросы.
+
+    view_name вызывается только для медленных запросов, поэтому имя
+    view можно узнать уже после разбора URL.
+    """
+
+    def __init__(self, connection, view_name, threshold):
+        self.connection = connection
+        self.view_name = view_name
+        self.threshold = threshold
+        self.explaining = False
+
+    def __call__(self, execute, sql, params, many, context):
+        if self.explaining:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            if duration >= self.threshold:
+                self.log(sql, params, many, duration)
+
+    def log(self, sql, params, many, duration):
+        self.explaining = True
+        try:
+            plan = [] if many else explain(self.connection, sql, params)
+        finally:
+            self.explaining = False
+        write({
+            'time': timezone.now().isoformat(),
+            'view': self.view_name(),
+            'database': self.connection.alias,
+            'duration': round(duration, 6),
+            'fingerprint': fingerprint(sql),
+            'sql': sql,
+            'params': params if not many else None,
+            'plan': plan,
+        })
+
+
+def read(path):
+    with open(path) as file:
+        for line in file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue  # строку дописывает другой процесс
+
+
+def summarize(entries):
+    """Группы по отпечатку, по убыванию суммарного времени."""
+    groups = {}
+    for entry in entries:
+        group = groups.setdefault(entry['fingerprint'], {
+            'fingerprint': entry['fingerprint'],
+            'sql': normalize(entry['sql']),
+            'count': 0,
+            'total': 0.0,
+            'max': 0.0,
+            'views': set(),
+            'plan': [],
+        })
+        group['count'] += 1
+        group['total'] += entry['duration']
+        group['views'].add(entry['view'])
+        if entry['duration'] >= group['max']:
+            group['max'] = entry['duration']
+            group['plan'] = entry['plan']
+    return sorted(groups.values(), key=lambda group: -group['total'])
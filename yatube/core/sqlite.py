@@ -0,0 +1,119 @@
+"""Настройка соединений SQLite для работы под нагрузкой.
+
+PRAGMA из SQLITE_PRAGMAS выполняются для каждого нового соединения;
+без настройки не выполняется ни одна. Набор в настройках проекта — WAL,
+при котором писатель не блокирует читателей, synchronous=NORMAL
+(в режиме WAL не теряет целостность при сбое), кэш страниц и mmap
+побольше и busy_timeout, чтобы писатели ждали друг друга, а не получали
+«database is locked».
+
+serialized_write выполняет короткую пишущую транзакцию: потоки процесса
+встают в очередь на блокировку, а транзакция, не дождавшаяся блокировки
+базы, повторяется с растущей случайной паузой.
+"""
+import random
+import threading
+import time
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import (DEFAULT_DB_ALIAS, OperationalError, connections,
+                       transaction)
+
+from .metrics import registry
+
+WRITE_RETRIES = 4
+WRITE_BACKOFF = 0.05  # sec
+
+_write_locks = {}
+_write_locks_lock = threading.Lock()
+
+
+def apply_pragmas(sender, connection, **kwargs):
+    """Обработчик сигнала connection_created."""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    for name, value in pragmas.items():
+        # Мимо execute_wrapper: служебные запросы не считаются в метриках.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def get_write_lock(using):
+    with _write_locks_lock:
+        return _write_locks.setdefault(using, threading.Lock())
+
+
+def is_locked(error):
+    return 'locked' in str(error)  # database is locked, table is locked
+
+
+def backoff(attempt):
+    """Пауза перед повтором: full jitter, разводит писателей во времени."""
+    base = getattr(settings, 'SQLITE_WRITE_BACKOFF', WRITE_BACKOFF)
+    return random.uniform(0, base * 2 ** attempt)
+
+
+def run_serialized(func, args, kwargs, databases):
+    name = func.__name__
+    started = time.perf_counter()
+    with ExitStack() as stack:
+        # Блокировки берутся в одном порядке, чтобы не ждать друг друга
+        # по кругу. Во внешней транзакции BEGIN уже выполнен и очередь
+        # пройдена: повторный захват нереентерабельной блокировки
+        # повесил бы поток.
+        for using in databases:
+            if not connections[using].in_atomic_block:
+                stack.enter_context(get_write_lock(using))
+        locked = time.perf_counter()
+        registry.observe('yatube_db_lock_wait_seconds', locked - started,
+                         lock='process', function=name)
+        for using in databases:
+            stack.enter_context(transaction.atomic(using))
+        # BEGIN IMMEDIATE уже выполнен: здесь ждали блокировку базы.
+        registry.observe('yatube_db_lock_wait_seconds',
+                         time.perf_counter() - locked,
+                         lock='database', function=name)
+        return func(*args, **kwargs)
+
+
+def get_databases(using, args, kwargs):
+    if callable(using):
+        using = using(*args, **kwargs)
+    if isinstance(using, str):
+        return [using]
+    return sorted(set(using))
+
+
+def serialized_write(func=None, using=DEFAULT_DB_ALIAS):
+    """Декоратор пишущей транзакции с очередью и повторами.
+
+    using — псевдоним базы, список псевдонимов или функция, которая
+    получает аргументы вызова и возвращает одно или другое: транзакция
+    открывается во всех этих базах сразу.
+
+    Повтор безопасен: откат отменяет и запись, и on_commit. Внутри
+    внешней транзакции повторять нечего, там ошибка пробрасывается.
+    """
+    if func is None:
+        return lambda func: serialized_write(func, using)
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        databases = get_databases(using, args, kwargs)
+        if any(connections[alias].in_atomic_block for alias in databases):
+            return run_serialized(func, args, kwargs, databases)
+        retries = getattr(settings, 'SQLITE_WRITE_RETRIES', WRITE_RETRIES)
+        for attempt in range(retries + 1):
+            try:
+                return run_serialized(func, args, kwargs, databases)
+            except OperationalError as error:
+                if not is_locked(error) or attempt == retries:
+                    registry.inc('yatube_db_write_errors_total',
+                                 function=func.__name__)
+                    raise
+            registry.inc('yatube_db_write_retries_total',
+                         function=func.__name__)
+            time.sleep(backoff(attempt))
+    return wrapper
@@ -0,0 +1,19 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **kwargs):
+    """Часть страницы, своя у каждого пользователя.
+
+    В view с кэшем страниц выводит метку, которую заполнят после кэша,
+    в остальных view сразу выводит содержимое.
+    """
+    request = context['request']
+    if getattr(request, 'punch_holes', False):
+        return mark_safe(holes.punch(name, **kwargs))
+    return mark_safe(holes.render(request, name, **kwargs))
@@ -17,3 +17,11 @@ def uglify(text):
         else:
             new_text += text[i].lower()
     return new_text
+
+
+@register.filter
+def elided_page_range(page_obj):
+    paginator = page_obj.paginator
+    if hasattr(paginator, 'get_elided_page_range'):
+        return paginator.get_elided_page_range(page_obj.number)
+    return paginator.page_range
@@ -0,0 +1,141 @@
+from django.test import SimpleTestCase, override_settings
+
+from ..cache import ByteLRUCache, TwoTierCache
+from ..metrics import registry, render
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'two-tier-test',
+        'TIMEOUT': None,
+    },
+}
+
+
+def make_process(name, local_timeout=0):
+    """Кэш «другого процесса»: свой локальный уровень, общий shared."""
+    cache = TwoTierCache('shared', {
+        'OPTIONS': {'LOCAL_TIMEOUT': local_timeout}})
+    cache.local = ByteLRUCache(f'two-tier-test:{name}', {'TIMEOUT': None})
+    cache.local.clear()
+    return cache
+
+
+@override_settings(CACHES=CACHES)
+class TwoTierCacheTest(SimpleTestCase):
+
+    def setUp(self):
+        registry.values.clear()
+        self.first = make_process('first')
+        self.second = make_process('second')
+        self.first.shared.clear()
+
+    def test_value_is_shared_between_processes(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('missing', 'default'), 'default')
+        self.assertEqual(self.second.stats(), {
+            'local': {'hit': 1, 'miss': 2},
+            'shared': {'hit': 1, 'miss': 1},
+        })
+
+    def test_fresh_local_copy_is_not_checked(self):
+        second = make_process('third', local_timeout=60)
+        self.first.set('key', 'old')
+        self.assertEqual(second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(second.get('key'), 'old')
+
+    def test_write_invalidates_other_process(self):
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_incr_invalidates_other_process(self):
+        self.first.set('counter', 1)
+        self.assertEqual(self.second.get('counter'), 1)
+        self.assertEqual(self.first.incr('counter'), 2)
+        self.assertEqual(self.second.get('counter'), 2)
+        self.assertEqual(self.second.decr('counter'), 1)
+        self.assertEqual(self.first.get('counter'), 1)
+
+    def test_add_and_get_many(self):
+        self.assertTrue(self.first.add('a', 1))
+        self.assertFalse(self.second.add('a', 2))
+        self.second.set_many({'b': 2, 'c': 3})
+        self.assertEqual(self.first.get_many(['a', 'b', 'c', 'd']),
+                         {'a': 1, 'b': 2, 'c': 3})
+        self.second.delete_many(['a', 'b'])
+        self.assertEqual(self.first.get_many(['a', 'b', 'c']), {'c': 3})
+
+
+def make_cache(name, **options):
+    cache = ByteLRUCache(f'byte-lru-test:{name}', {'OPTIONS': options})
+    cache.clear()
+    return cache
+
+
+class ByteLRUCacheTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = make_cache('lru', MAX_BYTES=3 * 1200)
+        for key in 'abc':
+            cache.set(key, 'x' * 900)
+        cache.get('a')
+        cache.set('d', 'x' * 900)
+        self.assertEqual([key for key in 'abcd' if cache.has_key(key)],
+                         ['a', 'c', 'd'])
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertLessEqual(stats['bytes'], stats['max_bytes'])
+
+    def test_evicts_least_frequently_used(self):
+        cache = make_cache('lfu', MAX_BYTES=3 * 1200, POLICY='lfu')
+        for key in 'abc':
+            cache.set(key, 'x' * 900)
+        for key in 'aabb':
+            cache.get(key)
+        cache.set('d', 'x' * 900)
+        cache.get('d')
+        cache.set('e', 'x' * 900)
+        self.assertEqual([key for key in 'abcde' if cache.has_key(key)],
+                         ['a', 'b', 'e'])
+
+    def test_large_value_does_not_flush_cache(self):
+        cache = make_cache('large', MAX_BYTES=10_000)
+        cache.set('small', 1)
+        cache.set('huge', 'x' * 20_000)
+        self.assertIsNone(cache.get('huge'))
+        self.assertEqual(cache.get('small'), 1)
+
+    def test_compression(self):
+        plain = make_cache('plain')
+        compressed = make_cache('compressed', COMPRESS_MIN_BYTES=1000)
+        for cache in (plain, compressed):
+            cache.set('page', 'повтор ' * 1000)
+            self.assertEqual(cache.get('page'), 'повтор ' * 1000)
+        self.assertLess(compressed.stats()['bytes'] * 10,
+                        plain.stats()['bytes'])
+
+    def test_cache_api(self):
+        cache = make_cache('api')
+        self.assertTrue(cache.add('a', 1))
+        self.assertFalse(cache.add('a', 2))
+        self.assertEqual(cache.incr('a', 2), 3)
+        self.assertEqual(cache.get_many(['a', 'b']), {'a': 3})
+        cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(cache.get('expired'))
+        self.assertTrue(cache.delete('a'))
+        with self.assertRaises(ValueError):
+            cache.incr('a')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertIn('yatube_cache_bytes{cache="byte-lru-test:api"}',
+                      render(registry.snapshot()))
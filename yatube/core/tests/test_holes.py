@@ -0,0 +1,32 @@
+from django.template import Context, Template
+from django.test import RequestFactory, SimpleTestCase
+
+from .. import holes
+
+
+@holes.register('greeting')
+def greeting(request, who):
+    return f'<b>Привет, {who}, {request.path}</b>'
+
+
+class HolesTest(SimpleTestCase):
+    template = Template(
+        "{% load holes %}<p>{% hole 'greeting' who=name %}</p>")
+
+    def render(self, request):
+        return self.template.render(Context({
+            'request': request, 'name': 'Аня --> "x"'}))
+
+    def test_rendered_in_place_without_page_cache(self):
+        request = RequestFactory().get('/page/')
+        self.assertEqual(self.render(request),
+                         '<p><b>Привет, Аня --> "x", /page/</b></p>')
+
+    def test_filled_after_page_cache(self):
+        request = RequestFactory().get('/page/')
+        request.punch_holes = True
+        content = self.render(request)
+        self.assertNotIn('Привет', content)
+        self.assertEqual(
+            holes.fill(RequestFactory().get('/other/'), content),
+            '<p><b>Привет, Аня --> "x", /other/</b></p>')
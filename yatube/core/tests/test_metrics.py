@@ -0,0 +1,96 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..metrics import Registry, collect, registry, render
+
+User = get_user_model()
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            METRICS_DIR=self.dir.name, METRICS_TOKEN='secret')
+        self.settings_override.enable()
+        registry.values.clear()
+        cache.clear()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.dir.cleanup()
+
+    def test_render_histogram(self):
+        metrics = Registry()
+        metrics.observe('yatube_request_duration_seconds', 0.02,
+                        view='posts:main')
+        metrics.observe('yatube_request_duration_seconds', 20,
+                        view='posts:main')
+        text = render(metrics.snapshot())
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram',
+                      text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:main",le="0.01"} 0', text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:main",le="0.025"} 1', text)
+        self.assertIn('yatube_request_duration_seconds_bucket'
+                      '{view="posts:main",le="+Inf"} 2', text)
+        self.assertIn('yatube_request_duration_seconds_count'
+                      '{view="posts:main"} 2', text)
+
+    def test_collect_sums_processes(self):
+        other = Registry()
+        other.inc('yatube_requests_total', 2, view='posts:main')
+        with open(os.path.join(self.dir.name, '1.json'), 'w') as file:
+            json.dump(other.snapshot(), file)
+        registry.inc('yatube_requests_total', 3, view='posts:main')
+        self.assertEqual(
+            collect()[Registry.key('yatube_requests_total',
+                                   {'view': 'posts:main'})], 5)
+
+    def test_collect_removes_finished_processes(self):
+        other = Registry()
+        other.inc('yatube_requests_total', 2, view='posts:main')
+        finished = subprocess.run([sys.executable, '-c', 'import os; '
+                                   'print(os.getpid())'],
+                                  capture_output=True, text=True)
+        names = [f'{int(finished.stdout)}-1.json', f'{os.getpid()}-1.json']
+        for name in names:
+            with open(os.path.join(self.dir.name, name), 'w') as file:
+                json.dump(other.snapshot(), file)
+        registry.inc('yatube_requests_total', 3, view='posts:main')
+        self.assertEqual(
+            collect()[Registry.key('yatube_requests_total',
+                                   {'view': 'posts:main'})], 3)
+        self.assertEqual(os.listdir(self.dir.name),
+                         [registry.get_filename()])
+
+    def test_middleware_records_view_name(self):
+        self.client.get(reverse('posts:main'))
+        self.client.get(reverse('posts:main'))
+        text = render(registry.snapshot())
+        self.assertIn('yatube_requests_total'
+                      '{method="GET",status="200",view="posts:main"} 2', text)
+        self.assertIn('yatube_page_cache_total'
+                      '{result="hit",view="posts:main"} 1', text)
+        self.assertIn('yatube_db_queries_total{view="posts:main"}', text)
+
+    def test_endpoint_access(self):
+        url = reverse('metrics')
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.assertEqual(self.client.get(
+            url, HTTP_AUTHORIZATION='Bearer wrong').status_code, 403)
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.client.force_login(
+            User.objects.create_user('admin', is_staff=True))
+        self.assertEqual(self.client.get(url).status_code, 200)
@@ -0,0 +1,90 @@
+import glob
+import os
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.handlers.base import BaseHandler
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..profiling import StackSampler, load, rotate, save
+
+
+def busy_loop(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfilingTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        cache.clear()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def profiles(self):
+        return glob.glob(os.path.join(self.dir.name, '*.json.gz'))
+
+    def test_sampler_collects_stacks(self):
+        with StackSampler(0.001) as sampler:
+            busy_loop(0.05)
+        self.assertTrue(sampler.stacks)
+        stack = max(sampler.stacks, key=sampler.stacks.get)
+        self.assertTrue(stack.startswith('test_sampler_collects_stacks'))
+        self.assertIn(';busy_loop (test_profiling.py:', stack)
+
+    def test_not_sampled_by_default(self):
+        with override_settings(PROFILING_DIR=self.dir.name,
+                               PROFILING_TOKEN='secret'):
+            self.client.get(reverse('posts:main'))
+            self.client.get(reverse('posts:main'), HTTP_X_PROFILE='wrong')
+        self.assertEqual(self.profiles(), [])
+
+    def test_header_and_view_are_sampled(self):
+        with override_settings(PROFILING_DIR=self.dir.name,
+                               PROFILING_TOKEN='secret',
+                               PROFILING_VIEWS=['about:author']):
+            self.client.get(reverse('posts:main'), HTTP_X_PROFILE='secret')
+            self.client.get(reverse('about:author'))
+        views = sorted(profile['view'] for profile in load(self.profiles()))
+        self.assertEqual(views, ['about:author', 'posts:main'])
+
+    def test_sampled_view_runs_through_handler(self):
+        make_view_atomic = BaseHandler.make_view_atomic
+        with override_settings(PROFILING_DIR=self.dir.name,
+                               PROFILING_VIEWS=['posts:main']), \
+                mock.patch.object(BaseHandler, 'make_view_atomic',
+                                  autospec=True,
+                                  side_effect=make_view_atomic) as atomic:
+            response = self.client.get(reverse('posts:main'))
+        self.assertEqual(response.status_code, 200)
+        atomic.assert_called_once()
+        [profile] = load(self.profiles())
+        self.assertEqual(profile['view'], 'posts:main')
+
+    def test_rotate_keeps_newest(self):
+        for name in ('1', '2', '3'):
+            open(os.path.join(self.dir.name, name + '.json.gz'), 'w').close()
+        rotate(self.dir.name, 2)
+        self.assertEqual(sorted(map(os.path.basename, self.profiles())),
+                         ['2.json.gz', '3.json.gz'])
+
+    def test_merge_profiles_command(self):
+        with override_settings(PROFILING_DIR=self.dir.name):
+            for stacks in ({'a;b': 2, 'a;c': 1}, {'a;b': 3}):
+                sampler = StackSampler()
+                sampler.duration = 0.01
+                sampler.stacks.update(stacks)
+                save('posts:main', sampler)
+        with tempfile.TemporaryDirectory() as output:
+            call_command('merge_profiles', output, '--source',
+                         self.dir.name, stdout=StringIO())
+            with open(os.path.join(output, 'posts.main.collapsed')) as file:
+                self.assertEqual(file.read(), 'a;b 5\na;c 1\n')
@@ -0,0 +1,119 @@
+import math
+import os
+import tempfile
+from unittest import mock
+
+from django.db import connection, connections, router
+from django.http import HttpResponse
+from django.test import (Client, RequestFactory, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from core import replicas
+from posts.models import Post, User
+
+
+@replicas.read_from_replica
+def view(request):
+    return HttpResponse(router.db_for_read(Post))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_MAX_LAG=5)
+class ReadFromReplicaTest(SimpleTestCase):
+
+    def setUp(self):
+        replicas.start_request()
+        self.request = RequestFactory().get('/')
+
+    def read(self, lag):
+        with mock.patch.object(replicas, 'get_lag', return_value=lag):
+            return view(self.request).content.decode()
+
+    def test_fresh_replica(self):
+        self.assertEqual(self.read(lag=1), 'replica')
+        self.assertEqual(self.request.replica, 'replica')
+        self.assertEqual(router.db_for_read(Post), 'default')
+
+    def test_lagging_replica_skipped(self):
+        self.assertEqual(self.read(lag=10), 'default')
+        self.assertEqual(self.read(lag=math.inf), 'default')
+
+    def test_pinned_user_reads_primary(self):
+        self.request.COOKIES[replicas.PIN_COOKIE] = '1'
+        self.assertEqual(self.read(lag=0), 'default')
+
+    def test_write_pins_request(self):
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertEqual(self.read(lag=0), 'default')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.read(lag=0), 'default')
+
+    def test_replicas_not_migrated(self):
+        self.assertIs(router.allow_migrate('replica', 'posts'), False)
+        self.assertIs(router.allow_migrate('default', 'posts'), True)
+
+
+@override_settings(REPLICA_CHECK_INTERVAL=1)
+class LagTest(SimpleTestCase):
+
+    def setUp(self):
+        replicas._heartbeats.clear()
+
+    def test_heartbeat_read_once_per_interval(self):
+        with mock.patch.object(replicas, 'read_heartbeat',
+                               return_value=100) as read:
+            self.assertEqual(replicas.get_lag('replica', now=102), 2)
+            self.assertEqual(replicas.get_lag('replica', now=102.5), 2.5)
+            self.assertEqual(read.call_count, 1)
+            replicas.get_lag('replica', now=103)
+            self.assertEqual(read.call_count, 2)
+
+    def test_unavailable_replica(self):
+        with mock.patch.object(replicas, 'read_heartbeat',
+                               return_value=None):
+            self.assertEqual(replicas.get_lag('replica', now=100), math.inf)
+
+
+class SyncTest(TransactionTestCase):
+
+    def connect(self, path):
+        wrapper = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': path}, alias='copy')
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_copy_carries_heartbeat(self):
+        with mock.patch('core.replicas.time.time', return_value=1000):
+            replicas.beat()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'replica.sqlite3')
+            self.assertIsNone(replicas.read_heartbeat(self.connect(path)))
+            replicas.copy_database(connections['default'], path)
+            self.assertEqual(replicas.read_heartbeat(self.connect(path)),
+                             1000)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class PinMiddlewareTest(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='writer')
+        cls.post = Post.objects.create(text='текст', author=cls.user)
+
+    def setUp(self):
+        self.client = Client()
+        self.client.force_login(self.user)
+
+    def test_cookie_set_after_write(self):
+        response = self.client.post(
+            reverse('posts:add_comment', args=[self.post.id]),
+            {'text': 'комментарий'})
+        self.assertIn(replicas.PIN_COOKIE, response.cookies)
+
+    def test_no_cookie_after_read(self):
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.id]))
+        self.assertNotIn(replicas.PIN_COOKIE, response.cookies)
@@ -0,0 +1,66 @@
+import os
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..slow_queries import normalize, read, summarize
+
+
+class SlowQueriesTest(TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.dir.name, 'slow.jsonl')
+        cache.clear()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize("SELECT *  FROM t WHERE a = 'x''y' AND b = 10\n"
+                      'AND c IN (%s, %s, %s) LIMIT %s'),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...) LIMIT ?')
+        self.assertEqual(normalize('SELECT 1 WHERE id IN (%s)'),
+                         normalize('SELECT 2 WHERE id IN (%s, %s)'))
+
+    def test_threshold(self):
+        with override_settings(SLOW_QUERY_THRESHOLD=60,
+                               SLOW_QUERY_LOG=self.log):
+            self.client.get(reverse('posts:main'))
+        self.assertFalse(os.path.exists(self.log))
+
+    def test_logs_view_params_and_plan(self):
+        with override_settings(SLOW_QUERY_THRESHOLD=0,
+                               SLOW_QUERY_LOG=self.log):
+            self.client.get(reverse('posts:main'), {'page': 2})
+        entries = list(read(self.log))
+        self.assertTrue(entries)
+        self.assertEqual({entry['view'] for entry in entries},
+                         {'posts:main'})
+        selects = [entry for entry in entries
+                   if entry['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        if connection.vendor == 'sqlite':
+            self.assertTrue(all(entry['plan'] for entry in selects))
+
+    def test_report(self):
+        with override_settings(SLOW_QUERY_THRESHOLD=0,
+                               SLOW_QUERY_LOG=self.log):
+            for _ in range(2):
+                cache.clear()
+                self.client.get(reverse('posts:main'))
+        groups = summarize(read(self.log))
+        self.assertEqual(sum(group['count'] for group in groups),
+                         len(list(read(self.log))))
+        self.assertTrue(all(group['count'] == 2 for group in groups))
+        output = StringIO()
+        call_command('slow_query_report', '--log', self.log, '--top', '1',
+                     stdout=output)
+        self.assertIn('1. ' + groups[0]['fingerprint'], output.getvalue())
+        self.assertNotIn('2. ', output.getvalue())
@@ -0,0 +1,126 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.db import OperationalError, connection, connections
+from django.test import (SimpleTestCase, TestCase, TransactionTestCase,
+                         override_settings)
+
+from core import sqlite
+from core.metrics import registry
+
+
+@unittest.skipUnless(connection.vendor == 'sqlite', 'Только для SQLite.')
+class SqlitePragmasTest(SimpleTestCase):
+
+    def connect(self, path, **options):
+        wrapper = type(connections['default'])(
+            {**connection.settings_dict, 'NAME': path, 'OPTIONS': options},
+            alias='pragmas')
+        wrapper.ensure_connection()
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def pragma(self, wrapper, name):
+        with wrapper.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                SQLITE_PRAGMAS={'journal_mode': 'wal',
+                                'synchronous': 'normal',
+                                'busy_timeout': 1234}):
+            wrapper = self.connect(os.path.join(directory, 'db.sqlite3'))
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(wrapper, 'synchronous'), 1)
+            self.assertEqual(self.pragma(wrapper, 'busy_timeout'), 1234)
+
+    def test_no_pragmas(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                SQLITE_PRAGMAS={}):
+            wrapper = self.connect(os.path.join(directory, 'db.sqlite3'))
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+
+    def test_no_pragmas_without_setting(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings():
+            del settings.SQLITE_PRAGMAS
+            wrapper = self.connect(os.path.join(directory, 'db.sqlite3'))
+            self.assertEqual(self.pragma(wrapper, 'journal_mode'), 'delete')
+
+    def test_begin_immediate_takes_write_lock(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+                SQLITE_PRAGMAS={'busy_timeout': 0}):
+            path = os.path.join(directory, 'db.sqlite3')
+            first = self.connect(path, transaction_mode='IMMEDIATE')
+            second = self.connect(path, transaction_mode='immediate')
+            first._start_transaction_under_autocommit()
+            with self.assertRaisesMessage(OperationalError, 'locked'):
+                second._start_transaction_under_autocommit()
+            first.connection.rollback()
+
+
+def flaky(failures):
+    calls = []
+
+    def write():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise OperationalError('database is locked')
+        return len(calls)
+    return write
+
+
+def metric(name, **labels):
+    return registry.snapshot().get(registry.key(name, labels), 0)
+
+
+@mock.patch('core.sqlite.time.sleep')
+@override_settings(SQLITE_WRITE_RETRIES=2)
+class SerializedWriteTest(TransactionTestCase):
+
+    def test_retries_locked_transaction(self, sleep):
+        retries = metric('yatube_db_write_retries_total', function='write')
+        self.assertEqual(sqlite.serialized_write(flaky(2))(), 3)
+        self.assertEqual(sleep.call_count, 2)
+        self.assertEqual(
+            metric('yatube_db_write_retries_total', function='write'),
+            retries + 2)
+
+    def test_gives_up_after_retries(self, sleep):
+        errors = metric('yatube_db_write_errors_total', function='write')
+        with self.assertRaises(OperationalError):
+            sqlite.serialized_write(flaky(3))()
+        self.assertEqual(
+            metric('yatube_db_write_errors_total', function='write'),
+            errors + 1)
+
+    def test_nested_calls(self, sleep):
+        @sqlite.serialized_write
+        def inner():
+            return 'ok'
+
+        @sqlite.serialized_write
+        def outer():
+            return inner()
+
+        self.assertEqual(outer(), 'ok')
+
+    def test_other_errors_are_not_retried(self, sleep):
+        @sqlite.serialized_write
+        def write():
+            raise OperationalError('no such table')
+        with self.assertRaises(OperationalError):
+            write()
+        sleep.assert_not_called()
+
+
+class SerializedWriteInTransactionTest(TestCase):
+
+    def test_no_retries_inside_transaction(self):
+        with mock.patch('core.sqlite.time.sleep') as sleep, \
+                self.assertRaises(OperationalError):
+            sqlite.serialized_write(flaky(1))()
+        sleep.assert_not_called()
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import collect, render as render_metrics
 
 
 def page_not_found(request, exception):
@@ -11,3 +16,18 @@ def csrf_failure(request, reason=''):
 
 def error_500(request):
     return render(request, 'core/500.html')
+
+
+def metrics(request):
+    """Метрики всех процессов для Prometheus.
+
+    Доступ по заголовку `Authorization: Bearer <METRICS_TOKEN>`
+    или для сотрудников, вошедших на сайт.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = request.user.is_staff or (token and constant_time_compare(
+        request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'))
+    if not authorized:
+        return HttpResponseForbidden()
+    return HttpResponse(render_metrics(collect()),
+                        content_type='text/plain; version=0.0.4')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import fulltext
 from .models import Post, Group, Follow, Comment
 
 
@@ -11,6 +12,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        if not fulltext.is_available():
+            return super().get_search_results(request, queryset,
+                                              search_term)
+        match = fulltext.build_match(search_term)
+        if not match:
+            return queryset, False
+        return queryset.filter(id__in=fulltext.matching_ids(match)), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
     verbose_name = 'Посты'
+
+    def ready(self):
+        from . import holes, signals  # noqa: F401
+        from .fulltext import repair_after_migrate
+        from .sharding import reserve_ids_after_migrate
+        post_migrate.connect(reserve_ids_after_migrate, sender=self)
+        post_migrate.connect(repair_after_migrate, sender=self)
@@ -0,0 +1,238 @@
+"""Кэш страниц с инвалидацией по поколениям.
+
+Каждой области контента (вся лента, группа, автор, пост) соответствует
+счётчик поколения в кэше. Сигналы увеличивают счётчик, когда контент
+области меняется, и страница, сохранённая при других поколениях,
+считается устаревшей. Поэтому страницы можно хранить часами и сбрасывать
+ровно тогда, когда нужно.
+
+Чтобы при устаревании страницы её не пересчитывали все запросы сразу:
+- пересчитывает один запрос, взявший блокировку, остальные в это время
+  получают устаревшую страницу, если она моложе срока плюс STALE_TIME;
+- незадолго до истечения срока страница с вероятностью, растущей
+  к концу срока и со временем расчёта, пересчитывается заранее
+  (probabilistic early expiration, XFetch);
+- если страницы нет совсем, запросы ждут результата взявшего
+  блокировку не дольше LOCK_WAIT секунд.
+
+Страница одна для всех пользователей: части, зависящие от пользователя,
+выводятся тегом {% hole %} и заполняются после кэша (core.holes).
+Ответ гостю разрешено хранить прокси PUBLIC_MAX_AGE секунд, ответ
+вошедшему пользователю — только его браузеру.
+
+Страница, снятая с реплики (core.replicas), которая ещё не получила
+последнее изменение её областей, хранится не дольше допустимого
+отставания реплики, а пользователь, только что писавший
+в базу, получает страницу из основной базы мимо кэша.
+"""
+import hashlib
+import json
+import math
+import random
+import time
+from functools import wraps
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import patch_cache_control, patch_vary_headers
+
+from core import holes, replicas
+from core.metrics import collect, get_view_name, registry
+
+GLOBAL_SCOPE = 'global'
+GROUPS_SCOPE = 'groups'
+GROUP_SCOPE = 'group:{slug}'
+AUTHOR_SCOPE = 'author:{username}'
+POST_SCOPE = 'post:{post_id}'
+
+GENERATION_KEY = 'generation:{}'
+BUMPED_KEY = 'bumped:{}'
+LOCK_KEY = '{}:lock'
+STALE_TIME = 60  # sec
+LOCK_TIMEOUT = 30  # sec
+LOCK_WAIT = 2  # sec
+LOCK_POLL = 0.02  # sec
+BETA = 1.0
+PUBLIC_MAX_AGE = 60  # sec
+
+
+def _initial_generation():
+    # Счётчик, вытесненный из кэша, не должен начинаться заново с тех же
+    # номеров, иначе вернутся страницы, закэшированные до вытеснения.
+    return int(time.time() * 1000)
+
+
+def get_generation_key(scope, template=GENERATION_KEY):
+    # Слаги и имена пользователей бывают не ASCII, а memcached принимает
+    # только ASCII без пробелов.
+    return template.format(hashlib.md5(scope.encode()).hexdigest())
+
+
+def get_generations(*scopes):
+    keys = {scope: get_generation_key(scope) for scope in scopes}
+    found = cache.get_many(keys.values())
+    missing = {key: _initial_generation()
+               for key in keys.values() if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {scope: found[key] for scope, key in keys.items()}
+
+
+def bump(*scopes):
+    for scope in scopes:
+        key = get_generation_key(scope)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _initial_generation(), None)
+    if scopes:
+        # Время фиксации изменения: реплика с более поздней отметкой
+        # его уже содержит.
+        transaction.on_commit(lambda: cache.set_many({
+            get_generation_key(scope, BUMPED_KEY): time.time()
+            for scope in scopes}, None))
+
+
+def get_bump_time(scopes):
+    """Время последнего изменения областей; неизвестное — текущее."""
+    keys = [get_generation_key(scope, BUMPED_KEY) for scope in scopes]
+    found = cache.get_many(keys)
+    now = time.time()
+    missing = {key: now for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+    return max([*found.values(), *missing.values()], default=0)
+
+
+def get_stats():
+    """Попадания и промахи кэша страниц всех процессов по маршрутам."""
+    stats = {}
+    for key, value in collect().items():
+        name, labels = json.loads(key)
+        if name != 'yatube_page_cache_total':
+            continue
+        labels = dict(labels)
+        hits, misses = stats.get(labels['view'], (0, 0))
+        if labels['result'] in ('hit', 'stale'):
+            hits += value
+        else:
+            misses += value
+        stats[labels['view']] = (hits, misses)
+    return stats
+
+
+def recompute_early(expires, delta, beta, now=None):
+    """XFetch: пересчитать ли страницу до истечения срока.
+
+    delta — время прошлого расчёта; чем он дольше и чем ближе срок,
+    тем вероятнее ранний пересчёт.
+    """
+    now = time.time() if now is None else now
+    return now - delta * beta * math.log(1 - random.random()) >= expires
+
+
+class CachedView:
+    """View с кэшем страниц; см. cache_page_by_generation."""
+
+    def __init__(self, view, timeout, scopes, stale, beta):
+        self.view = view
+        self.timeout = timeout
+        self.scopes = scopes
+        self.stale = stale
+        self.beta = beta
+
+    def get_key(self, request):
+        return 'pages:{}:{}'.format(self.view.__name__, hashlib.md5(
+            request.get_full_path().encode()).hexdigest())
+
+    def compute(self, request, args, kwargs, key, generations):
+        started = time.perf_counter()
+        response = self.view(request, *args, **kwargs)
+        timeout = self.timeout
+        alias = getattr(request, 'replica', None)
+        if alias and not replicas.has_changes_since(
+                alias, get_bump_time(generations)):
+            # Реплика могла ещё не получить запись, сменившую поколение.
+            timeout = min(timeout, replicas.get_max_lag())
+        if response.status_code == 200:
+            cache.set(key, (generations, response,
+                            time.time() + timeout,
+                            time.perf_counter() - started),
+                      timeout + self.stale)
+        return response
+
+    def wait_for(self, key, generations):
+        """Ответ, который считает другой запрос, или None."""
+        deadline = time.monotonic() + LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(LOCK_POLL)
+            entry = cache.get(key)
+            if entry is not None and entry[0] == generations:
+                return entry[1]
+            if cache.get(LOCK_KEY.format(key)) is None:
+                return None
+        return None
+
+    def get(self, request, args, kwargs):
+        """Ответ и исход обращения к кэшу."""
+        generations = get_generations(
+            *(scope.format(**kwargs) for scope in self.scopes))
+        key = self.get_key(request)
+        if replicas.is_pinned(request):
+            # Страница в кэше могла быть снята с реплики до записи.
+            return (self.compute(request, args, kwargs, key, generations),
+                    'pinned')
+        entry = cache.get(key)
+        now = time.time()
+        fresh = False
+        if entry is not None:
+            cached_generations, response, expires, delta = entry
+            fresh = cached_generations == generations and now < expires
+            if fresh and not recompute_early(expires, delta, self.beta, now):
+                return response, 'hit'
+        lock = LOCK_KEY.format(key)
+        if cache.add(lock, 1, LOCK_TIMEOUT):
+            try:
+                return (self.compute(request, args, kwargs, key, generations),
+                        'early' if fresh else 'miss')
+            finally:
+                cache.delete(lock)
+        if entry is not None and now < expires + self.stale:
+            return response, 'stale'
+        response = self.wait_for(key, generations) if entry is None else None
+        if response is not None:
+            return response, 'hit'
+        return self.compute(request, args, kwargs, key, generations), 'miss'
+
+    def __call__(self, request, *args, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return self.view(request, *args, **kwargs)
+        request.punch_holes = True
+        response, outcome = self.get(request, args, kwargs)
+        registry.inc('yatube_page_cache_total',
+                     view=get_view_name(request), result=outcome)
+        if response.status_code == 200:
+            response.content = holes.fill(
+                request, response.content.decode(response.charset))
+        # Прокси различает гостей и вошедших только по Cookie.
+        patch_vary_headers(response, ('Cookie',))
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True)
+        else:
+            patch_cache_control(response, public=True,
+                                max_age=PUBLIC_MAX_AGE)
+        return response
+
+
+def cache_page_by_generation(timeout, *scopes, stale=STALE_TIME, beta=BETA):
+    """Кэширует ответ view с учётом поколений перечисленных областей.
+
+    Области задаются шаблонами, которые заполняются аргументами view,
+    например 'group:{slug}'. stale — сколько секунд после срока можно
+    отдавать страницу, пока её пересчитывает другой запрос; beta —
+    склонность к раннему пересчёту, 0 его отключает.
+    """
+    def decorator(view):
+        return wraps(view)(CachedView(view, timeout, scopes, stale, beta))
+    return decorator
@@ -0,0 +1,165 @@
+"""Материализованная лента подписок.
+
+Пост при сохранении раскладывается по лентам подписчиков автора
+(fan-out on write), поэтому страница `follow_index` читается одним
+диапазоном по индексу (user, pub_date, post). Для авторов с очень большим
+числом подписчиков раскладка не делается: их посты подмешиваются
+в ленту при чтении (pull on read). Когда автор набирает FANOUT_LIMIT
+подписчиков, его записи удаляются из лент, а когда число подписчиков
+опускается ниже предела, ленты всех подписчиков получают его посты.
+
+Записи ленты лежат в шарде автора поста рядом с постом (posts.sharding).
+"""
+from django.db import connection
+from django.db.models import F
+
+from .models import FeedEntry, Follow, Post, UserStats
+from .sharding import (ScatteredQuerySet, get_shards, is_sharded,
+                       shard_for_author)
+
+FANOUT_LIMIT = 1000  # подписчиков, начиная с которых автор читается на лету
+BATCH_SIZE = 500
+FEED_ORDERING = ('-feed_pub_date', '-feed_post')
+
+
+def is_pull_author(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id, followers__gte=FANOUT_LIMIT).exists()
+
+
+def count_followers(author_id):
+    return UserStats.objects.filter(user_id=author_id).values_list(
+        'followers', flat=True).first() or 0
+
+
+def pull_authors(user):
+    """Авторы из подписок пользователя, которых нет в его ленте."""
+    return Follow.objects.filter(
+        user=user, author__stats__followers__gte=FANOUT_LIMIT).values(
+        'author')
+
+
+def fan_out(post):
+    if is_pull_author(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    FeedEntry.objects.using(post._state.db).bulk_create(
+        (FeedEntry(user_id=user_id, post=post, author_id=post.author_id,
+                   pub_date=post.pub_date)
+         for user_id in followers.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def insert_history(author_id, user_ids):
+    """Кладёт все посты автора в ленты пользователей user_ids."""
+    shard = shard_for_author(author_id)
+    posts = Post.objects.using(shard).filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    FeedEntry.objects.using(shard).bulk_create(
+        (FeedEntry(user_id=user_id, post_id=post_id, author_id=author_id,
+                   pub_date=pub_date)
+         for user_id in user_ids
+         for post_id, pub_date in posts.iterator()),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(follow):
+    if not is_pull_author(follow.author_id):
+        insert_history(follow.author_id, [follow.user_id])
+
+
+def remove(follow):
+    FeedEntry.objects.using(shard_for_author(follow.author_id)).filter(
+        user_id=follow.user_id, author_id=follow.author_id).delete()
+
+
+def add_follower(follow):
+    """Ленты после подписки; счётчик подписчиков уже увеличен."""
+    followers = count_followers(follow.author_id)
+    if followers < FANOUT_LIMIT:
+        insert_history(follow.author_id, [follow.user_id])
+    elif followers == FANOUT_LIMIT:
+        # Автор стал pull: его посты подмешиваются при чтении.
+        FeedEntry.objects.using(shard_for_author(follow.author_id)).filter(
+            author_id=follow.author_id).delete()
+
+
+def remove_follower(follow):
+    """Ленты после отписки; счётчик подписчиков уже уменьшен."""
+    remove(follow)
+    if count_followers(follow.author_id) == FANOUT_LIMIT - 1:
+        # Автор снова раскладывается при записи: подписчикам, которые
+        # читали его на лету, нужна вся история.
+        insert_history(follow.author_id, Follow.objects.filter(
+            author_id=follow.author_id).values_list('user_id', flat=True))
+
+
+def get_feed(user):
+    """Лента пользователя, отсортированная по FEED_ORDERING.
+
+    Записи ленты и посты каждого автора, читаемого на лету, — отдельные
+    запросы: каждый читает диапазон своего индекса от курсора, а части
+    сливаются, как шарды в ScatteredQuerySet. Один запрос с OR по ним
+    сортировал бы всю ленту и все посты популярных авторов.
+    """
+    entries = Post.objects.filter(feed_entries__user=user).annotate(
+        feed_pub_date=F('feed_entries__pub_date'),
+        feed_post=F('feed_entries__post'),
+    ).order_by(*FEED_ORDERING)
+    parts = spread(entries)
+    # Подписки лежат в основной базе, подзапрос в шард не передать.
+    for author_id in pull_authors(user).values_list('author', flat=True):
+        parts += spread(Post.objects.filter(author_id=author_id).annotate(
+            feed_pub_date=F('pub_date'),
+            feed_post=F('id'),
+        ).order_by(*FEED_ORDERING))
+    if len(parts) == 1:
+        return parts[0]
+    return ScatteredQuerySet(parts)
+
+
+def spread(queryset):
+    if not is_sharded():
+        return [queryset]
+    return [queryset.using(shard) for shard in get_shards()]
+
+
+def rebuild():
+    """Раскладывает ленты всех подписчиков заново, например после
+    загрузки данных через bulk_create, которая не вызывает сигналы.
+
+    Одна вставка INSERT ... SELECT: каждой подписке достаются все посты
+    автора, авторы pull пропускаются.
+    Подписки и посты шардов лежат в разных базах, поэтому с шардами
+    ленты раскладываются по одной подписке.
+    """
+    if is_sharded():
+        return rebuild_sharded()
+    FeedEntry.objects.all().delete()
+    with connection.cursor() as cursor:
+        cursor.execute(f"""
+            INSERT INTO {FeedEntry._meta.db_table}
+                (user_id, post_id, author_id, pub_date)
+            SELECT follow.user_id, post.id, post.author_id, post.pub_date
+            FROM {Follow._meta.db_table} AS follow
+            JOIN {Post._meta.db_table} AS post
+                ON post.author_id = follow.author_id
+            WHERE follow.author_id NOT IN (
+                SELECT user_id FROM {UserStats._meta.db_table}
+                WHERE followers >= %s)
+        """, [FANOUT_LIMIT])
+        return cursor.rowcount
+
+
+def rebuild_sharded():
+    for shard in get_shards():
+        FeedEntry.objects.using(shard).all().delete()
+    for follow in Follow.objects.iterator():
+        backfill(follow)
+    return sum(FeedEntry.objects.using(shard).count()
+               for shard in get_shards())
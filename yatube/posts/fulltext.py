@@ -0,0 +1,259 @@
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Индекс `posts_post_fts` хранит только токены (external content):
+текст поста и название группы читаются из представления
+`posts_post_search`. Триггеры в базе обновляют индекс при любых
+изменениях постов и названий групп, в том числе при bulk-операциях.
+
+Перестройка таблицы posts_post миграцией SQLite удаляет триггеры,
+и индекс молча перестаёт обновляться. Поэтому после каждого migrate
+недостающие объекты индекса создаются заново, а индекс перестраивается.
+
+С шардами индекс есть в каждом шарде, выдачи шардов сливаются по bm25.
+"""
+import heapq
+import itertools
+import logging
+import re
+
+from django.db import connection, connections
+from django.db.migrations.recorder import MigrationRecorder
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+from .sharding import get_shards, is_sharded, scatter
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'posts_post_fts'
+INDEX_MIGRATION = ('posts', '0020_post_fulltext')
+SNIPPET_TOKENS = 16
+TEXT_WEIGHT = 1.0
+GROUP_WEIGHT = 0.5
+# Управляющие символы не встречаются в тексте и не трогаются escape(),
+# поэтому подсветку можно безопасно заменить на теги после экранирования.
+MARK_START = '\x02'
+MARK_END = '\x03'
+
+INSTALL_SQL = (
+    '''CREATE VIEW IF NOT EXISTS posts_post_search AS
+       SELECT post.id, post.text, grp.title AS group_title
+       FROM posts_post AS post
+       LEFT JOIN posts_group AS grp ON grp.id = post.group_id''',
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+       text, group_title,
+       content='posts_post_search', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2')''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+       AFTER INSERT ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+           new.id, new.text,
+           (SELECT title FROM posts_group WHERE id = new.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+       AFTER DELETE ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         VALUES (
+           'delete', old.id, old.text,
+           (SELECT title FROM posts_group WHERE id = old.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+       AFTER UPDATE OF text, group_id ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         VALUES (
+           'delete', old.id, old.text,
+           (SELECT title FROM posts_group WHERE id = old.group_id));
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+           new.id, new.text,
+           (SELECT title FROM posts_group WHERE id = new.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_group_fts_update
+       AFTER UPDATE OF title ON posts_group BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         SELECT 'delete', id, text, old.title
+         FROM posts_post WHERE group_id = old.id;
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title)
+         SELECT id, text, new.title FROM posts_post WHERE group_id = new.id;
+       END''',
+)
+INDEX_OBJECTS = (
+    'posts_post_search', FTS_TABLE, 'posts_post_fts_insert',
+    'posts_post_fts_delete', 'posts_post_fts_update',
+    'posts_group_fts_update',
+)
+UNINSTALL_SQL = (
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    'DROP VIEW IF EXISTS posts_post_search',
+)
+
+
+def is_available(using=connection):
+    return using.vendor == 'sqlite'
+
+
+def install(using=connection):
+    """Создаёт индекс и триггеры, если их нет."""
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        for sql in INSTALL_SQL:
+            cursor.execute(sql)
+
+
+def missing_objects(using=connection):
+    """Имена таблиц, представлений и триггеров индекса, которых нет."""
+    expected = set(INDEX_OBJECTS)
+    with using.cursor() as cursor:
+        cursor.execute('SELECT name FROM sqlite_master WHERE name IN ({})'
+                       .format(', '.join(['%s'] * len(expected))),
+                       sorted(expected))
+        return expected - {name for name, in cursor.fetchall()}
+
+
+def repair_after_migrate(sender, using, **kwargs):
+    """Восстанавливает индекс, если миграции удалили его триггеры."""
+    connection = connections[using]
+    if not is_available(connection) or (
+            INDEX_MIGRATION not in
+            MigrationRecorder(connection).applied_migrations()):
+        return
+    missing = missing_objects(connection)
+    if missing:
+        logger.warning('Индекс поиска в %s восстановлен, не хватало: %s',
+                       using, ', '.join(sorted(missing)))
+        rebuild(connection)
+
+
+def uninstall(using=connection):
+    if not is_available(using):
+        return
+    with using.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def rebuild(using=connection):
+    """Заново строит индекс по таблицам и сжимает его."""
+    install(using)
+    with using.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT COUNT(*) FROM {FTS_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def build_match(query):
+    """Переводит строку пользователя в запрос MATCH.
+
+    Каждое слово ищется по префиксу, слова объединяются через И.
+    Кавычки и операторы FTS5 из ввода отбрасываются.
+    """
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', query))
+
+
+def matching_ids(match):
+    """Подзапрос id постов, подходящих под MATCH, для фильтра id__in."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match,))
+
+
+def highlight(snippet):
+    return mark_safe(escape(snippet).replace(
+        MARK_START, '<mark>').replace(MARK_END, '</mark>'))
+
+
+class SearchResults:
+    """Ленивая выдача поиска для Paginator: COUNT и LIMIT/OFFSET по FTS.
+
+    Посты отсортированы по bm25 и несут подсвеченный фрагмент
+    в атрибуте snippet и оценку в атрибуте rank.
+    """
+
+    def __init__(self, match, using=connection):
+        self.match = match
+        self.using = using
+
+    def count(self):
+        if not self.match:
+            return 0
+        with self.using.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s', [self.match])
+            return cursor.fetchone()[0]
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if not self.match:
+            return []
+        start = index.start or 0
+        limit = -1 if index.stop is None else index.stop - start
+        with self.using.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid, snippet({FTS_TABLE}, -1, %s, %s, %s, %s), '
+                f'bm25({FTS_TABLE}, %s, %s) AS score '
+                f'FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s '
+                f'ORDER BY score LIMIT %s OFFSET %s',
+                [MARK_START, MARK_END, '…', SNIPPET_TOKENS, TEXT_WEIGHT,
+                 GROUP_WEIGHT, self.match, limit, start])
+            rows = cursor.fetchall()
+        posts = Post.objects.using(self.using.alias).select_related(
+            'author', 'group').in_bulk([post_id for post_id, *_ in rows])
+        results = []
+        for post_id, snippet, rank in rows:
+            post = posts.get(post_id)
+            if post is not None:
+                post.snippet = highlight(snippet)
+                post.rank = rank
+                results.append(post)
+        return results
+
+
+class ShardedSearchResults:
+    """Выдача поиска по всем шардам: срез [a:b] берёт первые b
+    результатов каждого шарда и сливает их по bm25."""
+
+    def __init__(self, match, shards):
+        self.parts = [SearchResults(match, connections[shard])
+                      for shard in shards]
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        merged = heapq.merge(*(part[:stop] for part in self.parts),
+                             key=lambda post: post.rank)
+        return list(itertools.islice(merged, start, stop))
+
+
+def search(query):
+    if not is_available():
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return Post.objects.none()
+        posts = Post.objects.select_related('author', 'group')
+        for term in terms:
+            posts = posts.filter(text__icontains=term)
+        return scatter(posts)
+    if is_sharded():
+        return ShardedSearchResults(build_match(query), get_shards())
+    return SearchResults(build_match(query))
@@ -0,0 +1,26 @@
+from django.template.loader import render_to_string
+
+from core.holes import register
+
+from .models import Follow
+
+
+@register('nav_tabs')
+def nav_tabs(request, index=False, follow=False):
+    return render_to_string('posts/includes/nav_tabs.html', {
+        'index': index,
+        'follow': follow,
+    }, request=request)
+
+
+@register('follow_button')
+def follow_button(request, author_id, username):
+    user = request.user
+    following = (user.is_authenticated and user.pk != author_id
+                 and Follow.objects.filter(author_id=author_id,
+                                           user=user).exists())
+    return render_to_string('posts/includes/follow_button.html', {
+        'author_id': author_id,
+        'username': username,
+        'following': following,
+    }, request=request)
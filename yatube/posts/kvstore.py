@@ -0,0 +1,115 @@
+"""Хранилище ключей sorl.thumbnail с локальным LRU и пакетным чтением.
+
+Порядок поиска ключа: LRU процесса, затем кэш Django, затем таблица
+KVStore. Объём LRU ограничен в байтах (THUMBNAIL_KV_LRU_BYTES). Ключ
+миниатюры зависит только от имени картинки и параметров, поэтому
+найденные значения можно держать в памяти, не проверяя их. Отсутствие
+ключа в LRU не запоминается: миниатюру может построить другой процесс.
+"""
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+LRU_BYTES = 4 * 1024 * 1024
+
+
+class ByteLimitedLRU:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def weight(key, value):
+        return len(key) + len(value)
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        weight = self.weight(key, value)
+        if weight > self.max_bytes:
+            return
+        with self.lock:
+            old = self.items.pop(key, None)
+            if old is not None:
+                self.size -= self.weight(key, old)
+            self.items[key] = value
+            self.size += weight
+            while self.size > self.max_bytes:
+                evicted_key, evicted = self.items.popitem(last=False)
+                self.size -= self.weight(evicted_key, evicted)
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                value = self.items.pop(key, None)
+                if value is not None:
+                    self.size -= self.weight(key, value)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+            self.size = 0
+
+
+class KVStore(cached_db_kvstore.KVStore):
+
+    def __init__(self):
+        super().__init__()
+        self.lru = ByteLimitedLRU(
+            getattr(settings, 'THUMBNAIL_KV_LRU_BYTES', LRU_BYTES))
+
+    def get_many_raw(self, keys):
+        """Находит ключи одним чтением кэша и одним запросом к базе."""
+        found = {}
+        for key in keys:
+            value = self.lru.get(key)
+            if value is not None:
+                found[key] = value
+        missing = [key for key in keys if key not in found]
+        if missing:
+            cached = self.cache.get_many(missing)
+            missing = [key for key in missing if key not in cached]
+            if missing:
+                stored = dict(KVStoreModel.objects.filter(
+                    key__in=missing).values_list('key', 'value'))
+                self.cache.set_many(
+                    {key: stored.get(key, EMPTY_VALUE) for key in missing},
+                    sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+                cached.update(stored)
+            for key, value in cached.items():
+                if value != EMPTY_VALUE:
+                    self.lru.set(key, value)
+                    found[key] = value
+        return found
+
+    def clear(self, delete_thumbnails=False):
+        self.lru.clear()
+        super().clear(delete_thumbnails)
+
+    def _get_raw(self, key):
+        value = self.lru.get(key)
+        if value is None:
+            value = super()._get_raw(key)
+            if value is not None:
+                self.lru.set(key, value)
+        return value
+
+    def _set_raw(self, key, value):
+        super()._set_raw(key, value)
+        self.lru.set(key, value)
+
+    def _delete_raw(self, *keys):
+        super()._delete_raw(*keys)
+        self.lru.delete(*keys)
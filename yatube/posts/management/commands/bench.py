@@ -0,0 +1,151 @@
+import json
+import math
+import random
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.urls import reverse
+
+from core.query_budget import QueryCounter
+from core.runner import test_settings
+from posts import seeding
+from posts.models import Group, Post, User
+
+CLIENTS = 10
+VIEWS = ('index', 'group_posts', 'profile', 'post_detail', 'follow_index',
+         'post_create', 'add_comment')
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу."""
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+class Command(BaseCommand):
+    help = ('Заполняет тестовую базу и измеряет перцентили времени ответа, '
+            'число SQL-запросов и размер ответа view приложения posts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--comments', type=int, default=10_000)
+        parser.add_argument('--requests', type=int, default=200,
+                            help='Запросов к каждому view.')
+        parser.add_argument('--warm', action='store_true',
+                            help='Не сбрасывать кэш между запросами.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', default='bench.json')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        # Как в тестах: отдельные база и кэш, DEBUG выключен, чтобы
+        # мерить ответы без панели отладки.
+        setup_test_environment(debug=False)
+        try:
+            with test_settings():
+                results = self.run(options)
+        finally:
+            teardown_test_environment()
+        with open(options['output'], 'w') as file:
+            json.dump(results, file, indent=2, ensure_ascii=False)
+        self.stdout.write(f'Результаты записаны в {options["output"]}.')
+
+    def make_requests(self, view):
+        """Генератор функций, каждая из которых делает один запрос."""
+        users = list(User.objects.all()[:CLIENTS])
+        clients = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+        guest = Client()
+        post_ids = list(Post.objects.values_list('id', flat=True)[:1000])
+        slugs = list(Group.objects.values_list('slug', flat=True))
+        usernames = list(User.objects.values_list(
+            'username', flat=True)[:1000])
+        rng = self.rng
+        while True:
+            page = {'page': rng.randint(1, 5)}
+            yield {
+                'index': lambda: guest.get(reverse('posts:main'), page),
+                'group_posts': lambda: guest.get(reverse(
+                    'posts:group_posts', args=[rng.choice(slugs)]), page),
+                'profile': lambda: guest.get(reverse(
+                    'posts:profile', args=[rng.choice(usernames)]), page),
+                'post_detail': lambda: guest.get(reverse(
+                    'posts:post_detail', args=[rng.choice(post_ids)])),
+                'follow_index': lambda: rng.choice(clients).get(
+                    reverse('posts:follow_index'), page),
+                'post_create': lambda: rng.choice(clients).post(
+                    reverse('posts:post_create'),
+                    {'text': 'Новый пост ' * rng.randint(1, 40)}),
+                'add_comment': lambda: rng.choice(clients).post(
+                    reverse('posts:add_comment',
+                            args=[rng.choice(post_ids)]),
+                    {'text': 'Новый комментарий'}),
+            }[view]
+
+    def run(self, options):
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            started = time.perf_counter()
+            seeding.seed(
+                users=options['users'], groups=options['groups'],
+                posts=options['posts'], follows=options['follows'],
+                comments=options['comments'], random_seed=options['seed'])
+            self.stdout.write(
+                f'База заполнена за {time.perf_counter() - started:.1f} с.')
+            return {
+                'volumes': {field: options[field] for field in (
+                    'users', 'groups', 'posts', 'follows', 'comments')},
+                'warm': options['warm'],
+                'views': {view: self.measure(view, options)
+                          for view in VIEWS},
+            }
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def measure(self, view, options):
+        timings, queries, sizes = [], [], []
+        requests = self.make_requests(view)
+        for _ in range(options['requests']):
+            request = next(requests)
+            if not options['warm']:
+                cache.clear()
+            counter = QueryCounter()
+            started = time.perf_counter()
+            with connection.execute_wrapper(counter):
+                response = request()
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code not in (200, 302):
+                raise CommandError(
+                    f'{view}: ответ {response.status_code}')
+            queries.append(counter.count)
+            sizes.append(len(response.content))
+        result = {
+            'requests': len(timings),
+            'mean_ms': round(statistics.mean(timings), 3),
+            'p50_ms': round(percentile(timings, 50), 3),
+            'p95_ms': round(percentile(timings, 95), 3),
+            'p99_ms': round(percentile(timings, 99), 3),
+            'queries_p50': percentile(queries, 50),
+            'queries_max': max(queries),
+            'bytes_mean': round(statistics.mean(sizes)),
+        }
+        self.stdout.write(
+            f'{view:<14} p50 {result["p50_ms"]:>8.2f} мс  '
+            f'p95 {result["p95_ms"]:>8.2f} мс  '
+            f'p99 {result["p99_ms"]:>8.2f} мс  '
+            f'запросов {result["queries_max"]:>3}  '
+            f'байт {result["bytes_mean"]:>7}')
+        return result
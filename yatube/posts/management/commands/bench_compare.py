@@ -0,0 +1,56 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Метрики и допустимый относительный рост; число запросов расти не должно.
+METRICS = {
+    'p50_ms': None,
+    'p95_ms': None,
+    'p99_ms': None,
+    'queries_max': 0,
+    'bytes_mean': None,
+}
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает два JSON-файла команды bench и сообщает '
+            'о регрессиях.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('baseline')
+        parser.add_argument('current')
+        parser.add_argument(
+            '--threshold', type=float, default=0.1,
+            help='Допустимый относительный рост времени и размера ответа.')
+
+    def handle(self, *args, **options):
+        baseline, current = (self.load(options[name])
+                             for name in ('baseline', 'current'))
+        regressions = []
+        self.stdout.write(f'{"view":<14} {"metric":<12} {"before":>10} '
+                          f'{"after":>10} {"change":>8}')
+        for view, after in current['views'].items():
+            before = baseline['views'].get(view)
+            if before is None:
+                continue
+            for metric, allowed in METRICS.items():
+                if allowed is None:
+                    allowed = options['threshold']
+                old, new = before[metric], after[metric]
+                change = (new - old) / old if old else 0
+                flag = ''
+                if new > old and change > allowed:
+                    flag = ' !'
+                    regressions.append(f'{view} {metric}')
+                self.stdout.write(f'{view:<14} {metric:<12} {old:>10} '
+                                  f'{new:>10} {change:>+8.1%}{flag}')
+        if regressions:
+            raise CommandError('Регрессии: ' + ', '.join(regressions))
+        self.stdout.write('Регрессий нет.')
+
+    def load(self, path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError) as error:
+            raise CommandError(f'{path}: {error}')
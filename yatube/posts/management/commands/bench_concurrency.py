@@ -0,0 +1,149 @@
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from django.test import Client, override_settings
+from django.test.utils import (setup_databases, setup_test_environment,
+                               teardown_databases, teardown_test_environment)
+from django.urls import reverse
+
+from posts import seeding
+from posts.management.commands.bench import percentile
+from posts.models import Post, User
+
+DUMMY_CACHES = {
+    alias: {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+    for alias in ('default', 'shared')
+}
+START_DELAY = 1  # sec, чтобы все процессы начали одновременно
+
+
+def read(client, rng, usernames, post_ids):
+    return rng.choice((
+        lambda: client.get(reverse('posts:main'),
+                           {'page': rng.randint(1, 5)}),
+        lambda: client.get(reverse('posts:profile',
+                                   args=[rng.choice(usernames)])),
+        lambda: client.get(reverse('posts:post_detail',
+                                   args=[rng.choice(post_ids)])),
+    ))()
+
+
+def write(client, rng, usernames, post_ids):
+    if rng.random() < 0.5:
+        return client.post(reverse('posts:post_create'),
+                           {'text': 'Новый пост ' * rng.randint(1, 40)})
+    return client.post(
+        reverse('posts:add_comment', args=[rng.choice(post_ids)]),
+        {'text': 'Новый комментарий'})
+
+
+def work(task):
+    """Шлёт запросы до deadline; возвращает задержки и число ошибок."""
+    kind, number, start, deadline = task
+    rng = random.Random(f'{kind}:{number}')
+    usernames = list(User.objects.values_list('username', flat=True)[:500])
+    post_ids = list(Post.objects.values_list('id', flat=True)[:2000])
+    client = Client()
+    if kind == 'write':
+        client.force_login(User.objects.get(username=usernames[number]))
+    request = read if kind == 'read' else write
+    timings, errors = [], 0
+    time.sleep(max(start - time.time(), 0))
+    while time.time() < deadline:
+        started = time.perf_counter()
+        try:
+            request(client, rng, usernames, post_ids)
+        except OperationalError:  # database is locked
+            errors += 1
+            continue
+        timings.append((time.perf_counter() - started) * 1000)
+    connections.close_all()
+    return kind, timings, errors
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пропускную способность чтения, пока другие процессы '
+            'пишут: с PRAGMA из SQLITE_PRAGMAS, BEGIN IMMEDIATE и повторами '
+            'записи и с настройками SQLite по умолчанию.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=4)
+        parser.add_argument('--writers', type=int, default=2)
+        parser.add_argument('--duration', type=float, default=5,
+                            help='Секунд нагрузки в каждом режиме.')
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument('--posts', type=int, default=5_000)
+        parser.add_argument('--mode', action='append',
+                            choices=('tuned', 'default'),
+                            help='По умолчанию оба режима.')
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"mode":<8} {"reads/s":>8} {"p50 мс":>8} {"p95 мс":>8} '
+            f'{"p99 мс":>8} {"writes/s":>9} {"r.err":>7} {"w.err":>7}')
+        database = connections['default'].settings_dict
+        tuned_options = database['OPTIONS']
+        for mode in options['mode'] or ('default', 'tuned'):
+            tuned = mode == 'tuned'
+            database['OPTIONS'] = tuned_options if tuned else {
+                name: value for name, value in tuned_options.items()
+                if name != 'transaction_mode'}
+            # Страницы не кэшируются: измеряется чтение из базы.
+            try:
+                with tempfile.TemporaryDirectory() as directory, \
+                        override_settings(
+                            SQLITE_PRAGMAS=(settings.SQLITE_PRAGMAS
+                                            if tuned else {}),
+                            SQLITE_WRITE_RETRIES=(
+                                settings.SQLITE_WRITE_RETRIES
+                                if tuned else 0),
+                            CACHES=DUMMY_CACHES,
+                            SLOW_QUERY_THRESHOLD=None):
+                    self.run(mode, os.path.join(directory, 'bench.sqlite3'),
+                             options)
+            finally:
+                database['OPTIONS'] = tuned_options
+
+    def run(self, mode, path, options):
+        # База в файле, а не в памяти: журнал и блокировки как в бою.
+        connections['default'].settings_dict['TEST']['NAME'] = path
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            seeding.seed(users=max(options['users'], options['writers']),
+                         posts=options['posts'], follows=10)
+            connections.close_all()
+            start = time.time() + START_DELAY
+            deadline = start + options['duration']
+            tasks = ([('read', number, start, deadline)
+                      for number in range(options['readers'])]
+                     + [('write', number, start, deadline)
+                        for number in range(options['writers'])])
+            context = multiprocessing.get_context('fork')
+            with context.Pool(len(tasks)) as pool:
+                results = pool.map(work, tasks)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+        reads = [timing for kind, timings, _ in results if kind == 'read'
+                 for timing in timings]
+        writes = sum(len(timings) for kind, timings, _ in results
+                     if kind == 'write')
+        read_errors = sum(errors for kind, _, errors in results
+                          if kind == 'read')
+        write_errors = sum(errors for kind, _, errors in results
+                           if kind == 'write')
+        duration = options['duration']
+        self.stdout.write(
+            f'{mode:<8} {len(reads) / duration:>8.1f} '
+            f'{statistics.median(reads) if reads else 0:>8.2f} '
+            f'{percentile(reads, 95) if reads else 0:>8.2f} '
+            f'{percentile(reads, 99) if reads else 0:>8.2f} '
+            f'{writes / duration:>9.1f} {read_errors:>7} {write_errors:>7}')
@@ -0,0 +1,57 @@
+import timeit
+
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.template.loader import get_template
+
+from posts.paginators import ElidedPaginator
+from posts.views import POSTS_COUNT
+
+# Шаблон пагинатора до появления окна ссылок: все номера страниц подряд.
+LEGACY_TEMPLATE = '''
+{% if page_obj.has_other_pages %}
+  <ul class="pagination">
+    {% for i in page_obj.paginator.page_range %}
+      {% if page_obj.number == i %}
+        <li class="page-item active">
+          <span class="page-link">{{ i }}</span>
+        </li>
+      {% else %}
+        <li class="page-item">
+          <a class="page-link" href="?page={{ i }}">{{ i }}</a>
+        </li>
+      {% endif %}
+    {% endfor %}
+  </ul>
+{% endif %}
+'''
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время рендера и размер includes/paginator.html '
+            'со старым шаблоном, выводящим все номера страниц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+',
+                            default=[1_000, 100_000, 1_000_000],
+                            help='Количество постов в ленте.')
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        templates = {
+            'legacy': engines['django'].from_string(LEGACY_TEMPLATE),
+            'elided': get_template('includes/paginator.html'),
+        }
+        self.stdout.write(f'{"posts":>10} {"template":>8} '
+                          f'{"ms/render":>10} {"bytes":>10}')
+        for size in options['sizes']:
+            paginator = ElidedPaginator(range(size), POSTS_COUNT)
+            page_obj = paginator.get_page(paginator.num_pages // 2)
+            for name, template in templates.items():
+                html = template.render({'page_obj': page_obj})
+                seconds = min(timeit.repeat(
+                    lambda: template.render({'page_obj': page_obj}),
+                    number=1, repeat=options['repeat']))
+                self.stdout.write(f'{size:>10} {name:>8} '
+                                  f'{seconds * 1000:>10.2f} '
+                                  f'{len(html.encode()):>10}')
@@ -0,0 +1,61 @@
+import timeit
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from sorl.thumbnail.kvstores import cached_db_kvstore
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from posts import thumbnails
+from posts.kvstore import KVStore
+from posts.models import Post
+from posts.views import POSTS_COUNT
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает время поиска миниатюр страницы постов: по ключу '
+            'на каждый тег и одним пакетом перед рендером.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        posts = list(Post.objects.exclude(image='')[:POSTS_COUNT])
+        if not posts:
+            raise CommandError('Нет постов с картинками.')
+        backend = thumbnails.PregeneratedThumbnailBackend()
+        files = [backend.get_thumbnail_file(post.image, geometry, **opts)[1]
+                 for post in posts for geometry, opts in thumbnails.SIZES]
+        keys = [add_prefix(thumbnail.key) for thumbnail in files]
+        stock = cached_db_kvstore.KVStore()
+        batched = KVStore()
+
+        def per_tag():
+            for thumbnail in files:
+                stock.get(thumbnail)
+
+        def prefetched():
+            batched.lru.clear()
+            batched.get_many_raw(keys)
+            for thumbnail in files:
+                batched.get(thumbnail)
+
+        self.stdout.write(f'Постов: {len(posts)}, миниатюр: {len(files)}.')
+        self.stdout.write(f'{"cache":>6} {"mode":>10} '
+                          f'{"ms/page":>8} {"queries":>8}')
+        for state in ('cold', 'warm'):
+            for name, resolve in (('per-tag', per_tag),
+                                  ('prefetch', prefetched)):
+                def run():
+                    if state == 'cold':
+                        cache.delete_many(keys)
+                    resolve()
+                run()
+                with CaptureQueriesContext(connection) as queries:
+                    run()
+                seconds = min(timeit.repeat(run, number=1,
+                                            repeat=options['repeat']))
+                self.stdout.write(
+                    f'{state:>6} {name:>10} {seconds * 1000:>8.3f} '
+                    f'{len(queries.captured_queries):>8}')
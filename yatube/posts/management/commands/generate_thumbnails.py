@@ -0,0 +1,48 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from posts import thumbnails
+from posts.cache import GLOBAL_SCOPE, GROUPS_SCOPE, bump
+from posts.models import Post
+
+
+def generate(name):
+    """Возвращает текст ошибки или None, чтобы одна битая картинка
+    не останавливала весь пул."""
+    try:
+        thumbnails.generate(name)
+    except Exception as error:
+        return f'{name}: {error}'
+    return None
+
+
+class Command(BaseCommand):
+    help = ('Строит миниатюры картинок всех постов параллельно '
+            'в нескольких процессах.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Число процессов; 0 — строить в текущем процессе.')
+        parser.add_argument('--chunksize', type=int, default=16)
+
+    def handle(self, *args, **options):
+        names = list(Post.objects.exclude(image='').order_by().values_list(
+            'image', flat=True).distinct())
+        if options['workers']:
+            # Дочерние процессы не должны делить соединение с базой.
+            connections.close_all()
+            with ProcessPoolExecutor(options['workers']) as pool:
+                errors = list(pool.map(generate, names,
+                                       chunksize=options['chunksize']))
+        else:
+            errors = [generate(name) for name in names]
+        errors = [error for error in errors if error]
+        for error in errors:
+            self.stderr.write(error)
+        # Страницы со ссылками на исходные картинки больше не нужны.
+        bump(GLOBAL_SCOPE, GROUPS_SCOPE)
+        self.stdout.write(f'Картинок: {len(names)}, ошибок: {len(errors)}.')
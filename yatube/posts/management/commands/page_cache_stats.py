@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from posts.cache import get_stats
+
+
+class Command(BaseCommand):
+    help = 'Показывает попадания в кэш страниц по каждому view.'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'{"view":<24} {"hits":>10} {"misses":>10} '
+                          f'{"hit rate":>9}')
+        for view_name, (hits, misses) in sorted(get_stats().items()):
+            total = hits + misses
+            rate = f'{hits / total:.1%}' if total else '-'
+            self.stdout.write(f'{view_name:<24} {hits:>10} {misses:>10} '
+                              f'{rate:>9}')
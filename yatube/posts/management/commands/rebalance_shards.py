@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts import sharding
+
+
+class Command(BaseCommand):
+    help = ('Копирует пользователей и группы во все шарды из POST_SHARDS '
+            'и переносит посты авторов, которые лежат не в своём шарде, '
+            'например после добавления шарда.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, каких авторов надо перенести.')
+
+    def handle(self, *args, **options):
+        moves = list(sharding.misplaced_authors())
+        if options['dry_run']:
+            for author_id, source, target in moves:
+                self.stdout.write(f'user {author_id}: {source} -> {target}')
+            self.stdout.write(f'Авторов к переносу: {len(moves)}.')
+            return
+        started = time.perf_counter()
+        count = sharding.sync_reference()
+        self.stdout.write(f'Справочники скопированы: {count} строк.')
+        posts = 0
+        for author_id, source, target in moves:
+            posts += sharding.move_author(author_id, source, target)
+        self.stdout.write(
+            f'Перенесено авторов: {len(moves)}, постов: {posts} '
+            f'за {time.perf_counter() - started:.1f} с.')
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from posts import fulltext
+from posts.sharding import get_shards
+
+
+class Command(BaseCommand):
+    help = ('Пересоздаёт полнотекстовый индекс постов и триггеры, '
+            'которые поддерживают его в актуальном состоянии, '
+            'в каждом шарде из POST_SHARDS.')
+
+    def handle(self, *args, **options):
+        if not fulltext.is_available():
+            raise CommandError('Полнотекстовый поиск работает только '
+                               'на SQLite.')
+        for shard in get_shards():
+            count = fulltext.rebuild(connections[shard])
+            self.stdout.write(f'В индексе постов {shard}: {count}.')
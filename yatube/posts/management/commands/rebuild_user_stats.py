@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счётчики постов, подписок и комментариев '
+            'пользователей по данным таблиц.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только проверить счётчики, ничего не записывая.')
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            wrong = stats.verify()
+            for user_id, values in wrong.items():
+                self.stdout.write(f'user {user_id}: ожидалось {values}')
+            if wrong:
+                raise CommandError(
+                    f'Неверные счётчики у {len(wrong)} пользователей.')
+            self.stdout.write('Счётчики верны.')
+            return
+        wrong = stats.rebuild()
+        self.stdout.write(f'Исправлено пользователей: {len(wrong)}.')
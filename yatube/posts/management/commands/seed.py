@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from posts import seeding
+
+
+class Command(BaseCommand):
+    help = ('Быстро заполняет базу синтетическими пользователями, '
+            'группами, постами, подписками и комментариями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10_000)
+        parser.add_argument('--follows', type=int, default=20,
+                            help='Среднее число подписок пользователя.')
+        parser.add_argument('--comments', type=int, default=10_000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='За сколько дней распределить посты.')
+        parser.add_argument('--processes', type=int, default=1)
+        parser.add_argument('--alpha', type=float, default=seeding.ALPHA,
+                            help='Показатель степенного закона подписок.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1 and connection.vendor == 'sqlite' and (
+                connection.is_in_memory_db()):
+            raise CommandError('База в памяти не видна другим процессам.')
+        started = last = time.perf_counter()
+
+        def log(stage, rows):
+            nonlocal last
+            now = time.perf_counter()
+            self.stdout.write(f'{stage:<10} {rows:>10} строк '
+                              f'{now - last:>8.1f} с')
+            last = now
+
+        try:
+            seeding.seed(
+                users=options['users'], groups=options['groups'],
+                posts=options['posts'], follows=options['follows'],
+                comments=options['comments'], days=options['days'],
+                processes=options['processes'], alpha=options['alpha'],
+                random_seed=options['seed'], log=log)
+        except ValueError as error:
+            raise CommandError(error)
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.1f} с.')
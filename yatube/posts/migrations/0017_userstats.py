@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 17:08
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+    sources = {
+        'posts': (apps.get_model('posts', 'Post'), 'author'),
+        'followers': (apps.get_model('posts', 'Follow'), 'author'),
+        'following': (apps.get_model('posts', 'Follow'), 'user'),
+        'comments': (apps.get_model('posts', 'Comment'), 'author'),
+    }
+    counts = {
+        field: dict(model.objects.using(db).order_by().values_list(key).annotate(
+            Count('id')))
+        for field, (model, key) in sources.items()
+    }
+    UserStats.objects.using(db).bulk_create(
+        [UserStats(user_id=user_id, **{
+            field: counts[field].get(user_id, 0) for field in counts})
+         for user_id in User.objects.using(db).values_list(
+             'id', flat=True)],
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0011_update_proxy_permissions'),
+        ('posts', '0016_auto_20261018_1703'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+                ('posts', models.PositiveIntegerField(default=0, verbose_name='Постов')),
+                ('followers', models.PositiveIntegerField(default=0, verbose_name='Подписчиков')),
+                ('following', models.PositiveIntegerField(default=0, verbose_name='Подписок')),
+                ('comments', models.PositiveIntegerField(default=0, verbose_name='Комментариев')),
+            ],
+            options={
+                'verbose_name': 'Статистику пользователя',
+                'verbose_name_plural': 'Статистика пользователей',
+            },
+        ),
+        migrations.RunPython(fill_stats, migrations.RunPython.noop),
+    ]
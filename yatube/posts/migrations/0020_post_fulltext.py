@@ -0,0 +1,77 @@
+from django.db import migrations
+
+# SQL записан здесь, а не взят из posts.fulltext: миграция должна делать
+# то же, что и при создании, как бы ни менялся модуль поиска.
+FTS_TABLE = 'posts_post_fts'
+
+INSTALL_SQL = (
+    '''CREATE VIEW IF NOT EXISTS posts_post_search AS
+       SELECT post.id, post.text, grp.title AS group_title
+       FROM posts_post AS post
+       LEFT JOIN posts_group AS grp ON grp.id = post.group_id''',
+    f'''CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+       text, group_title,
+       content='posts_post_search', content_rowid='id',
+       tokenize='unicode61 remove_diacritics 2')''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_insert
+       AFTER INSERT ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+           new.id, new.text,
+           (SELECT title FROM posts_group WHERE id = new.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_delete
+       AFTER DELETE ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         VALUES (
+           'delete', old.id, old.text,
+           (SELECT title FROM posts_group WHERE id = old.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_post_fts_update
+       AFTER UPDATE OF text, group_id ON posts_post BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         VALUES (
+           'delete', old.id, old.text,
+           (SELECT title FROM posts_group WHERE id = old.group_id));
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title) VALUES (
+           new.id, new.text,
+           (SELECT title FROM posts_group WHERE id = new.group_id));
+       END''',
+    f'''CREATE TRIGGER IF NOT EXISTS posts_group_fts_update
+       AFTER UPDATE OF title ON posts_group BEGIN
+         INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text, group_title)
+         SELECT 'delete', id, text, old.title
+         FROM posts_post WHERE group_id = old.id;
+         INSERT INTO {FTS_TABLE}(rowid, text, group_title)
+         SELECT id, text, new.title FROM posts_post WHERE group_id = new.id;
+       END''',
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')",
+)
+UNINSTALL_SQL = (
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+    'DROP VIEW IF EXISTS posts_post_search',
+)
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        if schema_editor.connection.vendor != 'sqlite':
+            return
+        for sql in statements:
+            schema_editor.execute(sql, params=None)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_auto_20261018_1713'),
+    ]
+
+    operations = [
+        migrations.RunPython(run(INSTALL_SQL), run(UNINSTALL_SQL)),
+    ]
@@ -0,0 +1,38 @@
+from django.db import migrations
+
+FANOUT_LIMIT = 1000
+BATCH_SIZE = 500
+
+
+def fill_history(apps, schema_editor):
+    """Дополняет ленты постами старше 200 последних, которые
+    не попали в них при заполнении в 0016."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    db = schema_editor.connection.alias
+    pull_authors = UserStats.objects.using(db).filter(
+        followers__gte=FANOUT_LIMIT).values('user_id')
+    follows = Follow.objects.using(db).exclude(author_id__in=pull_authors)
+    for follow in follows.iterator():
+        posts = Post.objects.using(db).filter(
+            author_id=follow.author_id).values_list('id', 'pub_date')
+        FeedEntry.objects.using(db).bulk_create(
+            (FeedEntry(user_id=follow.user_id, post_id=post_id,
+                       author_id=follow.author_id, pub_date=pub_date)
+             for post_id, pub_date in posts.iterator()),
+            batch_size=BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_post_fulltext'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_history, migrations.RunPython.noop),
+    ]
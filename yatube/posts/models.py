@@ -7,6 +7,17 @@ from core.models import CreatedModel
 User = get_user_model()
 
 
+class ShardedQuerySet(models.QuerySet):
+    """create() без using выбирает базу по новому объекту, как save():
+    так роутер шардов кладёт пост к автору (posts.sharding)."""
+
+    def create(self, **kwargs):
+        obj = self.model(**kwargs)
+        self._for_write = True
+        obj.save(force_insert=True, using=self._db)
+        return obj
+
+
 class Group(models.Model):
     title = models.CharField(max_length=200, verbose_name='Название')
     slug = models.SlugField(max_length=100, unique=True,
@@ -43,10 +54,21 @@ class Post(CreatedModel):
         blank=True
     )
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы по возрастанию: SQLite читает их и в обратную сторону,
+        # а неявный rowid в конце индекса закрывает сортировку по id.
+        indexes = (
+            models.Index(fields=('pub_date',), name='post_pub_date_idx'),
+            models.Index(fields=('author', 'pub_date'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', 'pub_date'),
+                         name='post_group_pub_date_idx'),
+        )
 
     def __str__(self):
         return self.text[:15]
@@ -67,9 +89,15 @@ class Comment(CreatedModel):
     )
     text = models.TextField(verbose_name='Текст')
 
+    objects = ShardedQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = (
+            models.Index(fields=('post', 'pub_date'),
+                         name='comment_post_pub_date_idx'),
+        )
 
 
 class Follow(CreatedModel):
@@ -99,3 +127,62 @@ class Follow(CreatedModel):
                 name='%(class)s_user_author_constraint'
             ),
         )
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = (
+            models.Index(fields=('user', 'pub_date', 'post'),
+                         name='feed_user_pub_date_post_idx'),
+        )
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='%(class)s_user_post_constraint'
+            ),
+        )
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, которые иначе пришлось бы считать COUNT."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts = models.PositiveIntegerField('Постов', default=0)
+    followers = models.PositiveIntegerField('Подписчиков', default=0)
+    following = models.PositiveIntegerField('Подписок', default=0)
+    comments = models.PositiveIntegerField('Комментариев', default=0)
+
+    class Meta:
+        verbose_name = 'Статистику пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+
+    def __str__(self):
+        return f'{self.user}: {self.posts} постов'
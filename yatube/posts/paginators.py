@@ -0,0 +1,175 @@
+"""Пагинаторы для лент постов."""
+import base64
+import binascii
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+CURSOR_PARAM = 'cursor'
+DEFAULT_ORDERING = ('-pub_date', '-id')
+COUNT_CACHE_TIME = 60  # sec
+COUNT_VERSION_KEY = 'paginator:count_version'
+PAGE_LINKS_AROUND = 2
+PAGE_LINKS_ON_ENDS = 1
+
+
+def invalidate_counts():
+    """Сбрасывает все закэшированные количества постов."""
+    try:
+        cache.incr(COUNT_VERSION_KEY)
+    except ValueError:
+        cache.set(COUNT_VERSION_KEY, 1, None)
+
+
+class ElidedPaginator(Paginator):
+    """Пагинатор с окном ссылок и кэшированным количеством объектов.
+
+    Вместо всех номеров страниц отдаёт первую и последнюю плюс
+    несколько соседних с текущей, а COUNT(*) кэширует по тексту
+    запроса до создания или удаления поста.
+    """
+    ELLIPSIS = '…'
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, 'query', None)
+        if query is None:
+            return super().count
+        sql, params = query.sql_with_params()
+        signature = hashlib.md5(f'{sql}{params!r}'.encode()).hexdigest()
+        key = 'paginator:count:{}:{}'.format(
+            cache.get(COUNT_VERSION_KEY, 0), signature)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_TIME)
+        return count
+
+    def get_elided_page_range(self, number=1, on_each_side=PAGE_LINKS_AROUND,
+                              on_ends=PAGE_LINKS_ON_ENDS):
+        number = self.validate_number(number)
+        if self.num_pages <= (on_each_side + on_ends) * 2 + 1:
+            yield from self.page_range
+            return
+        if number > on_each_side + on_ends + 2:
+            yield from range(1, on_ends + 1)
+            yield self.ELLIPSIS
+            yield from range(number - on_each_side, number + 1)
+        else:
+            yield from range(1, number + 1)
+        if number < self.num_pages - on_each_side - on_ends - 1:
+            yield from range(number + 1, number + on_each_side + 1)
+            yield self.ELLIPSIS
+            yield from range(self.num_pages - on_ends + 1,
+                             self.num_pages + 1)
+        else:
+            yield from range(number + 1, self.num_pages + 1)
+
+
+class CursorPage(Page):
+    """Страница, на которую переходят по курсору, а не по номеру."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f'<Cursor page of {len(self)} objects>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator:
+    """Keyset-пагинация: страница ищется по ключу (pub_date, id)
+    или по двум полям явной сортировки запроса.
+
+    Не считает COUNT(*) и не делает OFFSET, поэтому любая страница
+    стоит столько же, сколько первая. Курсоры непрозрачны для клиента.
+    """
+    is_cursor = True
+
+    def __init__(self, object_list, per_page, ordering=None):
+        self.object_list = object_list
+        self.per_page = int(per_page)
+        # Явная сортировка запроса (например, по полям ленты) важнее
+        # сортировки по умолчанию.
+        if ordering is None:
+            ordering = object_list.query.order_by
+            if len(ordering) != 2:
+                ordering = DEFAULT_ORDERING
+        self.ordering = ordering
+        self.fields = [name.lstrip('-') for name in ordering]
+        self.descending = ordering[0].startswith('-')
+
+    def encode(self, obj, backwards=False):
+        values = [str(getattr(obj, field)) for field in self.fields]
+        return base64.urlsafe_b64encode(
+            json.dumps([backwards, values]).encode()).decode()
+
+    def get_field(self, name):
+        annotation = self.object_list.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        return self.object_list.model._meta.get_field(name)
+
+    def decode(self, cursor):
+        """Возвращает (значения ключа, назад ли) или None для начала."""
+        if not cursor:
+            return None
+        try:
+            backwards, values = json.loads(
+                base64.urlsafe_b64decode(cursor.encode()))
+            if len(values) != len(self.fields):
+                return None
+            return [
+                self.get_field(field).to_python(value)
+                for field, value in zip(self.fields, values)
+            ], bool(backwards)
+        except (ValueError, TypeError, binascii.Error, ValidationError):
+            return None
+
+    def seek(self, values, backwards):
+        first, second = self.fields
+        lookup = 'lt' if self.descending != backwards else 'gt'
+        return (Q(**{f'{first}__{lookup}': values[0]})
+                | Q(**{first: values[0], f'{second}__{lookup}': values[1]}))
+
+    def get_page(self, cursor):
+        position = self.decode(cursor)
+        queryset = self.object_list.order_by(*self.ordering)
+        backwards = False
+        if position is not None:
+            values, backwards = position
+            queryset = queryset.filter(self.seek(values, backwards))
+            if backwards:
+                queryset = queryset.reverse()
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if not rows:
+            if position is not None:
+                return self.get_page(None)
+            return CursorPage(rows, self)
+        if backwards:
+            rows.reverse()
+            return CursorPage(
+                rows, self,
+                next_cursor=self.encode(rows[-1]),
+                previous_cursor=(self.encode(rows[0], backwards=True)
+                                 if has_more else None))
+        return CursorPage(
+            rows, self,
+            next_cursor=self.encode(rows[-1]) if has_more else None,
+            previous_cursor=(self.encode(rows[0], backwards=True)
+                             if position is not None else None))
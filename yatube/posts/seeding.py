@@ -0,0 +1,234 @@
+"""Быстрое заполнение базы синтетическими данными для нагрузочных тестов.
+
+Строки создаются генераторами и пишутся многострочными INSERT порциями,
+каждая порция в своей транзакции, поэтому память не растёт с объёмом.
+Посты, подписки и комментарии можно писать несколькими процессами:
+каждый получает свой непересекающийся диапазон id. Строки процессы
+генерируют параллельно, а порции записывают по очереди: SQLite всё
+равно допускает только одного писателя.
+"""
+import bisect
+import itertools
+import random
+from contextlib import nullcontext
+from datetime import timedelta
+from multiprocessing import Lock, Pool
+
+from django.db import connections, transaction
+from django.db.models import AutoField, Max, sql
+from django.utils import timezone
+
+from . import feed, stats
+from .cache import GLOBAL_SCOPE, GROUPS_SCOPE, bump
+from .models import Comment, Follow, Group, Post, User
+from .paginators import invalidate_counts
+
+CHUNK_SIZE = 20_000  # строк в одной транзакции
+ALPHA = 1.1  # показатель степенного распределения популярности авторов
+NO_GROUP_SHARE = 0.2
+# Длина текста в словах распределена логнормально: медиана около 20 слов,
+# длинный хвост до MAX_WORDS.
+WORDS_MU = 3.0
+WORDS_SIGMA = 0.9
+MAX_WORDS = 1_000
+WORDS = (
+    'сегодня', 'вчера', 'город', 'утро', 'вечер', 'кот', 'собака', 'книга',
+    'дорога', 'море', 'солнце', 'дождь', 'работа', 'друг', 'новый', 'старый',
+    'большой', 'маленький', 'красивый', 'быстро', 'медленно', 'очень',
+    'снова', 'всегда', 'иногда', 'думаю', 'вижу', 'пишу', 'читаю', 'гуляю',
+    'и', 'в', 'на', 'с', 'по', 'но', 'что', 'как', 'это', 'мы', 'они',
+    'фото', 'поезд', 'лес', 'река', 'кофе', 'музыка', 'праздник', 'проект',
+)
+
+
+class PowerLaw:
+    """Выбирает элементы последовательности с весами 1 / rank ** alpha."""
+
+    def __init__(self, items, alpha=ALPHA):
+        self.items = items
+        self.cum_weights = list(itertools.accumulate(
+            1 / rank ** alpha for rank in range(1, len(items) + 1)))
+
+    def __call__(self, rng):
+        index = bisect.bisect(self.cum_weights,
+                              rng.random() * self.cum_weights[-1])
+        return self.items[min(index, len(self.items) - 1)]
+
+
+def insert_raw(model, objs, using='default', ignore_conflicts=False):
+    """Вставляет объекты, как bulk_create, но заданные значения полей
+    берёт как есть (как loaddata): pub_date не заменяется текущим
+    временем. Пустые поля заполняет pre_save. Сигналы не отправляются."""
+    connection = connections[using]
+    for obj in objs:
+        for field in model._meta.concrete_fields:
+            if getattr(obj, field.attname) is None:
+                setattr(obj, field.attname, field.pre_save(obj, add=True))
+    with_pk = [obj for obj in objs if obj.pk is not None]
+    without_pk = [obj for obj in objs if obj.pk is None]
+    for group, fields in (
+            (with_pk, model._meta.concrete_fields),
+            (without_pk, [field for field in model._meta.concrete_fields
+                          if not isinstance(field, AutoField)])):
+        if not group:
+            continue
+        batch_size = max(connection.ops.bulk_batch_size(fields, group), 1)
+        for start in range(0, len(group), batch_size):
+            query = sql.InsertQuery(model, ignore_conflicts=ignore_conflicts)
+            query.insert_values(fields, group[start:start + batch_size],
+                                raw=True)
+            query.get_compiler(using=using).execute_sql()
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+_write_lock = nullcontext()
+
+
+def insert(model, rows, chunk_size=CHUNK_SIZE):
+    count = 0
+    for chunk in chunks(rows, chunk_size):
+        with _write_lock, transaction.atomic():
+            insert_raw(model, chunk)
+        count += len(chunk)
+    return count
+
+
+def make_text(rng):
+    words = min(max(int(rng.lognormvariate(WORDS_MU, WORDS_SIGMA)), 1),
+                MAX_WORDS)
+    return ' '.join(rng.choices(WORDS, k=words)).capitalize() + '.'
+
+
+def random_date(rng, now, days):
+    return now - timedelta(seconds=rng.random() * days * 24 * 60 * 60)
+
+
+def generate_posts(rng, ids, authors, group_ids, now, days):
+    for post_id in ids:
+        group_id = None
+        if group_ids and rng.random() > NO_GROUP_SHARE:
+            group_id = rng.choice(group_ids)
+        yield Post(id=post_id, text=make_text(rng), author_id=authors(rng),
+                   group_id=group_id, pub_date=random_date(rng, now, days))
+
+
+def generate_follows(rng, user_ids, authors, follows):
+    """Подписки: число на пользователя экспоненциально распределено
+    вокруг follows, авторы выбираются по степенному закону."""
+    for user_id in user_ids:
+        wanted = min(int(rng.expovariate(1 / follows)),
+                     len(authors.items) - 1)
+        chosen = set()
+        for _ in range(wanted * 3):
+            if len(chosen) >= wanted:
+                break
+            author_id = authors(rng)
+            if author_id != user_id:
+                chosen.add(author_id)
+        for author_id in chosen:
+            yield Follow(user_id=user_id, author_id=author_id)
+
+
+def generate_comments(rng, count, post_ids, user_ids, now, days):
+    for _ in range(count):
+        yield Comment(post_id=rng.choice(post_ids),
+                      author_id=rng.choice(user_ids), text=make_text(rng),
+                      pub_date=random_date(rng, now, days))
+
+
+def next_id(model):
+    return (model.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+
+
+def split(ids, parts):
+    size = -(-len(ids) // parts)
+    return [ids[start:start + size] for start in range(0, len(ids), size)]
+
+
+def _init_worker(lock):
+    global _write_lock
+    _write_lock = lock
+
+
+def _seed_part(task):
+    kind, seed, ids, context = task
+    rng = random.Random(f'{seed}:{kind}:{ids[0] if ids else 0}')
+    if kind == 'posts':
+        return insert(Post, generate_posts(rng, ids, **context))
+    if kind == 'follows':
+        return insert(Follow, generate_follows(rng, ids, **context))
+    return insert(Comment, generate_comments(rng, len(ids), **context))
+
+
+def run_parts(kind, seed, ids, context, processes):
+    tasks = [(kind, seed, part, context)
+             for part in split(ids, processes) if part]
+    if processes == 1:
+        return sum(map(_seed_part, tasks))
+    # Дочерние процессы не должны делить соединение с базой.
+    connections.close_all()
+    with Pool(processes, _init_worker, (Lock(),)) as pool:
+        return sum(pool.map(_seed_part, tasks))
+
+
+def seed(users=0, groups=0, posts=0, follows=0, comments=0, days=365,
+         processes=1, alpha=ALPHA, random_seed=0, log=None):
+    """Создаёт данные и пересчитывает производные таблицы.
+
+    log(этап, строк) вызывается после каждого этапа.
+    """
+    log = log or (lambda stage, rows: None)
+    rng = random.Random(random_seed)
+    now = timezone.now()
+
+    first = next_id(User)
+    user_ids = range(first, first + users)
+    log('users', insert(User, (
+        User(id=user_id, username=f'seed{user_id}') for user_id in user_ids)))
+    if not users:
+        user_ids = list(User.objects.values_list('id', flat=True))
+    first = next_id(Group)
+    group_ids = range(first, first + groups)
+    log('groups', insert(Group, (
+        Group(id=group_id, title=f'Группа {group_id}',
+              slug=f'seed{group_id}', description=make_text(rng))
+        for group_id in group_ids)))
+    if not groups:
+        group_ids = list(Group.objects.values_list('id', flat=True))
+    if posts and not user_ids:
+        raise ValueError('Постам нужны авторы: создайте пользователей.')
+    # Популярность у подписчиков и активность в постах распределены
+    # по одному закону, но независимо: иначе у самых читаемых авторов
+    # всегда сотни постов, и ленты их подписчиков раздуваются.
+    popular = PowerLaw(user_ids, alpha)
+    writers = list(user_ids)
+    rng.shuffle(writers)
+    active = PowerLaw(writers, alpha)
+
+    first = next_id(Post)
+    post_ids = range(first, first + posts)
+    log('posts', run_parts('posts', random_seed, post_ids, {
+        'authors': active, 'group_ids': group_ids, 'now': now,
+        'days': days}, processes))
+    if not posts:
+        post_ids = list(Post.objects.values_list('id', flat=True))
+    if follows and len(user_ids) > 1:
+        log('follows', run_parts('follows', random_seed, user_ids, {
+            'authors': popular, 'follows': follows}, processes))
+    if comments and post_ids:
+        log('comments', run_parts('comments', random_seed, range(comments), {
+            'post_ids': post_ids, 'user_ids': user_ids, 'now': now,
+            'days': days}, processes))
+
+    log('stats', len(stats.rebuild()))
+    log('feed', feed.rebuild())
+    invalidate_counts()
+    bump(GLOBAL_SCOPE, GROUPS_SCOPE)
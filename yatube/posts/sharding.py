@@ -0,0 +1,345 @@
+"""Шардирование постов по авторам.
+
+Посты, комментарии к ним и записи лент с этими постами лежат в одной
+из баз POST_SHARDS, которую выбирает хэш id автора поста. Хэш — jump
+consistent hash: когда шард добавляется в конец списка, к нему переезжает
+только доля авторов 1/n, а остальные остаются на месте. Переносит их
+команда rebalance_shards.
+
+Пользователи и группы живут в основной базе и копируются во все шарды,
+чтобы внешние ключи и select_related работали внутри шарда. Каждый шард
+выдаёт id из своего диапазона ID_RANGE, поэтому id поста уникален
+во всех шардах, а по id виден шард, где пост создан.
+
+Списки из всех шардов (главная, группа, лента) читает scatter:
+с каждого шарда берутся первые строки в порядке сортировки запроса
+и сливаются k-way merge. Профиль читается из одного шарда автора.
+
+С одним шардом (по умолчанию) роутер ничего не решает, и запросы идут
+как без шардирования.
+"""
+import heapq
+import itertools
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+
+from core.replicas import note_write
+
+from .models import Comment, FeedEntry, Group, Post, User
+
+ID_RANGE = 10 ** 12
+BATCH_SIZE = 500
+SHARDED_MODELS = (Post, Comment, FeedEntry)
+REFERENCE_MODELS = (User, Group)
+
+
+def get_shards():
+    return getattr(settings, 'POST_SHARDS', [DEFAULT_DB_ALIAS])
+
+
+def is_sharded():
+    return len(get_shards()) > 1
+
+
+def jump_hash(key, buckets):
+    """Jump consistent hash (Lamping, Veach, 2014): номер корзины ключа."""
+    bucket, jump = -1, 0
+    while jump < buckets:
+        bucket = jump
+        key = (key * 2862933555777941757 + 1) % 2 ** 64
+        jump = int((bucket + 1) * (1 << 31) / ((key >> 33) + 1))
+    return bucket
+
+
+def shard_for_author(author_id):
+    shards = get_shards()
+    return shards[jump_hash(author_id, len(shards))]
+
+
+def candidate_shards(post_id):
+    """Шарды, где может лежать пост: сначала тот, что выдал его id,
+    затем остальные — туда пост мог переехать вместе с автором."""
+    shards = list(get_shards())
+    home = post_id // ID_RANGE
+    if home < len(shards):
+        shards.insert(0, shards.pop(home))
+    return shards
+
+
+def find_post_shard(post_id):
+    for shard in candidate_shards(post_id):
+        if Post.objects.using(shard).filter(id=post_id).exists():
+            return shard
+    return None
+
+
+def get_post_or_404(queryset, post_id):
+    """Пост из queryset по id из шарда, где он лежит."""
+    if not is_sharded():
+        return get_object_or_404(queryset, id=post_id)
+    for shard in candidate_shards(post_id):
+        post = queryset.using(shard).filter(id=post_id).first()
+        if post is not None:
+            return post
+    raise Http404(f'Нет поста {post_id}.')
+
+
+class ShardRouter:
+    """Пишет и читает посты в шарде автора, справочники — в основной
+    базе. Запросы без подсказки о шарде идут в основную базу, поэтому
+    списки по всем шардам читаются через scatter."""
+
+    def db_for_read(self, model, **hints):
+        if not is_sharded():
+            return None
+        return self.route(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        database = self.db_for_read(model, **hints)
+        if database is not None:
+            note_write()
+        return database
+
+    def route(self, model, instance):
+        if instance is None:
+            return None
+        if not issubclass(model, SHARDED_MODELS):
+            # Справочники, связанные с постом, лежат в основной базе.
+            if isinstance(instance, SHARDED_MODELS):
+                return DEFAULT_DB_ALIAS
+            return None
+        if isinstance(instance, SHARDED_MODELS):
+            if not instance._state.adding:
+                return instance._state.db
+            return self.route_new(instance)
+        if isinstance(instance, User) and model is Post:
+            return shard_for_author(instance.pk)
+        return None
+
+    @staticmethod
+    def route_new(instance):
+        # У нового объекта _state.db мог задать первый присвоенный
+        # внешний ключ, например автор комментария, — он не в счёт.
+        if isinstance(instance, Comment):
+            if Comment.post.field.is_cached(instance):
+                return instance.post._state.db
+            if instance.post_id is not None:
+                return find_post_shard(instance.post_id)
+            return None
+        if instance.author_id is None:
+            return None
+        return shard_for_author(instance.author_id)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if is_sharded():
+            return True
+        return None
+
+
+def reserve_ids(using):
+    """Сдвигает счётчики id моделей шарда в его диапазон."""
+    shards = get_shards()
+    connection = connections[using]
+    if using not in shards or connection.vendor != 'sqlite':
+        return
+    start = shards.index(using) * ID_RANGE
+    if not start:
+        return
+    with connection.cursor() as cursor:
+        for model in SHARDED_MODELS:
+            table = model._meta.db_table
+            cursor.execute('DELETE FROM sqlite_sequence WHERE name = %s '
+                           'AND seq < %s', [table, start])
+            cursor.execute(
+                'INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s '
+                'WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence '
+                'WHERE name = %s)', [table, start, table])
+
+
+def reserve_ids_after_migrate(sender, using, **kwargs):
+    reserve_ids(using)
+
+
+def copy_reference(model, objs):
+    """Копирует строки справочника из основной базы во все шарды."""
+    fields = [field for field in model._meta.concrete_fields
+              if not field.primary_key]
+    for shard in get_shards():
+        if shard == DEFAULT_DB_ALIAS:
+            continue
+        # Свежие экземпляры: bulk_create переписывает _state.db.
+        copies = [model(pk=obj.pk, **{field.attname: getattr(
+            obj, field.attname) for field in fields}) for obj in objs]
+        manager = model._base_manager.using(shard)
+        existing = set(manager.filter(
+            pk__in=[obj.pk for obj in copies]).values_list('pk', flat=True))
+        manager.bulk_update(
+            [obj for obj in copies if obj.pk in existing],
+            [field.name for field in fields], batch_size=BATCH_SIZE)
+        manager.bulk_create(
+            [obj for obj in copies if obj.pk not in existing],
+            batch_size=BATCH_SIZE)
+
+
+def delete_reference(model, pk):
+    """Удаляет копии строки справочника; посты в шардах удаляются или
+    отвязываются каскадом, как в основной базе."""
+    for shard in get_shards():
+        if shard != DEFAULT_DB_ALIAS:
+            model._base_manager.using(shard).filter(pk=pk).delete()
+
+
+def sync_reference():
+    """Копирует все справочники в шарды; возвращает число строк."""
+    count = 0
+    for model in REFERENCE_MODELS:
+        rows = model._base_manager.using(DEFAULT_DB_ALIAS).order_by(
+            'pk').iterator()
+        while True:
+            chunk = list(itertools.islice(rows, BATCH_SIZE))
+            if not chunk:
+                break
+            copy_reference(model, chunk)
+            count += len(chunk)
+    return count
+
+
+def misplaced_authors():
+    """Пары (автор, шард, где лежат его посты, шард по хэшу)."""
+    for shard in get_shards():
+        authors = Post.objects.using(shard).order_by().values_list(
+            'author_id', flat=True).distinct()
+        for author_id in authors:
+            target = shard_for_author(author_id)
+            if target != shard:
+                yield author_id, shard, target
+
+
+def move_author(author_id, source, target):
+    """Переносит посты автора с комментариями и записями лент.
+
+    Строки сначала записываются в target и только потом удаляются из
+    source: прерванный перенос можно повторить, а дубли, видимые
+    в это время, отбрасывает слияние в scatter. Удаление идёт мимо
+    сигналов: счётчики и кэш страниц от переезда не меняются.
+    """
+    from .seeding import insert_raw
+
+    rows = [
+        (Post, list(Post.objects.using(source).filter(author_id=author_id))),
+        (Comment, list(Comment.objects.using(source).filter(
+            post__author_id=author_id))),
+        (FeedEntry, list(FeedEntry.objects.using(source).filter(
+            author_id=author_id))),
+    ]
+    with transaction.atomic(using=target):
+        for model, objs in rows:
+            insert_raw(model, objs, using=target, ignore_conflicts=True)
+    posts = Post._meta.db_table
+    with transaction.atomic(using=source), \
+            connections[source].cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FeedEntry._meta.db_table} '
+                       f'WHERE author_id = %s', [author_id])
+        cursor.execute(f'DELETE FROM {Comment._meta.db_table} WHERE post_id '
+                       f'IN (SELECT id FROM {posts} WHERE author_id = %s)',
+                       [author_id])
+        cursor.execute(f'DELETE FROM {posts} WHERE author_id = %s',
+                       [author_id])
+    return len(rows[0][1])
+
+
+class ScatteredQuerySet:
+    """Несколько запросов с одной сортировкой как одна выборка: один
+    запрос в разных шардах или разные запросы, например лента и посты
+    авторов, читаемых на лету.
+
+    Срез [a:b] берёт из каждой части первые b строк и сливает их
+    по сортировке первой части. Поддерживает то, что нужно пагинаторам:
+    count(), срезы, filter(), order_by() и reverse().
+    """
+    ordered = True
+
+    def __init__(self, parts):
+        self.parts = parts
+        self.model = parts[0].model
+        self.query = parts[0].query
+
+    @staticmethod
+    def with_unique_ordering(queryset):
+        # Без id в конце строки с одинаковой датой сливались бы
+        # в разном порядке, и страницы теряли бы их на границах.
+        ordering = list(queryset.query.order_by
+                        or queryset.model._meta.ordering)
+        names = {name.lstrip('-') for name in ordering}
+        if not names & {'id', 'pk'}:
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-id' if descending else 'id')
+        return queryset.order_by(*ordering)
+
+    def apply(self, method, *args, **kwargs):
+        return ScatteredQuerySet([getattr(part, method)(*args, **kwargs)
+                                  for part in self.parts])
+
+    def filter(self, *args, **kwargs):
+        return self.apply('filter', *args, **kwargs)
+
+    def order_by(self, *fields):
+        return self.apply('order_by', *fields)
+
+    def reverse(self):
+        return self.apply('reverse')
+
+    def select_related(self, *fields):
+        return self.apply('select_related', *fields)
+
+    def count(self):
+        return sum(part.count() for part in self.parts)
+
+    def __len__(self):
+        return self.count()
+
+    def key(self):
+        fields = [name.lstrip('-') for name in self.query.order_by]
+        descending = self.query.order_by[0].startswith('-')
+        if any(name.startswith('-') != descending
+               for name in self.query.order_by):
+            raise ValueError('Слияние шардов поддерживает сортировку '
+                             'в одном направлении.')
+        return (lambda obj: [getattr(obj, name) for name in fields],
+                descending != (not self.query.standard_ordering))
+
+    def merge(self, parts):
+        key, descending = self.key()
+        previous = None
+        for obj in heapq.merge(*parts, key=key, reverse=descending):
+            if previous is not None and key(obj) == key(previous):
+                continue  # строка посреди переезда лежит в двух шардах
+            previous = obj
+            yield obj
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        start, stop = index.start or 0, index.stop
+        parts = self.parts
+        if stop is not None:
+            parts = [part[:stop] for part in parts]
+        return list(itertools.islice(self.merge(parts), start, stop))
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def scatter(queryset, shards=None):
+    """queryset по шардам shards (по умолчанию по всем). Части
+    ScatteredQuerySet уже разложены по шардам и не меняются."""
+    if not is_sharded() or isinstance(queryset, ScatteredQuerySet):
+        return queryset
+    shards = get_shards() if shards is None else shards
+    if len(shards) == 1:
+        return queryset.using(shards[0])
+    queryset = ScatteredQuerySet.with_unique_ordering(queryset)
+    return ScatteredQuerySet([queryset.using(shard) for shard in shards])
@@ -0,0 +1,152 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import feed, sharding, stats
+from .cache import (AUTHOR_SCOPE, GLOBAL_SCOPE, GROUP_SCOPE, GROUPS_SCOPE,
+                    POST_SCOPE, bump)
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .paginators import invalidate_counts
+
+# Поля пользователя, которые видны на страницах постов.
+NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def post_scopes(post):
+    scopes = {GLOBAL_SCOPE,
+              AUTHOR_SCOPE.format(username=post.author.username)}
+    slugs = (post.group and post.group.slug,
+             getattr(post, 'old_group_slug', None))
+    scopes.update(GROUP_SCOPE.format(slug=slug) for slug in slugs if slug)
+    return scopes
+
+
+def follow_scopes(follow):
+    return (AUTHOR_SCOPE.format(username=follow.author.username),
+            AUTHOR_SCOPE.format(username=follow.user.username))
+
+
+@receiver(pre_save, sender=Post)
+def remember_group(sender, instance, using, **kwargs):
+    # Пост могли перенести в другую группу: сбросить надо обе.
+    instance.old_group_slug = instance.pk and Post.objects.using(
+        using).filter(pk=instance.pk).values_list(
+        'group__slug', flat=True).first()
+
+
+@receiver(pre_save, sender=Group)
+def remember_slug(sender, instance, **kwargs):
+    instance.old_slug = instance.pk and Group.objects.filter(
+        pk=instance.pk).values_list('slug', flat=True).first()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'posts', 1)
+        feed.fan_out(instance)
+    invalidate_counts()
+    bump(*post_scopes(instance))
+
+
+@receiver(post_delete, sender=Post)
+def forget_post(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'posts', -1)
+    invalidate_counts()
+    bump(*post_scopes(instance))
+
+
+@receiver(pre_save, sender=User)
+def remember_name(sender, instance, update_fields=None, **kwargs):
+    # Вход сохраняет только last_login: имена не менялись.
+    if update_fields is not None and not set(update_fields) & set(
+            NAME_FIELDS):
+        instance.old_names = None
+        return
+    instance.old_names = instance.pk and User.objects.filter(
+        pk=instance.pk).values_list(*NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def forget_group(sender, instance, **kwargs):
+    invalidate_counts()
+    slugs = {instance.slug, getattr(instance, 'old_slug', None)}
+    bump(GLOBAL_SCOPE, GROUPS_SCOPE,
+         *(GROUP_SCOPE.format(slug=slug) for slug in slugs if slug))
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'comments', 1)
+    bump(POST_SCOPE.format(post_id=instance.post_id))
+
+
+@receiver(post_delete, sender=Comment)
+def forget_comment(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'comments', -1)
+    bump(POST_SCOPE.format(post_id=instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, **kwargs):
+    if created:
+        stats.change(instance.author_id, 'followers', 1)
+        stats.change(instance.user_id, 'following', 1)
+        feed.add_follower(instance)
+    invalidate_counts()
+    bump(*follow_scopes(instance))
+
+
+@receiver(post_delete, sender=Follow)
+def clean_feed(sender, instance, **kwargs):
+    stats.change(instance.author_id, 'followers', -1)
+    stats.change(instance.user_id, 'following', -1)
+    feed.remove_follower(instance)
+    invalidate_counts()
+    bump(*follow_scopes(instance))
+
+
+def comment_scopes(user):
+    # Комментарии лежат в шардах вместе с постами.
+    return {
+        POST_SCOPE.format(post_id=post_id)
+        for shard in sharding.get_shards()
+        for post_id in Comment.objects.db_manager(shard).filter(
+            author=user).order_by().values_list('post_id', flat=True)
+        .distinct()
+    }
+
+
+@receiver(post_save, sender=User)
+def forget_author_pages(sender, instance, created, **kwargs):
+    # Имя автора есть на главной, в группах, в профиле и в комментариях.
+    old_names = getattr(instance, 'old_names', None)
+    if created or not old_names or old_names == tuple(
+            getattr(instance, field) for field in NAME_FIELDS):
+        return
+    bump(GLOBAL_SCOPE, GROUPS_SCOPE,
+         *(AUTHOR_SCOPE.format(username=username)
+           for username in {instance.username, old_names[0]}),
+         *comment_scopes(instance))
+
+
+@receiver(post_save, sender=User)
+def create_stats(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Group)
+def copy_to_shards(sender, instance, using, raw, **kwargs):
+    if sharding.is_sharded() and using == DEFAULT_DB_ALIAS and not raw:
+        sharding.copy_reference(sender, [instance])
+
+
+@receiver(post_delete, sender=User)
+@receiver(post_delete, sender=Group)
+def delete_from_shards(sender, instance, using, **kwargs):
+    if sharding.is_sharded() and using == DEFAULT_DB_ALIAS:
+        sharding.delete_reference(sender, instance.pk)
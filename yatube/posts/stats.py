@@ -0,0 +1,72 @@
+"""Денормализованные счётчики пользователей (UserStats)."""
+from collections import Counter
+
+from django.db.models import Count, F
+
+from .models import Comment, Follow, Post, User, UserStats
+from .sharding import get_shards
+
+FIELDS = ('posts', 'followers', 'following', 'comments')
+
+
+def change(user_id, field, delta):
+    """Атомарно сдвигает счётчик пользователя на delta."""
+    stats = UserStats.objects.filter(user_id=user_id)
+    if delta < 0:
+        # Не уходим в минус, если счётчик разошёлся с данными.
+        stats.filter(**{f'{field}__gte': -delta}).update(
+            **{field: F(field) + delta})
+        return
+    if not stats.update(**{field: F(field) + delta}):
+        UserStats.objects.get_or_create(user_id=user_id)
+        stats.update(**{field: F(field) + delta})
+
+
+def actual():
+    """Считает счётчики всех пользователей заново по таблицам."""
+    sources = {
+        'posts': (Post, 'author'),
+        'followers': (Follow, 'author'),
+        'following': (Follow, 'user'),
+        'comments': (Comment, 'author'),
+    }
+    counts = {field: Counter() for field in sources}
+    for field, (model, key) in sources.items():
+        # Посты и комментарии лежат в шардах, подписки — в основной базе.
+        shards = get_shards() if model in (Post, Comment) else [None]
+        for shard in shards:
+            counts[field].update(dict(
+                model.objects.db_manager(shard).order_by().values_list(
+                    key).annotate(Count('id'))))
+    return {
+        user_id: {field: counts[field].get(user_id, 0) for field in FIELDS}
+        for user_id in User.objects.values_list('id', flat=True).iterator()
+    }
+
+
+def diff(stored):
+    """Пользователи, у которых сохранённые счётчики неверны."""
+    return {
+        user_id: values for user_id, values in actual().items()
+        if user_id not in stored or any(
+            getattr(stored[user_id], field) != value
+            for field, value in values.items())
+    }
+
+
+def verify():
+    return diff(UserStats.objects.in_bulk())
+
+
+def rebuild(batch_size=500):
+    stored = UserStats.objects.in_bulk()
+    wrong = diff(stored)
+    UserStats.objects.bulk_update(
+        [UserStats(user_id=user_id, **values)
+         for user_id, values in wrong.items() if user_id in stored],
+        FIELDS, batch_size=batch_size)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=user_id, **values)
+         for user_id, values in wrong.items() if user_id not in stored],
+        batch_size=batch_size)
+    return wrong
@@ -0,0 +1,49 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import SimpleTestCase
+
+from ..management.commands.bench import percentile
+
+RESULT = {
+    'p50_ms': 10.0, 'p95_ms': 20.0, 'p99_ms': 30.0,
+    'queries_max': 3, 'bytes_mean': 1000,
+}
+
+
+class BenchTest(SimpleTestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, name, **changes):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as file:
+            json.dump({'views': {'index': {**RESULT, **changes}}}, file)
+        return path
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([5], 95), 5)
+
+    def test_compare_passes_within_threshold(self):
+        output = StringIO()
+        call_command('bench_compare', self.write('old.json'),
+                     self.write('new.json', p95_ms=21.0), stdout=output)
+        self.assertIn('Регрессий нет', output.getvalue())
+
+    def test_compare_flags_regressions(self):
+        for changes in [{'p99_ms': 40.0}, {'queries_max': 4}]:
+            with self.subTest(changes=changes):
+                with self.assertRaises(CommandError):
+                    call_command('bench_compare', self.write('old.json'),
+                                 self.write('new.json', **changes),
+                                 stdout=StringIO())
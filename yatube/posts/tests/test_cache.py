@@ -1,25 +1,216 @@
+import tempfile
+import time
+from unittest import mock
+
+from django.contrib.auth.models import AnonymousUser
 from django.core.cache import cache
-from django.test import TestCase, Client
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import TestCase, Client, RequestFactory, override_settings
 from django.urls import reverse
 
-from ..models import Post, User
+from core import replicas
+from core.metrics import registry
+from core.replicas import PIN_COOKIE
+
+from .. import views
+from ..cache import (AUTHOR_SCOPE, BETA, GLOBAL_SCOPE, LOCK_KEY, STALE_TIME,
+                     CachedView, bump, get_generation_key, get_generations,
+                     get_stats, recompute_early)
+from ..models import Follow, Group, Post, User
 
+USERNAME = 'USERNAME'
+SLUG = 'slug'
 INDEX_URL = reverse('posts:main')
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
 
 
 class TestCache(TestCase):
 
     def setUp(self):
+        cache.clear()
         self.user_author = User.objects.create(
-            username='USERNAME')
+            username=USERNAME)
+        self.group = Group.objects.create(
+            title='группа',
+            slug=SLUG,
+            description='описание')
         self.post = Post.objects.create(
             text='тестовый текст',
-            author=self.user_author)
+            author=self.user_author,
+            group=self.group)
         self.client = Client()
 
     def test_index_cache(self):
         content = self.client.get(INDEX_URL).content
-        Post.objects.all().delete()
+        # update() не шлёт сигналов, поэтому поколение не меняется.
+        Post.objects.update(text='тихо изменённый текст')
         self.assertEqual(content, Client().get(INDEX_URL).content)
         cache.clear()
         self.assertNotEqual(content, Client().get(INDEX_URL).content)
+
+    def test_pages_invalidated_by_new_post(self):
+        urls = [INDEX_URL, PROFILE_URL, GROUP_POSTS_URL]
+        contents = {url: self.client.get(url).content for url in urls}
+        Post.objects.create(text='новый пост', author=self.user_author,
+                            group=self.group)
+        for url in urls:
+            with self.subTest(url=url):
+                content = self.client.get(url).content
+                self.assertNotEqual(content, contents[url])
+                self.assertIn('новый пост', content.decode())
+
+    def test_pages_invalidated_by_deleted_post(self):
+        content = self.client.get(INDEX_URL).content
+        self.post.delete()
+        self.assertNotEqual(content, self.client.get(INDEX_URL).content)
+
+    def test_non_ascii_scope(self):
+        author = User.objects.create(username='Автор с пробелом')
+        key = get_generation_key(AUTHOR_SCOPE.format(
+            username=author.username))
+        self.assertTrue(key.isascii())
+        self.assertNotIn(' ', key)
+        url = reverse('posts:profile', kwargs={'username': author.username})
+        content = self.client.get(url).content
+        Post.objects.create(text='новый пост', author=author)
+        self.assertNotEqual(content, self.client.get(url).content)
+
+    def test_pages_invalidated_by_author_rename(self):
+        urls = (INDEX_URL, GROUP_POSTS_URL)
+        for url in urls:
+            self.client.get(url)
+        self.user_author.first_name = 'Новое'
+        self.user_author.last_name = 'Имя'
+        self.user_author.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.client.get(url), 'Новое Имя')
+
+    def test_login_keeps_pages(self):
+        content = self.client.get(INDEX_URL).content
+        Post.objects.update(text='тихо изменённый текст')
+        self.user_author.save(update_fields=['last_login'])
+        self.assertEqual(content, Client().get(INDEX_URL).content)
+
+    def test_hit_stats(self):
+        registry.values.clear()
+        with tempfile.TemporaryDirectory() as metrics_dir, \
+                override_settings(METRICS_DIR=metrics_dir):
+            self.client.get(INDEX_URL)
+            self.client.get(INDEX_URL)
+            self.assertEqual(get_stats()['posts:main'], (1, 1))
+
+    def get_lock_key(self, url):
+        request = RequestFactory().get(url)
+        request.user = AnonymousUser()
+        return LOCK_KEY.format(views.index.get_key(request))
+
+    def test_stale_page_served_while_locked(self):
+        content = self.client.get(INDEX_URL).content
+        Post.objects.update(text='тихо изменённый текст')
+        bump(GLOBAL_SCOPE)
+        lock = self.get_lock_key(INDEX_URL)
+        cache.add(lock, 1)
+        self.assertEqual(content, self.client.get(INDEX_URL).content)
+        cache.delete(lock)
+        self.assertNotEqual(content, self.client.get(INDEX_URL).content)
+
+    @mock.patch('posts.cache.LOCK_WAIT', 0.05)
+    def test_missing_page_computed_after_wait(self):
+        cache.add(self.get_lock_key(INDEX_URL), 1)
+        response = self.client.get(INDEX_URL)
+        self.assertContains(response, 'тестовый текст')
+
+    def test_recompute_early(self):
+        with mock.patch('posts.cache.random.random', return_value=0.5):
+            # -ln(0.5) ≈ 0.69
+            self.assertFalse(recompute_early(100, 1, 1.0, now=99))
+            self.assertTrue(recompute_early(100, 2, 1.0, now=99))
+            self.assertFalse(recompute_early(100, 2, 0, now=99))
+            self.assertTrue(recompute_early(100, 0, 1.0, now=100))
+
+    def test_early_recompute_refreshes_page(self):
+        content = self.client.get(INDEX_URL).content
+        Post.objects.update(text='тихо изменённый текст')
+        with mock.patch('posts.cache.recompute_early', return_value=True):
+            self.assertNotEqual(content, self.client.get(INDEX_URL).content)
+
+    def test_page_shared_between_users_with_own_header(self):
+        reader = User.objects.create(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        author_client = Client()
+        author_client.force_login(self.user_author)
+        self.assertContains(author_client.get(INDEX_URL), 'Новая запись')
+        Post.objects.update(text='тихо изменённый текст')
+        response = self.client.get(INDEX_URL)
+        self.assertContains(response, 'тестовый текст')
+        self.assertContains(response, 'Войти')
+        self.assertNotContains(response, 'Пользователь:')
+        self.assertNotContains(response, 'Избранные авторы')
+        response = reader_client.get(INDEX_URL)
+        self.assertContains(response, 'тестовый текст')
+        self.assertContains(response, 'Пользователь: <a href="/profile/'
+                                      'reader/">reader</a>', html=False)
+        self.assertContains(response, 'Избранные авторы')
+
+    def test_follow_button_filled_per_user(self):
+        reader = User.objects.create(username='reader')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        self.assertNotContains(self.client.get(PROFILE_URL), 'Подписаться')
+        self.assertContains(reader_client.get(PROFILE_URL), 'Подписаться')
+        Follow.objects.create(user=reader, author=self.user_author)
+        self.assertContains(reader_client.get(PROFILE_URL), 'Отписаться')
+        author_client = Client()
+        author_client.force_login(self.user_author)
+        self.assertNotContains(author_client.get(PROFILE_URL), 'Подписаться')
+
+    def test_cache_control(self):
+        response = self.client.get(INDEX_URL)
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('max-age=60', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.client.force_login(self.user_author)
+        response = self.client.get(INDEX_URL)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertNotIn('public', response['Cache-Control'])
+
+    def test_cached_page_for_user_without_queries(self):
+        self.client.force_login(self.user_author)
+        self.client.get(INDEX_URL)
+        with self.assertNumQueries(0):
+            response = self.client.get(INDEX_URL)
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_pinned_user_bypasses_cache(self):
+        content = self.client.get(INDEX_URL).content
+        Post.objects.update(text='тихо изменённый текст')
+        self.assertEqual(content, self.client.get(INDEX_URL).content)
+        self.client.cookies[PIN_COOKIE] = '1'
+        self.assertContains(self.client.get(INDEX_URL),
+                            'тихо изменённый текст')
+
+    def compute_from_replica(self, beat):
+        request = RequestFactory().get(INDEX_URL)
+        request.replica = 'replica'
+        with mock.patch.object(replicas, 'get_beat', return_value=beat):
+            CachedView(lambda request: HttpResponse(), 3600, (GLOBAL_SCOPE,),
+                       STALE_TIME, BETA).compute(
+                request, (), {}, 'page', get_generations(GLOBAL_SCOPE))
+        return cache.get('page')[2] - time.time()
+
+    @override_settings(REPLICA_MAX_LAG=5)
+    def test_page_from_replica_expires_within_lag(self):
+        with mock.patch.object(transaction, 'on_commit', lambda func: func()):
+            bump(GLOBAL_SCOPE)
+        self.assertLessEqual(self.compute_from_replica(time.time() - 1), 5)
+        self.assertLessEqual(self.compute_from_replica(None), 5)
+
+    @override_settings(REPLICA_MAX_LAG=5)
+    def test_page_from_synced_replica_kept_full_time(self):
+        with mock.patch.object(transaction, 'on_commit', lambda func: func()):
+            bump(GLOBAL_SCOPE)
+        self.assertGreater(self.compute_from_replica(time.time() + 1), 3000)
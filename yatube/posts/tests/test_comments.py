@@ -0,0 +1,60 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import Comment, Post, User
+from ..paginators import CursorPage
+from ..views import COMMENTS_COUNT
+
+
+class CommentsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.post = Post.objects.create(
+            text='пост',
+            author=User.objects.create(username='author'))
+        authors = [User.objects.create(username=f'reader{i}')
+                   for i in range(5)]
+        Comment.objects.bulk_create(
+            [Comment(text=f'комментарий {i}', post=cls.post,
+                     author=authors[i % 5])
+             for i in range(COMMENTS_COUNT + 5)])
+        cls.comments = list(cls.post.comments.order_by('pub_date', 'id'))
+        cls.POST_DETAIL_URL = reverse('posts:post_detail', kwargs={
+            'post_id': cls.post.id})
+        cls.POST_COMMENTS_URL = reverse('posts:post_comments', kwargs={
+            'post_id': cls.post.id})
+
+    def setUp(self):
+        cache.clear()
+
+    def test_detail_shows_first_page(self):
+        comments = self.client.get(self.POST_DETAIL_URL).context['comments']
+        self.assertIsInstance(comments, CursorPage)
+        self.assertEqual(list(comments), self.comments[:COMMENTS_COUNT])
+        self.assertTrue(comments.has_next())
+
+    def test_more_comments_fragment(self):
+        first = self.client.get(self.POST_DETAIL_URL).context['comments']
+        response = Client().get(self.POST_COMMENTS_URL,
+                                {'cursor': first.next_cursor})
+        self.assertTemplateUsed(response, 'posts/includes/comments.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        comments = response.context['comments']
+        self.assertEqual(list(comments), self.comments[COMMENTS_COUNT:])
+        self.assertFalse(comments.has_next())
+
+    def test_fragment_for_missing_post(self):
+        self.assertEqual(
+            self.client.get(reverse('posts:post_comments', kwargs={
+                'post_id': self.post.id + 1})).status_code, 404)
+
+    def test_fragment_invalidated_by_author_rename(self):
+        self.client.get(self.POST_COMMENTS_URL)
+        reader = User.objects.get(pk=self.comments[0].author_id)
+        reader.username = 'renamed'
+        reader.save()
+        self.assertContains(self.client.get(self.POST_COMMENTS_URL),
+                            'renamed')
@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import FeedEntry, Follow, Post, User
+
+FOLLOW_URL = reverse('posts:follow_index')
+
+
+class FeedTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='follower')
+        cls.author = User.objects.create(username='author')
+        cls.old_post = Post.objects.create(text='старый пост',
+                                           author=cls.author)
+        cls.follower_client = Client()
+        cls.follower_client.force_login(cls.user)
+
+    def test_follow_backfills_feed(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.user, post=self.old_post).exists())
+
+    def test_new_post_fans_out(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        page_obj = self.follower_client.get(FOLLOW_URL).context['page_obj']
+        self.assertEqual(list(page_obj), [post, self.old_post])
+
+    def test_unfollow_cleans_feed(self):
+        follow = Follow.objects.create(user=self.user, author=self.author)
+        follow.delete()
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            len(self.follower_client.get(FOLLOW_URL).context['page_obj']), 0)
+
+    @mock.patch('posts.feed.FANOUT_LIMIT', 1)
+    def test_popular_author_pulled_on_read(self):
+        Follow.objects.create(user=self.user, author=self.author)
+        post = Post.objects.create(text='новый пост', author=self.author)
+        self.assertFalse(FeedEntry.objects.filter(user=self.user).exists())
+        page_obj = self.follower_client.get(FOLLOW_URL).context['page_obj']
+        self.assertEqual(list(page_obj), [post, self.old_post])
+
+    def test_follow_backfills_whole_history(self):
+        Post.objects.bulk_create(
+            Post(text=f'пост {number}', author=self.author)
+            for number in range(250))
+        Follow.objects.create(user=self.user, author=self.author)
+        self.assertEqual(FeedEntry.objects.filter(user=self.user).count(),
+                         251)
+        page_obj = self.follower_client.get(FOLLOW_URL).context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 251)
+
+    @mock.patch('posts.feed.FANOUT_LIMIT', 2)
+    def test_author_crossing_fanout_limit(self):
+        other = User.objects.create(username='other')
+        Follow.objects.create(user=self.user, author=self.author)
+        follow = Follow.objects.create(user=other, author=self.author)
+        # Автор стал pull: записи удалены, посты читаются на лету.
+        self.assertFalse(FeedEntry.objects.filter(
+            author=self.author).exists())
+        page_obj = self.follower_client.get(FOLLOW_URL).context['page_obj']
+        self.assertEqual(list(page_obj), [self.old_post])
+        Follow.objects.filter(user=self.user).delete()
+        # Подписчик, пришедший к pull-автору, получает всю историю.
+        Follow.objects.create(user=self.user, author=self.author)
+        follow.delete()
+        self.assertEqual(
+            set(FeedEntry.objects.values_list('user', 'post')),
+            {(self.user.id, self.old_post.id)})
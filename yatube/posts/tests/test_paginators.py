@@ -0,0 +1,82 @@
+from django.core.cache import cache
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import Post, User
+from ..paginators import CursorPage, CursorPaginator, ElidedPaginator
+from ..views import POSTS_COUNT
+
+INDEX_URL = reverse('posts:main')
+PER_PAGE = 4
+
+
+class CursorPaginatorTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create(username='username')
+        Post.objects.bulk_create(
+            [Post(text=f'пост номер {i}', author=cls.user)
+             for i in range(POSTS_COUNT + 3)]
+        )
+        cls.posts = list(Post.objects.order_by('-pub_date', '-id'))
+        cls.paginator = CursorPaginator(Post.objects.all(), PER_PAGE)
+
+    def test_walk_forward_and_back(self):
+        pages = [self.paginator.get_page(None)]
+        while pages[-1].has_next():
+            pages.append(self.paginator.get_page(pages[-1].next_cursor))
+        self.assertEqual([post for page in pages for post in page],
+                         self.posts)
+        self.assertFalse(pages[0].has_previous())
+        back = [pages[-1]]
+        while back[-1].has_previous():
+            back.append(self.paginator.get_page(back[-1].previous_cursor))
+        self.assertEqual([list(page) for page in reversed(back)],
+                         [list(page) for page in pages])
+
+    def test_broken_cursor_returns_first_page(self):
+        for cursor in ['мусор', 'W10=', 'WzAsIFsiMSJdXQ==']:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(list(self.paginator.get_page(cursor)),
+                                 self.posts[:PER_PAGE])
+
+    def test_cursor_mode_in_view(self):
+        cache.clear()
+        page_obj = Client().get(INDEX_URL, {'cursor': ''}).context[
+            'page_obj']
+        self.assertIsInstance(page_obj, CursorPage)
+        self.assertEqual(list(page_obj), self.posts[:POSTS_COUNT])
+        response = Client().get(INDEX_URL, {'cursor': page_obj.next_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         self.posts[POSTS_COUNT:])
+
+
+class ElidedPaginatorTest(TestCase):
+
+    def test_elided_page_range(self):
+        paginator = ElidedPaginator(range(100), 1)
+        ellipsis = ElidedPaginator.ELLIPSIS
+        cases = [
+            [1, [1, 2, 3, ellipsis, 100]],
+            [50, [1, ellipsis, 48, 49, 50, 51, 52, ellipsis, 100]],
+            [100, [1, ellipsis, 98, 99, 100]],
+        ]
+        for number, expected in cases:
+            with self.subTest(number=number):
+                self.assertEqual(
+                    list(paginator.get_elided_page_range(number)), expected)
+        self.assertEqual(
+            list(ElidedPaginator(range(5), 1).get_elided_page_range(3)),
+            [1, 2, 3, 4, 5])
+
+    def test_count_cached_until_post_created(self):
+        cache.clear()
+        user = User.objects.create(username='username')
+        Post.objects.create(text='пост', author=user)
+        self.assertEqual(ElidedPaginator(Post.objects.all(), 1).count, 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(ElidedPaginator(Post.objects.all(), 1).count, 1)
+        Post.objects.create(text='ещё пост', author=user)
+        self.assertEqual(ElidedPaginator(Post.objects.all(), 1).count, 2)
@@ -0,0 +1,151 @@
+import re
+from unittest import mock, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.query_budget import QueryBudgetExceeded, budget
+from ..models import Follow, Group, Post, User
+from ..views import POSTS_COUNT
+
+SLUG = 'slug'
+USERNAME = 'author0'
+
+INDEX_URL = reverse('posts:main')
+FOLLOW_URL = reverse('posts:follow_index')
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
+FOLLOW_AUTHOR_URL = reverse('posts:profile_follow',
+                            kwargs={'username': USERNAME})
+UNFOLLOW_AUTHOR_URL = reverse('posts:profile_unfollow',
+                              kwargs={'username': USERNAME})
+# Полный проход таблицы без индекса; SCAN ... USING INDEX допустим:
+# это чтение индекса в нужном порядке до LIMIT.
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?(posts|auth)_\w+( AS \w+)?$')
+
+
+class QueryBudgetTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        groups = [Group.objects.create(title=f'группа {i}',
+                                       slug=f'{SLUG}{i or ""}',
+                                       description='описание')
+                  for i in range(3)]
+        authors = [User.objects.create(username=f'author{i}')
+                   for i in range(5)]
+        cls.reader = User.objects.create(username='reader')
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+        for i in range(POSTS_COUNT * 2):
+            Post.objects.create(text=f'пост {i}', author=authors[i % 5],
+                                group=groups[i % 3])
+
+    def test_listings_stay_within_budget(self):
+        client = Client()
+        client.force_login(self.reader)
+        for url in [INDEX_URL, FOLLOW_URL, PROFILE_URL, GROUP_POSTS_URL]:
+            for params in [{}, {'page': 2}, {'cursor': ''}]:
+                with self.subTest(url=url, params=params):
+                    cache.clear()
+                    self.assertEqual(client.get(url, params).status_code,
+                                     200)
+
+    def test_budget_exceeded(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            with budget(1, 'test'):
+                list(Post.objects.all())
+                list(User.objects.all())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        group = Group.objects.create(title='группа', slug=SLUG,
+                                     description='описание')
+        cls.author = User.objects.create(username=USERNAME)
+        cls.reader = User.objects.create(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for i in range(POSTS_COUNT * 2):
+            cls.post = Post.objects.create(text=f'пост {i}',
+                                           author=cls.author, group=group)
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def assertIndexed(self, queries):
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                with self.subTest(sql=sql, step=step):
+                    self.assertNotIn('TEMP B-TREE', step)
+                    self.assertIsNone(FULL_SCAN.match(step))
+
+    def get_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url, params)
+        return response, queries.captured_queries
+
+    def test_listings_use_indexes(self):
+        for url in [INDEX_URL, FOLLOW_URL, PROFILE_URL, GROUP_POSTS_URL]:
+            for params in [{}, {'page': 2}, {'cursor': ''}]:
+                with self.subTest(url=url, params=params):
+                    cache.clear()
+                    response, queries = self.get_queries(url, params)
+                    self.assertIndexed(queries)
+            next_cursor = response.context['page_obj'].next_cursor
+            self.assertIndexed(
+                self.get_queries(url, {'cursor': next_cursor})[1])
+
+    def test_feed_with_pulled_author_uses_indexes(self):
+        # Лимит 2: автор из setUpClass читается на лету, второй — из ленты.
+        with mock.patch('posts.feed.FANOUT_LIMIT', 2):
+            other = User.objects.create(username='other')
+            Follow.objects.create(user=self.reader, author=other)
+            for i in range(POSTS_COUNT):
+                Post.objects.create(text=f'другой {i}', author=other)
+            Follow.objects.create(
+                user=User.objects.create(username='fan'), author=self.author)
+            for params in [{}, {'page': 2}, {'cursor': ''}]:
+                with self.subTest(params=params):
+                    cache.clear()
+                    response, queries = self.get_queries(FOLLOW_URL, params)
+                    self.assertIndexed(queries)
+            first = response.context['page_obj']
+            response, queries = self.get_queries(
+                FOLLOW_URL, {'cursor': first.next_cursor})
+            self.assertIndexed(queries)
+            second = response.context['page_obj']
+            self.assertEqual(len(second), POSTS_COUNT)
+            posts = [*first, *second]
+            self.assertEqual({post.author for post in posts},
+                             {self.author, other})
+            self.assertEqual(posts, sorted(
+                posts, key=lambda post: (post.pub_date, post.id),
+                reverse=True))
+
+    def test_post_pages_use_indexes(self):
+        kwargs = {'post_id': self.post.id}
+        for url in [reverse('posts:post_detail', kwargs=kwargs),
+                    reverse('posts:post_comments', kwargs=kwargs)]:
+            with self.subTest(url=url):
+                self.assertIndexed(self.get_queries(url)[1])
+
+    def test_follow_writes_use_indexes(self):
+        for url in [UNFOLLOW_AUTHOR_URL, FOLLOW_AUTHOR_URL]:
+            with self.subTest(url=url):
+                self.assertIndexed(self.get_queries(url)[1])
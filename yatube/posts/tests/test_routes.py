@@ -14,11 +14,13 @@ class RouteTests(TestCase):
         cases = [
             ['/', 'main', None],
             ['/create/', 'post_create', None],
+            ['/search/', 'search', None],
             ['/follow/', 'follow_index', None],
             [f'/profile/{USERNAME}/', 'profile', [USERNAME]],
             [f'/group/{SLUG}/', 'group_posts', [SLUG]],
             [f'/posts/{ID}/', 'post_detail', [ID]],
             [f'/posts/{ID}/edit/', 'post_edit', [ID]],
+            [f'/posts/{ID}/comments/', 'post_comments', [ID]],
             [f'/posts/{ID}/comment/', 'add_comment', [ID]],
             [f'/profile/{USERNAME}/follow/', 'profile_follow', [USERNAME]],
             [f'/profile/{USERNAME}/unfollow/', 'profile_unfollow', [USERNAME]],
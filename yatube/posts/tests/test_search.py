@@ -0,0 +1,92 @@
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, Client, RequestFactory
+from django.urls import reverse
+
+from .. import fulltext
+from ..models import Group, Post, User
+
+SEARCH_URL = reverse('posts:search')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'индекс FTS5 есть только в SQLite')
+class FullTextSearchTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(title='Любители животных',
+                                         slug='pets',
+                                         description='описание')
+        cls.cat_post = Post.objects.create(
+            text='Мой кот <b>Барсик</b> спит весь день', author=cls.author)
+        cls.cat_posts = Post.objects.create(
+            text='Кот, кот и ещё раз кот', author=cls.author)
+        cls.group_post = Post.objects.create(
+            text='Про собак', author=cls.author, group=cls.group)
+
+    def find(self, query):
+        return list(fulltext.search(query)[:10])
+
+    def test_search_is_ranked_and_highlighted(self):
+        results = self.find('кот')
+        self.assertEqual(results, [self.cat_posts, self.cat_post])
+        self.assertIn('<mark>кот</mark>', results[1].snippet.lower())
+        self.assertIn('&lt;b&gt;', results[1].snippet)
+
+    def test_index_follows_writes(self):
+        self.assertEqual(self.find('любители'), [self.group_post])
+        Post.objects.filter(id=self.cat_post.id).update(text='Про мышей')
+        self.assertEqual(self.find('мышей'), [self.cat_post])
+        self.assertEqual(self.find('кот'), [self.cat_posts])
+        Group.objects.filter(id=self.group.id).update(title='Собачники')
+        self.assertEqual(self.find('собачники'), [self.group_post])
+        self.assertEqual(self.find('любители'), [])
+        self.group_post.delete()
+        self.assertEqual(self.find('собак'), [])
+
+    def test_query_syntax_is_escaped(self):
+        for query in ['"кот', 'кот OR', '*', 'NEAR(', '']:
+            with self.subTest(query=query):
+                self.assertIsInstance(self.find(query), list)
+
+    def test_search_page(self):
+        response = Client().get(SEARCH_URL, {'q': 'барсик'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.paginator.count, 1)
+        self.assertEqual(list(page_obj), [self.cat_post])
+        self.assertContains(response, '<mark>Барсик</mark>')
+
+    def test_admin_uses_index(self):
+        admin = site._registry[Post]
+        queryset, distinct = admin.get_search_results(
+            RequestFactory().get('/'), Post.objects.all(), 'животных')
+        self.assertFalse(distinct)
+        self.assertEqual(list(queryset), [self.group_post])
+        self.assertIn(fulltext.FTS_TABLE, str(queryset.query))
+
+    def test_rebuild_command(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {fulltext.FTS_TABLE}({fulltext.FTS_TABLE}) "
+                "VALUES ('delete-all')")
+        self.assertEqual(self.find('барсик'), [])
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(self.find('барсик'), [self.cat_post])
+
+    def test_triggers_restored_after_migrate(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER posts_post_fts_insert')
+        self.assertEqual(fulltext.missing_objects(),
+                         {'posts_post_fts_insert'})
+        with self.assertLogs('posts.fulltext', 'WARNING'):
+            fulltext.repair_after_migrate(sender=None, using='default')
+        self.assertEqual(fulltext.missing_objects(), set())
+        post = Post.objects.create(text='Новый пост про ежа',
+                                   author=self.author)
+        self.assertEqual(self.find('ежа'), [post])
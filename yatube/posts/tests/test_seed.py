@@ -0,0 +1,68 @@
+import datetime as dt
+import random
+from collections import Counter
+from io import StringIO
+
+from django.core.management import call_command, CommandError
+from django.test import TestCase, SimpleTestCase
+from django.utils import timezone
+
+from .. import feed, seeding, stats
+from ..models import Comment, FeedEntry, Follow, Group, Post, User
+
+
+class SeedTest(TestCase):
+
+    def test_seed_command(self):
+        output = StringIO()
+        call_command('seed', '--users', '30', '--groups', '3', '--posts',
+                     '300', '--follows', '5', '--comments', '50',
+                     stdout=output)
+        self.assertIn('Готово', output.getvalue())
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 300)
+        self.assertEqual(Comment.objects.count(), 50)
+        self.assertGreater(Follow.objects.count(), 0)
+        self.assertGreater(
+            Post.objects.values('pub_date').distinct().count(), 1)
+        self.assertEqual(stats.verify(), {})
+
+    def test_feed_rebuild_matches_backfill(self):
+        seeding.seed(users=20, posts=100, follows=4)
+        rebuilt = set(FeedEntry.objects.values_list('user_id', 'post_id'))
+        FeedEntry.objects.all().delete()
+        for follow in Follow.objects.all():
+            feed.backfill(follow)
+        self.assertTrue(rebuilt)
+        self.assertEqual(
+            rebuilt, set(FeedEntry.objects.values_list('user_id', 'post_id')))
+
+    def test_insert_keeps_pub_date(self):
+        author = User.objects.create(username='author')
+        pub_date = timezone.now() - dt.timedelta(days=100)
+        seeding.insert(Post, [Post(id=10, text='пост', author=author,
+                                   pub_date=pub_date)])
+        seeding.insert(Comment, [Comment(post_id=10, author=author,
+                                         text='комментарий',
+                                         pub_date=pub_date)])
+        self.assertEqual(Post.objects.get(id=10).pub_date, pub_date)
+        self.assertEqual(Comment.objects.get().pub_date, pub_date)
+        # Поле модели не меняется: обычное сохранение ставит текущее время.
+        self.assertTrue(Post._meta.get_field('pub_date').auto_now_add)
+        post = Post.objects.create(text='новый', author=author)
+        self.assertGreater(post.pub_date, pub_date)
+
+    def test_processes_need_shared_database(self):
+        with self.assertRaises(CommandError):
+            call_command('seed', '--processes', '2', stdout=StringIO())
+
+
+class PowerLawTest(SimpleTestCase):
+
+    def test_first_items_are_most_popular(self):
+        rng = random.Random(0)
+        choose = seeding.PowerLaw(range(100))
+        counts = Counter(choose(rng) for _ in range(10_000))
+        self.assertGreater(counts[0], counts[10])
+        self.assertGreater(counts[10], counts.get(90, 0))
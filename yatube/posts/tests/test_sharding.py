@@ -0,0 +1,197 @@
+import datetime as dt
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError, connections
+from django.db.migrations.executor import MigrationExecutor
+from django.test import (Client, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from .. import feed, sharding
+from ..views import create_object
+from ..models import Comment, FeedEntry, Follow, Group, Post, User, UserStats
+
+SHARDS = ['default', 'shard1']
+# jump_hash раскладывает id 1–3 в первый шард, 4–6 — во второй.
+DEFAULT_AUTHOR_ID = 1
+SHARD1_AUTHOR_ID = 4
+SLUG = 'slug'
+INDEX_URL = reverse('posts:main')
+GROUP_POSTS_URL = reverse('posts:group_posts', kwargs={'slug': SLUG})
+PROFILE_URL = reverse('posts:profile', kwargs={'username': 'far'})
+SEARCH_URL = reverse('posts:search')
+
+
+class JumpHashTest(SimpleTestCase):
+
+    def test_one_bucket(self):
+        self.assertEqual({sharding.jump_hash(key, 1) for key in range(100)},
+                         {0})
+
+    def test_new_bucket_takes_only_its_share(self):
+        keys = range(3000)
+        moved = [key for key in keys
+                 if sharding.jump_hash(key, 2) != sharding.jump_hash(key, 3)]
+        self.assertEqual({sharding.jump_hash(key, 3) for key in moved}, {2})
+        self.assertAlmostEqual(len(moved) / len(keys), 1 / 3, delta=0.05)
+
+
+@override_settings(POST_SHARDS=SHARDS)
+class ShardingTest(TestCase):
+    databases = set(SHARDS)
+
+    @classmethod
+    def setUpTestData(cls):
+        sharding.reserve_ids('shard1')
+        cls.near = User.objects.create(id=DEFAULT_AUTHOR_ID, username='near')
+        cls.far = User.objects.create(id=SHARD1_AUTHOR_ID, username='far')
+        cls.group = Group.objects.create(title='Группа', slug=SLUG,
+                                         description='Описание')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.near)
+
+    def create_posts(self, count):
+        start = timezone.now() - dt.timedelta(days=1)
+        posts = []
+        for number in range(count):
+            post = Post.objects.create(
+                text=f'пост {number}', group=self.group,
+                author=self.far if number % 3 else self.near)
+            # Даты вперемешку по шардам.
+            Post.objects.using(post._state.db).filter(id=post.id).update(
+                pub_date=start + dt.timedelta(minutes=number))
+            posts.append(post)
+        return posts[::-1]
+
+    def test_reference_rows_copied(self):
+        self.assertTrue(User.objects.using('shard1').filter(
+            username='far').exists())
+        self.assertTrue(Group.objects.using('shard1').filter(
+            slug=SLUG).exists())
+
+    def test_post_written_to_author_shard(self):
+        post = Post.objects.create(text='текст', author=self.far)
+        self.assertEqual(post._state.db, 'shard1')
+        self.assertGreater(post.id, sharding.ID_RANGE)
+        self.assertFalse(Post.objects.using('default').filter(
+            id=post.id).exists())
+
+    def test_index_merges_shards(self):
+        posts = self.create_posts(20)
+        page_obj = self.client.get(INDEX_URL).context['page_obj']
+        self.assertEqual(list(page_obj), posts[:15])
+        self.assertEqual(page_obj.paginator.count, 20)
+        page_obj = self.client.get(INDEX_URL, {'page': 2}).context[
+            'page_obj']
+        self.assertEqual(list(page_obj), posts[15:])
+
+    def test_group_cursor_pages_merge_shards(self):
+        posts = self.create_posts(20)
+        page_obj = self.client.get(GROUP_POSTS_URL, {'cursor': ''}).context[
+            'page_obj']
+        self.assertEqual(list(page_obj), posts[:15])
+        page_obj = self.client.get(
+            GROUP_POSTS_URL, {'cursor': page_obj.next_cursor}).context[
+            'page_obj']
+        self.assertEqual(list(page_obj), posts[15:])
+
+    def test_profile_reads_author_shard(self):
+        posts = [post for post in self.create_posts(6)
+                 if post.author == self.far]
+        self.assertEqual(
+            list(self.client.get(PROFILE_URL).context['page_obj']), posts)
+
+    def test_comment_stored_with_post(self):
+        post = Post.objects.create(text='текст', author=self.far)
+        url = reverse('posts:post_detail', args=[post.id])
+        self.assertEqual(self.client.get(url).context['post'], post)
+        self.client.post(reverse('posts:add_comment', args=[post.id]),
+                         {'text': 'комментарий'})
+        self.assertTrue(Comment.objects.using('shard1').filter(
+            post=post, author=self.near).exists())
+        self.assertEqual(
+            len(self.client.get(url).context['comments']), 1)
+
+    def test_search_merges_shards(self):
+        posts = {Post.objects.create(text='редкое слово', author=author)
+                 for author in (self.near, self.far)}
+        Post.objects.create(text='другой текст', author=self.far)
+        page_obj = self.client.get(SEARCH_URL, {'q': 'редкое'}).context[
+            'page_obj']
+        self.assertEqual(page_obj.paginator.count, 2)
+        self.assertEqual(set(page_obj), posts)
+
+    def test_rebalance_moves_authors(self):
+        with override_settings(POST_SHARDS=['default']):
+            post = Post.objects.create(text='текст', author=self.far)
+            Comment.objects.create(post=post, author=self.near, text='ок')
+        pub_date = post.pub_date
+        call_command('rebalance_shards', stdout=StringIO())
+        moved = Post.objects.using('shard1').get(id=post.id)
+        self.assertEqual(moved.pub_date, pub_date)
+        self.assertTrue(moved.comments.exists())
+        self.assertFalse(Post.objects.using('default').filter(
+            id=post.id).exists())
+        self.assertEqual(list(sharding.misplaced_authors()), [])
+
+
+class MigrateShardTest(TransactionTestCase):
+    databases = set(SHARDS)
+
+    def migrate(self, target):
+        executor = MigrationExecutor(connections['shard1'])
+        executor.migrate([target])
+
+    def test_data_migrations_write_to_migrated_database(self):
+        author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        User.objects.using('shard1').bulk_create([
+            User(id=author.id, username='author'),
+            User(id=reader.id, username='reader')])
+        Post.objects.using('shard1').bulk_create([
+            Post(text='пост', author_id=author.id)])
+        Follow.objects.using('shard1').bulk_create([
+            Follow(user_id=reader.id, author_id=author.id)])
+        latest = MigrationExecutor(
+            connections['shard1']).loader.graph.leaf_nodes('posts')[0]
+        self.migrate(('posts', '0015_auto_20211223_1227'))
+        self.migrate(latest)
+        self.assertEqual(UserStats.objects.using('shard1').get(
+            user_id=author.id).posts, 1)
+        self.assertTrue(FeedEntry.objects.using('shard1').filter(
+            user_id=reader.id).exists())
+        self.assertFalse(FeedEntry.objects.using('default').exists())
+        self.assertEqual(UserStats.objects.using('default').get(
+            user_id=author.id).posts, 0)
+
+
+@mock.patch('core.sqlite.time.sleep')
+@override_settings(POST_SHARDS=SHARDS)
+class ShardWriteRetryTest(TransactionTestCase):
+    databases = set(SHARDS)
+
+    def test_retry_rolls_back_shard_insert(self, sleep):
+        sharding.reserve_ids('shard1')
+        author = User.objects.create(id=SHARD1_AUTHOR_ID, username='far')
+        fan_out = feed.fan_out
+        calls = []
+
+        def flaky_fan_out(post):
+            calls.append(post)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return fan_out(post)
+
+        with mock.patch.object(feed, 'fan_out', flaky_fan_out):
+            create_object(Post(text='пост', author=author))
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(Post.objects.using('shard1').count(), 1)
+        self.assertEqual(UserStats.objects.using('default').get(
+            user=author).posts, 1)
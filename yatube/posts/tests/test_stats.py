@@ -0,0 +1,60 @@
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command, CommandError
+from django.db import connection
+from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..cache import AUTHOR_SCOPE, bump
+from ..models import Comment, Follow, Post, User, UserStats
+
+USERNAME = 'author'
+PROFILE_URL = reverse('posts:profile', kwargs={'username': USERNAME})
+
+
+class UserStatsTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username=USERNAME)
+        cls.reader = User.objects.create(username='reader')
+
+    def assertStats(self, user, **expected):
+        stats = UserStats.objects.get(user=user)
+        for field, value in expected.items():
+            with self.subTest(user=user, field=field):
+                self.assertEqual(getattr(stats, field), value)
+
+    def test_counters_follow_writes(self):
+        post = Post.objects.create(text='пост', author=self.author)
+        Comment.objects.create(text='коммент', post=post, author=self.reader)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, posts=1, followers=1, following=0)
+        self.assertStats(self.reader, comments=1, following=1)
+        follow.delete()
+        post.delete()
+        self.assertStats(self.author, posts=0, followers=0)
+        self.assertStats(self.reader, comments=0, following=0)
+
+    def test_profile_has_no_count_queries(self):
+        cache.clear()
+        Post.objects.create(text='пост', author=self.author)
+        Client().get(PROFILE_URL)
+        bump(AUTHOR_SCOPE.format(username=USERNAME))
+        with CaptureQueriesContext(connection) as queries:
+            response = Client().get(PROFILE_URL)
+        self.assertContains(response, 'Всего постов: 1')
+        self.assertFalse([query for query in queries.captured_queries
+                          if 'COUNT(' in query['sql']])
+
+    def test_rebuild_command(self):
+        Post.objects.bulk_create(
+            [Post(text=f'пост {i}', author=self.author) for i in range(3)])
+        with self.assertRaises(CommandError):
+            call_command('rebuild_user_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_user_stats', stdout=StringIO())
+        call_command('rebuild_user_stats', '--verify', stdout=StringIO())
+        self.assertStats(self.author, posts=3)
@@ -0,0 +1,150 @@
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from sorl.thumbnail import default
+
+from .. import thumbnails
+from ..kvstore import ByteLimitedLRU
+from ..models import Post, User
+
+INDEX_URL = reverse('posts:main')
+POST_CREATE_URL = reverse('posts:post_create')
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+def uploaded(name='small.gif'):
+    return SimpleUploadedFile(name=name, content=SMALL_GIF,
+                              content_type='image/gif')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTest(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create(username='author')
+        cls.post = Post.objects.create(text='пост', author=cls.author,
+                                       image=uploaded())
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        default.kvstore.clear()
+
+    def get_thumbnail_urls(self):
+        return [default.backend.get_thumbnail(
+            self.post.image, geometry, **options).url
+            for geometry, options in thumbnails.SIZES]
+
+    def test_render_does_no_image_work(self):
+        with mock.patch.object(default.engine, 'get_image') as get_image:
+            response = Client().get(INDEX_URL)
+        get_image.assert_not_called()
+        self.assertContains(response, self.post.image.url)
+
+    def test_render_uses_generated_thumbnails(self):
+        thumbnails.generate(self.post.image.name)
+        response = Client().get(INDEX_URL)
+        for url in self.get_thumbnail_urls():
+            with self.subTest(url=url):
+                self.assertNotEqual(url, self.post.image.url)
+                self.assertContains(response, url)
+
+    # Миниатюры здесь строятся прямо в запросе, сверх бюджета страницы.
+    @override_settings(QUERY_BUDGET_STRICT=False)
+    def test_cached_page_refreshed_after_thumbnail_miss(self):
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               lambda func: func()):
+            response = Client().get(INDEX_URL)
+        self.assertContains(response, self.post.image.url)
+        response = Client().get(INDEX_URL)
+        for url in self.get_thumbnail_urls():
+            with self.subTest(url=url):
+                self.assertContains(response, url)
+
+    def test_post_create_schedules_generation(self):
+        author_client = Client()
+        author_client.force_login(self.author)
+        with mock.patch.object(thumbnails, 'schedule') as schedule:
+            author_client.post(POST_CREATE_URL, {
+                'text': 'пост с картинкой', 'image': uploaded('new.gif')})
+        post = Post.objects.get(text='пост с картинкой')
+        self.assertEqual(schedule.call_args[0][0], post.image.name)
+
+    def test_no_workers_generates_inline(self):
+        with mock.patch.object(thumbnails, 'get_executor') as executor:
+            thumbnails._submit(self.post.image.name, ())
+        executor.assert_not_called()
+        self.assertNotIn(self.post.image.url, self.get_thumbnail_urls())
+
+    @override_settings(THUMBNAIL_WORKERS=1)
+    def test_pending_image_submitted_once(self):
+        with mock.patch.object(thumbnails, 'get_executor') as executor:
+            thumbnails._submit(self.post.image.name, ())
+            thumbnails._submit(self.post.image.name, ())
+        self.assertEqual(executor.return_value.submit.call_count, 1)
+        thumbnails._pending.clear()
+
+    def test_generate_command(self):
+        output = StringIO()
+        call_command('generate_thumbnails', '--workers', '0', stdout=output)
+        self.assertIn('ошибок: 0', output.getvalue())
+        self.assertNotIn(self.post.image.url, self.get_thumbnail_urls())
+
+    def test_prefetch_reads_page_in_one_query(self):
+        posts = [self.post] + [
+            Post.objects.create(text=f'пост {i}', author=self.author,
+                                image=uploaded(f'{i}.gif'))
+            for i in range(3)]
+        for post in posts:
+            thumbnails.generate(post.image.name)
+        cache.clear()
+        default.kvstore.lru.clear()
+        with CaptureQueriesContext(connection) as queries:
+            thumbnails.prefetch(posts)
+        self.assertEqual(len(queries.captured_queries), 1)
+        with CaptureQueriesContext(connection) as queries:
+            for post in posts:
+                for geometry, options in thumbnails.SIZES:
+                    self.assertNotEqual(default.backend.get_thumbnail(
+                        post.image, geometry, **options).url, post.image.url)
+        self.assertEqual(queries.captured_queries, [])
+
+
+class ByteLimitedLRUTest(SimpleTestCase):
+
+    def test_evicts_least_recently_used(self):
+        lru = ByteLimitedLRU(max_bytes=10)
+        lru.set('a', 'xxx')
+        lru.set('b', 'xxx')
+        lru.get('a')
+        lru.set('c', 'xxx')
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 'xxx')
+        self.assertEqual(lru.get('c'), 'xxx')
+        self.assertLessEqual(lru.size, 10)
+        lru.set('big', 'x' * 20)
+        self.assertIsNone(lru.get('big'))
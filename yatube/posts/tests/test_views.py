@@ -1,7 +1,11 @@
+import os
 import shutil
 import tempfile
+from unittest import mock
 
-from django.test import TestCase, Client
+from django.db import OperationalError
+from django.test import (TestCase, TransactionTestCase, Client,
+                         override_settings)
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.conf import settings
@@ -88,6 +92,11 @@ class PostsViewTest(TestCase):
         super().tearDownClass()
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
+    def setUp(self):
+        # Страницы в кэше общие для всех пользователей, а контекст
+        # шаблона есть только у ответа, отрисованного заново.
+        cache.clear()
+
     def test_context(self):
         urls = [INDEX_URL,
                 GROUP_POSTS_URL,
@@ -193,3 +202,39 @@ class FollowsTest(TestCase):
         self.assertFalse(
             Follow.objects.filter(user=self.user, author=self.author).exists()
         )
+
+
+@mock.patch('core.sqlite.time.sleep')
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class WriteRetryTest(TransactionTestCase):
+
+    def setUp(self):
+        self.user = User.objects.create(username=USERNAME)
+        self.client = Client()
+        self.client.force_login(self.user)
+        self.addCleanup(shutil.rmtree, TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_get_takes_no_write_lock(self, sleep):
+        with mock.patch('core.sqlite.get_write_lock') as get_write_lock:
+            self.client.get(POST_CREATE_URL)
+        get_write_lock.assert_not_called()
+
+    def test_retry_saves_image_once(self, sleep):
+        save = Post.save
+        calls = []
+
+        def flaky_save(post, *args, **kwargs):
+            calls.append(post)
+            if len(calls) == 1:
+                raise OperationalError('database is locked')
+            return save(post, *args, **kwargs)
+
+        with mock.patch.object(Post, 'save', flaky_save):
+            self.client.post(POST_CREATE_URL, {
+                'text': 'пост', 'image': SimpleUploadedFile(
+                    'retry.gif', SMALL_GIF, content_type='image/gif')})
+        self.assertEqual(len(calls), 2)
+        post = Post.objects.get()
+        self.assertEqual(post.image.name, 'posts/retry.gif')
+        self.assertEqual(os.listdir(os.path.join(TEMP_MEDIA_ROOT, 'posts')),
+                         ['retry.gif'])
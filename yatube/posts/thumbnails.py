@@ -0,0 +1,145 @@
+"""Миниатюры картинок постов, заготовленные заранее.
+
+Миниатюры всех размеров из шаблонов строятся в фоновом пуле потоков
+после сохранения поста. Рендер страницы картинки не обрабатывает:
+если миниатюры ещё нет, отдаётся исходная картинка, а построение
+ставится в очередь. Построив миниатюру, пул сбрасывает кэш страниц
+с этим постом (области запоминает prefetch).
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix
+
+from .cache import bump
+from .signals import post_scopes
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, в которых шаблоны выводят post.image.
+SIZES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+_render = threading.local()  # scopes: имя картинки -> области её поста
+
+
+def get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'THUMBNAIL_WORKERS', 2),
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def generate(name, scopes=()):
+    """Строит миниатюры всех размеров для картинки name.
+
+    После построения сбрасывает кэш страниц областей scopes, чтобы они
+    показали миниатюру вместо исходной картинки.
+    """
+    try:
+        backend = PregeneratedThumbnailBackend()
+        thumbnails = [backend.generate(name, geometry, **options)
+                      for geometry, options in SIZES]
+    finally:
+        with _lock:
+            _pending.discard(name)
+    bump(*scopes)
+    return thumbnails
+
+
+def _submit(name, scopes):
+    with _lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    if getattr(settings, 'THUMBNAIL_WORKERS', 2) == 0:
+        try:
+            generate(name, scopes)
+        except Exception:
+            logger.exception('Не удалось построить миниатюры')
+        return
+    future = get_executor().submit(generate, name, scopes)
+    future.add_done_callback(_log_failure)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error('Не удалось построить миниатюры',
+                     exc_info=future.exception())
+
+
+def schedule(name, scopes=()):
+    """Ставит построение миниатюр в очередь после фиксации транзакции."""
+    if name:
+        transaction.on_commit(lambda: _submit(name, scopes))
+
+
+class PregeneratedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl.thumbnail, который не строит миниатюры при рендере."""
+
+    def generate(self, file_, geometry_string, **options):
+        return super().get_thumbnail(file_, geometry_string, **options)
+
+    def get_thumbnail_file(self, file_, geometry_string, **options):
+        """Файл миниатюры без обращения к хранилищу и картинке."""
+        if not file_:
+            raise ValueError('falsey file_ argument in get_thumbnail()')
+        source = ImageFile(file_)
+        # Имя миниатюры считается так же, как в ThumbnailBackend.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return source, ImageFile(
+            self._get_thumbnail_filename(source, geometry_string, options),
+            default.storage)
+
+    def get_thumbnail(self, file_, geometry_string, **options):
+        source, thumbnail = self.get_thumbnail_file(
+            file_, geometry_string, **options)
+        cached = default.kvstore.get(thumbnail)
+        if cached:
+            return cached
+        scopes = getattr(_render, 'scopes', {}).get(source.name, ())
+        schedule(source.name, scopes)
+        return source
+
+
+def prefetch(posts):
+    """Читает ключи миниатюр всех постов страницы одним пакетом.
+
+    После этого теги thumbnail в шаблоне находят ключи в LRU хранилища
+    и не ходят ни в кэш, ни в базу. Запоминает области кэша страниц
+    с постами, чтобы сбросить их, когда недостающие миниатюры построятся.
+    """
+    _render.scopes = {post.image.name: post_scopes(post)
+                      for post in posts if post.image}
+    get_many_raw = getattr(default.kvstore, 'get_many_raw', None)
+    if get_many_raw is None:
+        return
+    backend = PregeneratedThumbnailBackend()
+    get_many_raw([
+        add_prefix(backend.get_thumbnail_file(
+            post.image, geometry, **options)[1].key)
+        for post in posts if post.image
+        for geometry, options in SIZES
+    ])
@@ -8,6 +8,9 @@ urlpatterns = [
     path('',
          views.index,
          name='main'),
+    path('search/',
+         views.search,
+         name='search'),
     path('group/<slug:slug>/',
          views.group_posts,
          name='group_posts'),
@@ -23,6 +26,9 @@ urlpatterns = [
     path('posts/<int:post_id>/edit/',
          views.post_edit,
          name='post_edit'),
+    path('posts/<int:post_id>/comments/',
+         views.post_comments,
+         name='post_comments'),
     path('posts/<int:post_id>/comment/',
          views.add_comment,
          name='add_comment'),
@@ -1,37 +1,65 @@
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import DEFAULT_DB_ALIAS, router
 from django.shortcuts import render, get_object_or_404, redirect
-from django.views.decorators.cache import cache_page
+from django.utils.http import urlencode
 
+from core.query_budget import query_budget
+from core.replicas import read_from_replica
+from core.sqlite import serialized_write
+
+from . import feed, fulltext, sharding, thumbnails
+from .cache import (AUTHOR_SCOPE, GLOBAL_SCOPE, GROUP_SCOPE, GROUPS_SCOPE,
+                    POST_SCOPE, cache_page_by_generation)
 from .forms import PostForm, CommentForm
 from .models import Post, Group, User, Follow
+from .paginators import CURSOR_PARAM, CursorPaginator, ElidedPaginator
+from .signals import post_scopes
 
 POSTS_COUNT = 15
-CACHE_TIME = 20  # sec
+COMMENTS_COUNT = 20
+CACHE_TIME = 60 * 60 * 6  # sec
+
+
+def get_page_obj(request, posts, shards=None):
+    posts = sharding.scatter(posts.select_related('author', 'group'), shards)
+    if CURSOR_PARAM in request.GET:
+        page_obj = CursorPaginator(posts, POSTS_COUNT).get_page(
+            request.GET[CURSOR_PARAM])
+    else:
+        page_obj = ElidedPaginator(posts, POSTS_COUNT).get_page(
+            request.GET.get('page'))
+    thumbnails.prefetch(page_obj)
+    return page_obj
 
 
-def get_page_obj(request, posts):
-    paginator = Paginator(posts, POSTS_COUNT)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+def get_comments_page(post, cursor=None):
+    return CursorPaginator(
+        post.comments.select_related('author'), COMMENTS_COUNT,
+        ordering=('pub_date', 'id')
+    ).get_page(cursor)
 
 
-@cache_page(CACHE_TIME)
+@cache_page_by_generation(CACHE_TIME, GLOBAL_SCOPE)
+@read_from_replica
+@query_budget(5)
 def index(request):
     return render(request, 'posts/index.html', {
         'page_obj': get_page_obj(request, Post.objects.all()),
     })
 
 
-# @cache_page(CACHE_TIME)
 @login_required
+@read_from_replica
+@query_budget(6)
 def follow_index(request):
     return render(request, 'posts/follow.html', {
-        'page_obj': get_page_obj(request, Post.objects.filter(
-            author__following__user=request.user))
+        'page_obj': get_page_obj(request, feed.get_feed(request.user))
     })
 
 
+@cache_page_by_generation(CACHE_TIME, GROUPS_SCOPE, GROUP_SCOPE)
+@read_from_replica
+@query_budget(6)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     return render(request, 'posts/group_list.html', {
@@ -40,27 +68,91 @@ def group_posts(request, slug):
     })
 
 
+@cache_page_by_generation(CACHE_TIME, GROUPS_SCOPE, AUTHOR_SCOPE)
+@read_from_replica
+@query_budget(6)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    follow = (request.user.is_authenticated
-              and request.user.username != username
-              and Follow.objects.filter(author=author,
-                                        user=request.user).exists())
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
     return render(request, 'posts/profile.html', {
         'author': author,
-        'page_obj': get_page_obj(request, author.posts.all()),
-        'following': follow
+        'page_obj': get_page_obj(
+            request, author.posts.all(),
+            shards=[sharding.shard_for_author(author.pk)]),
     })
 
 
+@query_budget(8)
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_post_or_404(
+        Post.objects.select_related('author', 'group'), post_id)
     return render(request, 'posts/post_detail.html', {
         'post': post,
+        'comments': get_comments_page(post),
         'form': CommentForm(),
     })
 
 
+@cache_page_by_generation(CACHE_TIME, POST_SCOPE)
+@query_budget(5)
+def post_comments(request, post_id):
+    post = sharding.get_post_or_404(Post.objects, post_id)
+    return render(request, 'posts/includes/comments.html', {
+        'post': post,
+        'comments': get_comments_page(post, request.GET.get(CURSOR_PARAM)),
+    })
+
+
+@query_budget(4)
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = ElidedPaginator(fulltext.search(query), POSTS_COUNT)
+    return render(request, 'posts/search.html', {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+        'page_query': urlencode({'q': query}) + '&',
+    })
+
+
+def write_databases(obj):
+    # Пост и комментарий пишутся в шард, а счётчики — в основную базу:
+    # повтор должен откатить и то, и другое.
+    return {DEFAULT_DB_ALIAS,
+            router.db_for_write(type(obj), instance=obj) or DEFAULT_DB_ALIAS}
+
+
+@serialized_write(using=write_databases)
+def create_object(obj):
+    # Повтор после отката вставляет объект заново, а не обновляет его.
+    obj.pk = None
+    obj._state.adding = True
+    obj.save()
+
+
+@serialized_write(using=write_databases)
+def save_object(obj):
+    obj.save()
+
+
+@serialized_write(using=write_databases)
+def delete_object(obj):
+    obj.delete()
+
+
+@serialized_write
+def follow_author(user, author):
+    if not (user == author or Follow.objects.filter(
+            author=author, user=user).exists()):
+        Follow.objects.create(user=user, author=author)
+
+
+def save_image(post):
+    """Пишет новую картинку в хранилище до транзакции, чтобы повтор
+    записи в базу не сохранял файл ещё раз."""
+    if post.image and not post.image._committed:
+        post.image.save(post.image.name, post.image.file, save=False)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -68,13 +160,15 @@ def post_create(request):
         return render(request, 'posts/create_post.html', {'form': form})
     post = form.save(commit=False)
     post.author = request.user
-    post.save()
+    save_image(post)
+    create_object(post)
+    thumbnails.schedule(post.image.name, post_scopes(post))
     return redirect('posts:profile', username=request.user.username)
 
 
 @login_required
 def post_edit(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_post_or_404(Post.objects, post_id)
     if post.author != request.user:
         return redirect('posts:post_detail', post_id=post.id)
     form = PostForm(request.POST or None,
@@ -86,35 +180,33 @@ def post_edit(request, post_id):
             'is_edit': True
         }
         return render(request, 'posts/create_post.html', context)
-    form.save()
+    save_image(post)
+    save_object(post)
+    if 'image' in form.changed_data:
+        thumbnails.schedule(post.image.name, post_scopes(post))
     return redirect('posts:post_detail', post_id=post.id)
 
 
 @login_required
 def add_comment(request, post_id):
-    post = get_object_or_404(Post, id=post_id)
+    post = sharding.get_post_or_404(Post.objects, post_id)
     form = CommentForm(request.POST or None)
     if form.is_valid():
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        create_object(comment)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def profile_follow(request, username):
-    if not (request.user.username == username or Follow.objects.filter(
-            author__username=username, user=request.user).exists()):
-        Follow.objects.create(
-            user=request.user,
-            author=get_object_or_404(User, username=username)
-        )
+    follow_author(request.user, get_object_or_404(User, username=username))
     return redirect('posts:profile', username=username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    get_object_or_404(Follow, author__username=username,
-                      user=request.user).delete()
+    delete_object(get_object_or_404(Follow, author__username=username,
+                                    user=request.user))
     return redirect('posts:profile', username=username)
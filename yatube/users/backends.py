@@ -0,0 +1,43 @@
+"""Бэкенд аутентификации с кэшем пользователя.
+
+AuthenticationMiddleware на каждом запросе, где нужен request.user,
+читает пользователя из базы по id из сессии. CachedModelBackend
+держит объект в кэше AUTH_USER_CACHE_TIME секунд, поэтому вместе
+с сессиями cached_db страница из кэша отдаётся без запросов к базе.
+
+Пользователь удаляется из кэша при сохранении (в том числе при смене
+пароля и входе), удалении и выходе. Если кэш всё же отдал устаревший
+объект, django.contrib.auth сверяет хэш пароля в сессии и разлогинит
+пользователя, пароль которого сменился.
+"""
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import caches
+
+from core.metrics import registry
+
+USER_CACHE_KEY = 'auth:user:{}'
+USER_CACHE_TIME = 60  # sec
+
+
+def get_cache():
+    return caches[getattr(settings, 'AUTH_USER_CACHE_ALIAS', 'default')]
+
+
+def forget_user(user_id):
+    get_cache().delete(USER_CACHE_KEY.format(user_id))
+
+
+class CachedModelBackend(ModelBackend):
+
+    def get_user(self, user_id):
+        key = USER_CACHE_KEY.format(user_id)
+        user = get_cache().get(key)
+        registry.inc('yatube_auth_user_cache_total',
+                     result='miss' if user is None else 'hit')
+        if user is None:
+            user = super().get_user(user_id)
+            if user is not None:
+                get_cache().set(key, user, getattr(
+                    settings, 'AUTH_USER_CACHE_TIME', USER_CACHE_TIME))
+        return user
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..backends import USER_CACHE_KEY, CachedModelBackend
+
+User = get_user_model()
+PASSWORD = 'old-password-123'
+
+
+class CachedModelBackendTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('user', password=PASSWORD)
+        self.key = USER_CACHE_KEY.format(self.user.pk)
+        self.backend = CachedModelBackend()
+
+    def test_user_cached(self):
+        self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.backend.get_user(self.user.pk), self.user)
+
+    def test_unknown_user_not_cached(self):
+        self.assertIsNone(self.backend.get_user(0))
+        self.assertIsNone(cache.get(USER_CACHE_KEY.format(0)))
+
+    def test_save_forgets_user(self):
+        self.backend.get_user(self.user.pk)
+        self.user.first_name = 'Имя'
+        self.user.save()
+        self.assertIsNone(cache.get(self.key))
+        self.assertEqual(self.backend.get_user(self.user.pk).first_name,
+                         'Имя')
+
+    def test_logout_forgets_user(self):
+        client = Client()
+        client.login(username='user', password=PASSWORD)
+        client.get(reverse('posts:follow_index'))
+        self.assertIsNotNone(cache.get(self.key))
+        client.get(reverse('users:logout'))
+        self.assertIsNone(cache.get(self.key))
+
+    def test_password_change_ends_other_sessions(self):
+        client = Client()
+        client.login(username='user', password=PASSWORD)
+        client.get(reverse('posts:follow_index'))
+        self.user.set_password('new-password-456')
+        self.user.save()
+        response = client.get(reverse('posts:follow_index'))
+        self.assertEqual(response.status_code, 302)
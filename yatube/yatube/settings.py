@@ -49,6 +49,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.SlowQueryMiddleware',
+    'core.middleware.ReplicaPinMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,8 +60,17 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'debug_toolbar.middleware.DebugToolbarMiddleware',
+    'core.middleware.ProfilingMiddleware',
 ]
 
+# Сессии читаются из кэша и пишутся в кэш и базу, пользователь сессии
+# берётся из кэша (users.backends): страница из кэша страниц отдаётся
+# вошедшему без запросов к базе. signed_cookies обошлись бы без базы
+# и для записи, но сессию на сервере тогда не завершить.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+AUTHENTICATION_BACKENDS = ['users.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIME = 60  # sec
+
 ROOT_URLCONF = 'yatube.urls'
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:main'
@@ -91,12 +103,62 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
+# Соединения живут между запросами, PRAGMA для них задаёт
+# SQLITE_PRAGMAS (core.sqlite). Транзакции начинаются с BEGIN IMMEDIATE,
+# чтобы писатели ждали друг друга в busy_timeout, а не падали.
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        'ENGINE': 'core.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        'CONN_MAX_AGE': 60,  # sec
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # Копия основной базы, её обновляет manage.py sync_replicas.
+    'replica': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+        'CONN_MAX_AGE': 60,  # sec
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+    # Второй шард постов: подключается в POST_SHARDS после
+    # manage.py migrate --database shard1 и rebalance_shards.
+    'shard1': {
+        'ENGINE': 'core.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db.shard1.sqlite3'),
+        'CONN_MAX_AGE': 60,  # sec
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+}
+DATABASE_ROUTERS = [
+    'posts.sharding.ShardRouter',
+    'core.replicas.ReplicaRouter',
+]
+# Базы, по которым посты с комментариями раскладываются по хэшу автора
+# (posts.sharding). Новые шарды добавляются только в конец списка.
+POST_SHARDS = ['default']
+# Списки читаются с реплик, отстающих не больше REPLICA_MAX_LAG; после
+# записи пользователь REPLICA_PIN_TIME читает из основной базы.
+DATABASE_REPLICAS = ['replica']
+REPLICA_MAX_LAG = 5  # sec
+REPLICA_PIN_TIME = 10  # sec
+REPLICA_CHECK_INTERVAL = 1  # sec
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,  # ms
+    'cache_size': -64000,  # KiB
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'memory',
 }
+SQLITE_WRITE_RETRIES = 4
+SQLITE_WRITE_BACKOFF = 0.05  # sec, растёт вдвое с каждым повтором
 
 # Password validation
 # https://docs.djangoproject.com/en/2.2/ref/settings/#auth-password-validators
@@ -116,10 +178,33 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Двухуровневый кэш (core.cache): память процесса с бюджетом в байтах
+# перед общим кэшем, который видят все воркеры. На нескольких машинах общим уровнем
+# должен быть memcached:
+# 'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+# 'LOCATION': '127.0.0.1:11211'.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TwoTierCache',
+        'LOCATION': 'shared',
+        'OPTIONS': {
+            'LOCAL_TIMEOUT': 1,  # sec
+            'LOCAL': {
+                'MAX_BYTES': 16 * 1024 * 1024,
+                'POLICY': 'lru',
+                'COMPRESS_MIN_BYTES': 16 * 1024,
+            },
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        # Каталог с pickle-файлами сессий и пользователей: только
+        # для пользователя, под которым работает сайт.
+        'LOCATION': os.environ.get('YATUBE_CACHE_DIR',
+                                   os.path.join(BASE_DIR, 'cache')),
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 10_000},
+    },
 }
 
 # Internationalization
@@ -147,4 +232,43 @@ INTERNAL_IPS = [
     '127.0.0.1',
 ]
 
-
+# Общие настройки тестов (core.runner).
+TEST_RUNNER = 'core.runner.TestRunner'
+
+# Превышение бюджета SQL-запросов view (core.query_budget) пишется в лог;
+# тесты включают строгий режим, в котором это ошибка.
+QUERY_BUDGET_STRICT = False
+
+# Миниатюры строятся заранее в фоновом пуле (posts.thumbnails),
+# рендер страниц картинки не обрабатывает. Ключи миниатюр страницы
+# читаются одним пакетом и держатся в LRU процесса (posts.kvstore).
+THUMBNAIL_BACKEND = 'posts.thumbnails.PregeneratedThumbnailBackend'
+THUMBNAIL_WORKERS = 2
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_KV_LRU_BYTES = 4 * 1024 * 1024
+
+# Метрики запросов (core.metrics): снимки процессов складываются
+# в METRICS_DIR, /metrics отдаётся по токену или сотрудникам.
+METRICS_DIR = os.environ.get('YATUBE_METRICS_DIR',
+                             os.path.join(BASE_DIR, 'metrics'))
+METRICS_FLUSH_INTERVAL = 5  # sec
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Выборочное профилирование (core.profiling): каждый N-й запрос в среднем,
+# view из списка и запросы с заголовком X-Profile: <токен>. Пустые
+# настройки отключают middleware. Каталог, как и кэш, — только для
+# пользователя сайта.
+PROFILING_DIR = os.environ.get('YATUBE_PROFILING_DIR',
+                               os.path.join(BASE_DIR, 'profiles'))
+PROFILING_SAMPLE_EVERY = int(os.environ.get('PROFILING_SAMPLE_EVERY', 0))
+PROFILING_VIEWS = []
+PROFILING_TOKEN = os.environ.get('PROFILING_TOKEN', '')
+PROFILING_INTERVAL = 0.005  # sec
+PROFILING_MAX_FILES = 500
+
+# Журнал медленных SQL-запросов (core.slow_queries): JSONL с view,
+# параметрами и EXPLAIN. None отключает журнал. В журнале SQL
+# с параметрами, поэтому он лежит рядом с сайтом, а не в общем /tmp.
+SLOW_QUERY_THRESHOLD = 0.1  # sec
+SLOW_QUERY_LOG = os.environ.get('YATUBE_SLOW_QUERY_LOG',
+                                os.path.join(BASE_DIR, 'slow-queries.jsonl'))